@@ -1,16 +1,284 @@
 import io
+import os
+import threading
 import wave
 import numpy as np
 import requests
-from openai import OpenAI
-import webrtcvad
-from transformers import pipeline
-from typing import List, Optional, Generator, Tuple, Any
-from utils.errors import APIError, AudioConversionError
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import TYPE_CHECKING, Dict, List, Optional, Generator, Tuple, Any, Union
+from utils.admission import PRIORITY_TURN, admission
+from utils.errors import APIError, AudioConversionError, AudioBufferOverflowError
+from utils.metrics import metrics
+from utils.tracing import tracer
+from api.context import CHARS_PER_TOKEN
+from api.mock import DEFAULT_STT_CONTENT, MockService
+
+# Heavy backends are imported on first use, depending on the configured service types
+if TYPE_CHECKING:
+    from openai import OpenAI
+    import webrtcvad
+    from api.local_stt import LocalInferenceServer
 
 SAMPLE_RATE: int = 48000
 FRAME_DURATION: int = 30
 
+HTTP_POOL_SIZE: int = int(os.getenv("HTTP_POOL_SIZE", 10))
+HTTP_MAX_RETRIES: int = int(os.getenv("HTTP_MAX_RETRIES", 2))
+HTTP_BACKOFF_FACTOR: float = float(os.getenv("HTTP_BACKOFF_FACTOR", 0.3))
+
+AUDIO_BUFFER_MAX_SECONDS: float = float(os.getenv("AUDIO_BUFFER_MAX_SECONDS", 300))
+STT_INCREMENTAL: bool = bool(os.getenv("STT_INCREMENTAL", False))
+STT_WARMUP: bool = bool(os.getenv("STT_WARMUP", False))
+MAX_OVERLAP_WORDS: int = 12
+
+STT_TIMEOUT: float = float(os.getenv("STT_TIMEOUT", 30))
+STT_MAX_RETRIES: int = int(os.getenv("STT_MAX_RETRIES", 2))
+
+
+def create_http_session(
+    pool_size: int = HTTP_POOL_SIZE, max_retries: int = HTTP_MAX_RETRIES, backoff_factor: float = HTTP_BACKOFF_FACTOR
+) -> requests.Session:
+    """
+    Create an HTTP session with a keep-alive connection pool and a retry policy.
+    The session is shared by all Gradio worker threads, so every call after the first one skips the TCP and TLS handshakes.
+
+    Args:
+        pool_size (int): Maximum number of kept-alive connections per host. Defaults to HTTP_POOL_SIZE.
+        max_retries (int): Number of retries for connection errors and retryable status codes. Defaults to HTTP_MAX_RETRIES.
+        backoff_factor (float): Exponential backoff factor between retries in seconds. Defaults to HTTP_BACKOFF_FACTOR.
+
+    Returns:
+        requests.Session: Configured session.
+    """
+    retry = Retry(
+        total=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=None,  # TTS and STT requests are POSTs without side effects, so they are safe to retry
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class AudioRingBuffer:
+    """
+    Preallocated int16 audio buffer for accumulating speech before transcription.
+    Storage grows geometrically, so appending is amortized O(1) instead of copying the whole buffer on every chunk.
+    The length is capped, when the cap is reached the overflow policy decides what happens:
+    "drop_oldest" keeps the most recent audio, "drop_newest" ignores new audio, "raise" raises AudioBufferOverflowError.
+    """
+
+    OVERFLOW_POLICIES = ("drop_oldest", "drop_newest", "raise")
+
+    def __init__(
+        self,
+        initial_capacity: int = SAMPLE_RATE * 5,
+        max_length: int = int(SAMPLE_RATE * AUDIO_BUFFER_MAX_SECONDS),
+        overflow: str = "drop_oldest",
+    ):
+        """
+        Initialize the AudioRingBuffer.
+
+        Args:
+            initial_capacity (int): Number of samples allocated up front. Defaults to 5 seconds of audio.
+            max_length (int): Maximum number of samples kept. Defaults to AUDIO_BUFFER_MAX_SECONDS of audio.
+            overflow (str): Overflow policy, one of OVERFLOW_POLICIES. Defaults to "drop_oldest".
+        """
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.initial_capacity = min(initial_capacity, max_length)
+        self.max_length = max_length
+        # Extra room at the cap, so dropping the oldest samples only compacts the storage once per half a buffer
+        self.max_capacity = max_length + max_length // 2
+        self.overflow = overflow
+        self.data = np.empty(self.initial_capacity, dtype=np.int16)
+        self.start = 0
+        self.end = 0
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    def append(self, audio: np.ndarray) -> None:
+        """
+        Append audio samples to the buffer.
+
+        Args:
+            audio (np.ndarray): Audio samples.
+
+        Raises:
+            AudioBufferOverflowError: If the buffer is full and the overflow policy is "raise".
+        """
+        overflow = len(self) + len(audio) - self.max_length
+        if overflow > 0:
+            if self.overflow == "raise":
+                raise AudioBufferOverflowError(f"Audio buffer is limited to {self.max_length} samples")
+            if self.overflow == "drop_newest":
+                audio = audio[: len(audio) - overflow]
+            elif overflow >= len(self):
+                audio = audio[len(audio) - self.max_length :]
+                self.start = self.end = 0
+            else:
+                self.start += overflow
+
+        if self.end + len(audio) > len(self.data):
+            self._reserve(len(self) + len(audio))
+        self.data[self.end : self.end + len(audio)] = audio
+        self.end += len(audio)
+
+    def _reserve(self, length: int) -> None:
+        """
+        Make room for length samples starting at the beginning of the storage, growing it geometrically if needed.
+        """
+        if length <= len(self.data) and (self.start >= len(self) or len(self.data) >= self.max_capacity):
+            self.data[: len(self)] = self.data[self.start : self.end]
+        else:
+            data = np.empty(min(max(2 * len(self.data), length), max(self.max_capacity, length)), dtype=np.int16)
+            data[: len(self)] = self.data[self.start : self.end]
+            self.data = data
+        self.start, self.end = 0, len(self)
+
+    def view(self) -> np.ndarray:
+        """
+        Get the buffered audio without copying it.
+        The view is only valid until the next call that modifies the buffer.
+
+        Returns:
+            np.ndarray: Buffered audio samples.
+        """
+        return self.data[self.start : self.end]
+
+    def pop(self) -> np.ndarray:
+        """
+        Take the buffered audio out of the buffer and start a new empty segment in the same storage.
+        Only the popped samples are copied, so the returned array stays valid after the buffer is reused.
+
+        Returns:
+            np.ndarray: Buffered audio samples.
+        """
+        segment = self.view().copy()
+        self.start = self.end = 0
+        return segment
+
+    def discard(self, length: int) -> None:
+        """
+        Drop the oldest samples without moving the rest.
+
+        Args:
+            length (int): Number of samples to drop.
+        """
+        self.start = min(self.start + length, self.end)
+
+    def clear(self) -> None:
+        """
+        Drop all buffered audio and keep the allocated storage.
+        """
+        self.start = self.end = 0
+
+
+VAD_SAMPLE_RATE: int = 16000
+VAD_AGGRESSIVENESS: int = 3  # Aggressiveness mode: 3 (most aggressive)
+MIN_SPEECH_FRAMES: int = 6
+
+
+class VoiceActivityDetector:
+    """
+    Streaming voice activity detector for one audio stream.
+    Samples that do not fill a whole frame are carried over to the next chunk, so every sample is analyzed exactly once.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = SAMPLE_RATE,
+        frame_duration: int = FRAME_DURATION,
+        aggressiveness: int = VAD_AGGRESSIVENESS,
+        resample: bool = True,
+    ):
+        """
+        Initialize the VoiceActivityDetector.
+
+        Args:
+            sample_rate (int): Sample rate of the incoming audio. Defaults to SAMPLE_RATE.
+            frame_duration (int): Duration of each frame in milliseconds (10, 20 or 30). Defaults to FRAME_DURATION.
+            aggressiveness (int): WebRTC VAD aggressiveness from 0 to 3. Defaults to VAD_AGGRESSIVENESS.
+            resample (bool): Whether to downsample the audio to VAD_SAMPLE_RATE before the detection, which makes it
+                several times cheaper. Only applied when the sample rate is a multiple of VAD_SAMPLE_RATE. Defaults to True.
+        """
+        self.sample_rate = sample_rate
+        self.step = sample_rate // VAD_SAMPLE_RATE if resample and sample_rate % VAD_SAMPLE_RATE == 0 else 1
+        self.vad_sample_rate = sample_rate // self.step
+        self.frame_samples = int(self.vad_sample_rate * frame_duration / 1000)
+        self.aggressiveness = aggressiveness
+        self.vad = self._create_vad()
+        self.remainder = np.array([], dtype=np.int16)
+
+    def _create_vad(self) -> "webrtcvad.Vad":
+        import webrtcvad
+
+        return webrtcvad.Vad(self.aggressiveness)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # The WebRTC detector can't be pickled, it is created again when the state is restored (see utils.session)
+        state = self.__dict__.copy()
+        del state["vad"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self.vad = self._create_vad()
+
+    def process(self, audio: np.ndarray) -> np.ndarray:
+        """
+        Analyze a new chunk of audio.
+
+        Args:
+            audio (np.ndarray): Audio chunk as int16 samples at the detector sample rate.
+
+        Returns:
+            np.ndarray: Speech probability of every frame completed by this chunk. WebRTC VAD makes hard decisions,
+                so the values are 0 or 1.
+        """
+        with tracer.span("vad_process", samples=len(audio)) as span:
+            probabilities = self._process(audio)
+            span.set(frames=len(probabilities))
+        return probabilities
+
+    def _process(self, audio: np.ndarray) -> np.ndarray:
+        audio = np.concatenate((self.remainder, audio)) if len(self.remainder) else audio
+        input_frame_samples = self.frame_samples * self.step
+        num_frames = len(audio) // input_frame_samples
+        self.remainder = audio[num_frames * input_frame_samples :].astype(np.int16, copy=True)
+
+        frames = audio[: num_frames * input_frame_samples]
+        if self.step > 1:
+            frames = frames.reshape(-1, self.step).mean(axis=1)
+        frames = np.ascontiguousarray(frames, dtype=np.int16)
+
+        # Frames are sliced from a single memoryview instead of being copied into separate bytes objects
+        frame_bytes = self.frame_samples * 2
+        buffer = memoryview(frames).cast("B")
+        probabilities = np.empty(num_frames, dtype=np.float32)
+        for i in range(num_frames):
+            probabilities[i] = self.vad.is_speech(buffer[i * frame_bytes : (i + 1) * frame_bytes], self.vad_sample_rate)
+        return probabilities
+
+    def has_voice(self, audio: np.ndarray, min_speech_frames: int = MIN_SPEECH_FRAMES) -> bool:
+        """
+        Analyze a new chunk of audio and check if it contains speech.
+
+        Args:
+            audio (np.ndarray): Audio chunk as int16 samples at the detector sample rate.
+            min_speech_frames (int): Number of speech frames that must be exceeded. Defaults to MIN_SPEECH_FRAMES.
+
+        Returns:
+            bool: True if voice activity is detected, False otherwise.
+        """
+        return int(np.count_nonzero(self.process(audio) > 0.5)) > min_speech_frames
+
 
 def detect_voice(audio: np.ndarray, sample_rate: int = SAMPLE_RATE, frame_duration: int = FRAME_DURATION) -> bool:
     """
@@ -24,41 +292,153 @@ def detect_voice(audio: np.ndarray, sample_rate: int = SAMPLE_RATE, frame_durati
     Returns:
         bool: True if voice activity is detected, False otherwise.
     """
-    vad = webrtcvad.Vad(3)  # Aggressiveness mode: 3 (most aggressive)
-    audio_bytes = audio.tobytes()
-    num_samples_per_frame = int(sample_rate * frame_duration / 1000)
-    frames = [audio_bytes[i : i + num_samples_per_frame * 2] for i in range(0, len(audio_bytes), num_samples_per_frame * 2)]
-
-    count_speech = 0
-    for frame in frames:
-        if len(frame) < num_samples_per_frame * 2:
-            continue
-        if vad.is_speech(frame, sample_rate):
-            count_speech += 1
-            if count_speech > 6:
-                return True
-    return False
+    return VoiceActivityDetector(sample_rate, frame_duration, resample=False).has_voice(audio)
+
+
+def normalize_word(word: str) -> str:
+    return "".join(char for char in word.lower() if char.isalnum())
+
+
+class StreamingTranscriber:
+    """
+    Incremental transcription of one recording with overlapping windows.
+
+    As soon as a window of CHUNK_LENGTH seconds is available it is transcribed. Words that fall before
+    MAX_RELIABILITY_CUTOFF seconds into the window are committed, the rest are only shown as a tentative tail,
+    since they may be cut in the middle. The next window starts STEP_LENGTH seconds later, so it overlaps the
+    committed words, and the duplicated words at its start are dropped when the hypotheses are merged.
+    """
+
+    def __init__(self, stt: "STTManager"):
+        """
+        Initialize the StreamingTranscriber.
+
+        Args:
+            stt (STTManager): STT manager used for transcription and window settings.
+        """
+        self.stt = stt
+        self.chunk_samples = int(stt.CHUNK_LENGTH * stt.SAMPLE_RATE)
+        self.step_samples = int(stt.STEP_LENGTH * stt.SAMPLE_RATE)
+        self.buffer = AudioRingBuffer()
+        self.committed: List[str] = []
+        self.tentative: List[str] = []
+        # Seconds at the start of the current window that are already covered by committed words
+        self.overlap: float = 0.0
+        self.lock = threading.Lock()
+
+    @property
+    def text(self) -> str:
+        """
+        Committed transcript followed by the tentative tail.
+        """
+        return " ".join(self.committed + self.tentative)
+
+    def add_audio(self, audio: np.ndarray) -> None:
+        """
+        Add new speech to the recording.
+
+        Args:
+            audio (np.ndarray): Audio samples.
+        """
+        with self.lock:
+            self.buffer.append(audio)
+
+    def step(self) -> str:
+        """
+        Transcribe all windows that are complete.
+
+        Returns:
+            str: Current transcript.
+        """
+        with self.lock:
+            while len(self.buffer) >= self.chunk_samples:
+                words = self._transcribe_window(self.buffer.view()[: self.chunk_samples])
+                reliable = sum(
+                    1 for i in range(len(words)) if self._word_time(i, len(words), self.stt.CHUNK_LENGTH) < self.stt.MAX_RELIABILITY_CUTOFF
+                )
+                self.committed += words[:reliable]
+                self.tentative = words[reliable:]
+                self.buffer.discard(self.step_samples)
+                self.overlap = self.stt.MAX_RELIABILITY_CUTOFF - self.stt.STEP_LENGTH
+            return self.text
+
+    def finalize(self) -> str:
+        """
+        Transcribe the audio after the last complete window and commit everything.
+
+        Returns:
+            str: Final transcript.
+        """
+        with self.lock:
+            if len(self.buffer) / self.stt.SAMPLE_RATE > self.overlap:
+                self.committed += self._transcribe_window(self.buffer.view())
+            else:
+                self.committed += self.tentative
+            self.tentative = []
+            self.buffer.clear()
+            self.overlap = 0.0
+            return self.text
+
+    def _word_time(self, index: int, num_words: int, duration: float) -> float:
+        """
+        Estimate when a word starts in a window, assuming a uniform speech rate.
+        """
+        return index * duration / max(num_words, 1)
+
+    def _transcribe_window(self, audio: np.ndarray) -> List[str]:
+        """
+        Transcribe a window and drop the words already committed from the previous window.
+        """
+        context = " ".join(self.committed[-50:])
+        words = self.stt.transcribe_numpy_array(audio, context=context).split() if len(audio) >= 500 else []
+        if not self.overlap:
+            return words
+
+        committed = [normalize_word(word) for word in self.committed[-MAX_OVERLAP_WORDS:]]
+        candidates = [normalize_word(word) for word in words[:MAX_OVERLAP_WORDS]]
+        for size in range(min(len(committed), len(candidates)), 0, -1):
+            if committed[-size:] == candidates[:size]:
+                return words[size:]
+        # No exact match, fall back to the time estimate of the overlapping part
+        duration = len(audio) / self.stt.SAMPLE_RATE
+        return [word for i, word in enumerate(words) if self._word_time(i, len(words), duration) >= self.overlap]
 
 
 class STTManager:
     """Manages speech-to-text operations."""
 
-    def __init__(self, config: Any):
+    def __init__(self, config: Any, check_status: bool = True, warmup: bool = STT_WARMUP):
         """
         Initialize the STTManager.
 
         Args:
             config (Any): Configuration object containing STT settings.
+            check_status (bool): Whether to test the service right away. Otherwise status and streaming stay None
+                until they are set externally (see utils.probes.ServiceProbes). Defaults to True.
+            warmup (bool): Whether to start loading the local model in the background right away instead of on the
+                first transcription. Only used for HF_LOCAL. Defaults to STT_WARMUP.
         """
         self.config = config
         self.SAMPLE_RATE: int = SAMPLE_RATE
         self.CHUNK_LENGTH: int = 5
         self.STEP_LENGTH: int = 3
         self.MAX_RELIABILITY_CUTOFF: int = self.CHUNK_LENGTH - 1
-        self.status: bool = self.test_stt()
-        self.streaming: bool = self.status
-        if config.stt.type == "HF_LOCAL":
-            self.pipe = pipeline("automatic-speech-recognition", model=config.stt.name)
+        self.incremental: bool = STT_INCREMENTAL
+        self.session: requests.Session = create_http_session()
+        self.openai_client: Optional["OpenAI"] = None
+        self.local_server: Optional["LocalInferenceServer"] = None
+        self.client_lock = threading.Lock()
+        self.latency = metrics.histogram("stt_transcribe_seconds", "Wall time of STT transcription calls")
+        self.audio_seconds = metrics.counter("stt_audio_seconds", "Seconds of audio sent to STT transcription")
+        self.mock: Optional[MockService] = MockService(config.stt.mock, DEFAULT_STT_CONTENT) if config.stt.type == "MOCK" else None
+        self.admission = admission.controller("stt")
+        if config.stt.type == "HF_LOCAL" and warmup:
+            self.get_local_server()
+        self.status: Optional[bool] = None
+        self.streaming: Optional[bool] = None
+        if check_status:
+            self.status = self.test_stt()
+            self.streaming = self.status
 
     def numpy_audio_to_bytes(self, audio_data: np.ndarray) -> bytes:
         """
@@ -84,49 +464,99 @@ class STTManager:
             raise AudioConversionError(f"Error converting numpy array to audio bytes: {e}")
         return buffer.getvalue()
 
-    def process_audio_chunk(self, audio: Tuple[int, np.ndarray], audio_buffer: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    def process_audio_chunk(
+        self, audio: Tuple[int, np.ndarray], audio_buffer: Optional[AudioRingBuffer], vad: Optional[VoiceActivityDetector] = None
+    ) -> Tuple[AudioRingBuffer, np.ndarray, VoiceActivityDetector]:
         """
         Process an audio chunk and update the audio buffer.
 
         Args:
             audio (Tuple[int, np.ndarray]): Audio chunk data.
-            audio_buffer (np.ndarray): Existing audio buffer.
+            audio_buffer (Optional[AudioRingBuffer]): Audio buffer of the session, created on the first chunk.
+            vad (Optional[VoiceActivityDetector]): Voice activity detector of the session, created on the first chunk.
 
         Returns:
-            Tuple[np.ndarray, np.ndarray]: Updated audio buffer and processed audio.
+            Tuple[AudioRingBuffer, np.ndarray, VoiceActivityDetector]: Updated audio buffer, processed audio, and the detector.
         """
-        has_voice = detect_voice(audio[1])
+        if audio_buffer is None:
+            audio_buffer = AudioRingBuffer()
+        if vad is None:
+            vad = VoiceActivityDetector(self.SAMPLE_RATE)
+        has_voice = vad.has_voice(audio[1])
         ended = len(audio[1]) % 24000 != 0
         if has_voice:
-            audio_buffer = np.concatenate((audio_buffer, audio[1]))
+            audio_buffer.append(audio[1])
         is_short = len(audio_buffer) / self.SAMPLE_RATE < 1.0
         if is_short or (has_voice and not ended):
-            return audio_buffer, np.array([], dtype=np.int16)
-        return np.array([], dtype=np.int16), audio_buffer
+            return audio_buffer, np.array([], dtype=np.int16), vad
+        return audio_buffer, audio_buffer.pop(), vad
 
-    def transcribe_audio(self, audio: np.ndarray, text: str = "") -> str:
+    def transcribe_audio(self, audio: Union[np.ndarray, AudioRingBuffer], text: str = "") -> str:
         """
         Transcribe audio data and append to existing text.
 
         Args:
-            audio (np.ndarray): Audio data to transcribe.
+            audio (Union[np.ndarray, AudioRingBuffer]): Audio data to transcribe.
             text (str): Existing text to append to. Defaults to empty string.
 
         Returns:
             str: Transcribed text appended to existing text.
         """
+        if isinstance(audio, AudioRingBuffer):
+            audio = audio.view()
         if len(audio) < 500:
             return text
         transcript = self.transcribe_numpy_array(audio, context=text)
 
         return f"{text} {transcript}".strip()
 
-    def transcribe_and_add_to_chat(self, audio: np.ndarray, chat: List[List[Optional[str]]]) -> List[List[Optional[str]]]:
+    def process_audio_chunk_incremental(
+        self,
+        audio: Tuple[int, np.ndarray],
+        transcriber: Optional[StreamingTranscriber],
+        vad: Optional[VoiceActivityDetector] = None,
+    ) -> Tuple[StreamingTranscriber, str, VoiceActivityDetector]:
+        """
+        Process an audio chunk in incremental mode, transcribing overlapping windows as the audio arrives.
+
+        Args:
+            audio (Tuple[int, np.ndarray]): Audio chunk data.
+            transcriber (Optional[StreamingTranscriber]): Transcriber of the session, created on the first chunk.
+            vad (Optional[VoiceActivityDetector]): Voice activity detector of the session, created on the first chunk.
+
+        Returns:
+            Tuple[StreamingTranscriber, str, VoiceActivityDetector]: The transcriber, current transcript, and the detector.
+        """
+        if transcriber is None:
+            transcriber = StreamingTranscriber(self)
+        if vad is None:
+            vad = VoiceActivityDetector(self.SAMPLE_RATE)
+        if vad.has_voice(audio[1]):
+            transcriber.add_audio(audio[1])
+        return transcriber, transcriber.step(), vad
+
+    def finish_transcription(self, transcriber: Optional[StreamingTranscriber]) -> str:
+        """
+        Transcribe the rest of the recording in incremental mode.
+
+        Args:
+            transcriber (Optional[StreamingTranscriber]): Transcriber of the session.
+
+        Returns:
+            str: Final transcript.
+        """
+        if transcriber is None:
+            return ""
+        return transcriber.finalize()
+
+    def transcribe_and_add_to_chat(
+        self, audio: Union[np.ndarray, AudioRingBuffer], chat: List[List[Optional[str]]]
+    ) -> List[List[Optional[str]]]:
         """
         Transcribe audio and add the result to the chat history.
 
         Args:
-            audio (np.ndarray): Audio data to transcribe.
+            audio (Union[np.ndarray, AudioRingBuffer]): Audio data to transcribe.
             chat (List[List[Optional[str]]]): Existing chat history.
 
         Returns:
@@ -154,13 +584,14 @@ class STTManager:
         chat[-1][0] = text
         return chat
 
-    def transcribe_numpy_array(self, audio: np.ndarray, context: Optional[str] = None) -> str:
+    def transcribe_numpy_array(self, audio: np.ndarray, context: Optional[str] = None, priority: int = PRIORITY_TURN) -> str:
         """
-        Transcribe audio data using the configured STT service.
+        Transcribe audio data using the configured STT service, the call waits for admission (see utils.admission).
 
         Args:
             audio (np.ndarray): Audio data as a numpy array.
             context (Optional[str]): Optional context for transcription.
+            priority (int): Admission priority of the call. Defaults to PRIORITY_TURN.
 
         Returns:
             str: Transcribed text.
@@ -172,17 +603,55 @@ class STTManager:
             "OPENAI_API": self._transcribe_openai,
             "HF_API": self._transcribe_hf_api,
             "HF_LOCAL": self._transcribe_hf_local,
+            "MOCK": self._transcribe_mock,
         }
 
         try:
             transcribe_method = transcription_methods.get(self.config.stt.type)
             if transcribe_method:
-                return transcribe_method(audio, context)
+                audio_seconds = len(audio) / self.SAMPLE_RATE
+                self.audio_seconds.inc(audio_seconds)
+                with self.admission.slot(priority), self.latency.time():
+                    with tracer.span("stt_transcribe", type=self.config.stt.type, audio_seconds=audio_seconds) as span:
+                        transcription = transcribe_method(audio, context)
+                        span.set(characters=len(transcription))
+                        return transcription
             else:
                 raise APIError(f"Unsupported STT type: {self.config.stt.type}")
         except Exception as e:
             raise APIError(f"STT Error: Unexpected error: {e}")
 
+    def get_openai_client(self) -> "OpenAI":
+        """
+        Get the OpenAI client, creating it on first use.
+        The client is shared by all threads, so its connection pool survives between transcribed chunks.
+
+        Returns:
+            OpenAI: The client.
+        """
+        if self.openai_client is None:
+            with self.client_lock:
+                if self.openai_client is None:
+                    from openai import OpenAI
+
+                    self.openai_client = OpenAI(
+                        base_url=self.config.stt.url, api_key=self.config.stt.key, timeout=STT_TIMEOUT, max_retries=STT_MAX_RETRIES
+                    )
+        return self.openai_client
+
+    def get_local_server(self) -> "LocalInferenceServer":
+        """
+        Get the shared local inference server, which loads the model in the background on first use.
+
+        Returns:
+            LocalInferenceServer: The server.
+        """
+        if self.local_server is None:
+            from api.local_stt import LocalInferenceServer
+
+            self.local_server = LocalInferenceServer.get(self.config.stt.name)
+        return self.local_server
+
     def _transcribe_openai(self, audio: np.ndarray, context: Optional[str]) -> str:
         """
         Transcribe audio using OpenAI API.
@@ -196,7 +665,7 @@ class STTManager:
         """
         audio_bytes = self.numpy_audio_to_bytes(audio)
         data = ("temp.wav", audio_bytes, "audio/wav")
-        client = OpenAI(base_url=self.config.stt.url, api_key=self.config.stt.key)
+        client = self.get_openai_client()
         return client.audio.transcriptions.create(model=self.config.stt.name, file=data, response_format="text", prompt=context)
 
     def _transcribe_hf_api(self, audio: np.ndarray, _context: Optional[str]) -> str:
@@ -215,7 +684,7 @@ class STTManager:
         """
         audio_bytes = self.numpy_audio_to_bytes(audio)
         headers = {"Authorization": f"Bearer {self.config.stt.key}"}
-        response = requests.post(self.config.stt.url, headers=headers, data=audio_bytes)
+        response = self.session.post(self.config.stt.url, headers=headers, data=audio_bytes)
         if response.status_code != 200:
             error_details = response.json().get("error", "No error message provided")
             raise APIError("STT Error: HF API error", status_code=response.status_code, details=error_details)
@@ -226,7 +695,7 @@ class STTManager:
 
     def _transcribe_hf_local(self, audio: np.ndarray, _context: Optional[str]) -> str:
         """
-        Transcribe audio using local Hugging Face model.
+        Transcribe audio using local Hugging Face model, batched with concurrent requests of other sessions.
 
         Args:
             audio (np.ndarray): Audio data as a numpy array.
@@ -235,8 +704,20 @@ class STTManager:
         Returns:
             str: Transcribed text.
         """
-        result = self.pipe({"sampling_rate": self.SAMPLE_RATE, "raw": audio.astype(np.float32) / 32768.0})
-        return result["text"]
+        return self.get_local_server().transcribe(audio.astype(np.float32) / 32768.0, self.SAMPLE_RATE)
+
+    def _transcribe_mock(self, audio: np.ndarray, _context: Optional[str]) -> str:
+        """
+        Return a canned transcription with the delays of the mock settings.
+
+        Args:
+            audio (np.ndarray): Audio data as a numpy array.
+            _context (Optional[str]): Unused context parameter.
+
+        Returns:
+            str: Transcribed text.
+        """
+        return "".join(self.mock.stream(self.mock.text_chunks()))
 
     def test_stt(self) -> bool:
         """
@@ -255,17 +736,25 @@ class STTManager:
 class TTSManager:
     """Manages text-to-speech operations."""
 
-    def __init__(self, config: Any):
+    def __init__(self, config: Any, check_status: bool = True):
         """
         Initialize the TTSManager.
 
         Args:
             config (Any): Configuration object containing TTS settings.
+            check_status (bool): Whether to test the service right away. Otherwise status and streaming stay None
+                until they are set externally (see utils.probes.ServiceProbes). Defaults to True.
         """
         self.config = config
         self.SAMPLE_RATE: int = SAMPLE_RATE
-        self.status: bool = self.test_tts(stream=False)
-        self.streaming: bool = self.test_tts(stream=True) if self.status else False
+        self.session: requests.Session = create_http_session()
+        self.mock: Optional[MockService] = MockService(config.tts.mock, "") if config.tts.type == "MOCK" else None
+        self.admission = admission.controller("tts")
+        self.status: Optional[bool] = None
+        self.streaming: Optional[bool] = None
+        if check_status:
+            self.status = self.test_tts(stream=False)
+            self.streaming = self.test_tts(stream=True) if self.status else False
 
     def test_tts(self, stream: bool) -> bool:
         """
@@ -283,13 +772,14 @@ class TTSManager:
         except:
             return False
 
-    def read_text(self, text: str, stream: Optional[bool] = None) -> Generator[bytes, None, None]:
+    def read_text(self, text: str, stream: Optional[bool] = None, priority: int = PRIORITY_TURN) -> Generator[bytes, None, None]:
         """
-        Convert text to speech using the configured TTS service.
+        Convert text to speech using the configured TTS service, the call waits for admission (see utils.admission).
 
         Args:
             text (str): Text to convert to speech.
             stream (Optional[bool]): Whether to stream the audio. Defaults to self.streaming if not provided.
+            priority (int): Admission priority of the call. Defaults to PRIORITY_TURN.
 
         Yields:
             bytes: Audio data in bytes.
@@ -307,7 +797,14 @@ class TTSManager:
         data = {"model": self.config.tts.name, "input": text, "voice": "alloy", "response_format": "opus"}
 
         try:
-            yield from self._read_text_stream(headers, data) if stream else self._read_text_non_stream(headers, data)
+            with tracer.span("tts_read_text", unit="bytes", type=self.config.tts.type, stream=bool(stream), characters=len(text)) as span:
+                if self.mock is not None:
+                    chunks = self._read_text_mock(text, stream)
+                else:
+                    chunks = self._read_text_stream(headers, data) if stream else self._read_text_non_stream(headers, data)
+                for chunk in self.admission.stream(chunks, priority, len(text) / CHARS_PER_TOKEN):
+                    span.chunk(len(chunk))
+                    yield chunk
         except APIError:
             raise
         except Exception as e:
@@ -335,7 +832,7 @@ class TTSManager:
         else:
             raise APIError(f"TTS Error: Unsupported TTS type: {self.config.tts.type}")
 
-        response = requests.post(url, headers=headers, json=data)
+        response = self.session.post(url, headers=headers, json=data)
         if response.status_code != 200:
             error_details = response.json().get("error", "No error message provided")
             raise APIError(f"TTS Error: {self.config.tts.type} error", status_code=response.status_code, details=error_details)
@@ -359,12 +856,29 @@ class TTSManager:
             raise APIError("TTS Error: Streaming not supported for this TTS type")
 
         url = f"{self.config.tts.url}/audio/speech"
-        with requests.post(url, headers=headers, json=data, stream=True) as response:
+        with self.session.post(url, headers=headers, json=data, stream=True) as response:
             if response.status_code != 200:
                 error_details = response.json().get("error", "No error message provided")
                 raise APIError("TTS Error: OPENAI API error", status_code=response.status_code, details=error_details)
             yield from response.iter_content(chunk_size=1024)
 
+    def _read_text_mock(self, text: str, stream: bool) -> Generator[bytes, None, None]:
+        """
+        Return silent audio as long as the text with the delays of the mock settings.
+
+        Args:
+            text (str): Text to convert to speech.
+            stream (bool): Whether to stream the audio.
+
+        Yields:
+            bytes: Audio data in bytes.
+        """
+        chunks = self.mock.stream(self.mock.audio_chunks(text))
+        if stream:
+            yield from chunks
+        else:
+            yield b"".join(chunks)
+
     def read_last_message(self, chat_history: List[List[Optional[str]]]) -> Generator[bytes, None, None]:
         """
         Read the last message in the chat history.
@@ -0,0 +1,294 @@
+import difflib
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from utils.metrics import metrics
+
+CODE_MARKER = "\nMY NOTES AND CODE:\n"
+CODE_CHANGES_MARKER = "\nMY CODE CHANGES SINCE THE PREVIOUS FULL VERSION:\n"
+CODE_DIFF_MARKER = "\nMY CODE CHANGES SINCE THE LAST VERSION I SHARED (UNIFIED DIFF):\n"
+OLD_CODE_STUB = "\n[An older version of my notes and code was here, the latest version is below]"
+DROPPED_STUB = "[The first {} messages of the interview are omitted]"
+
+# Token budget of the prompt, 0 sends the chat history as it is
+LLM_CONTEXT_TOKENS: int = int(os.getenv("LLM_CONTEXT_TOKENS", 0))
+LLM_CONTEXT_RECENT_MESSAGES: int = int(os.getenv("LLM_CONTEXT_RECENT_MESSAGES", 8))
+LLM_CONTEXT_DROP_STEP: int = int(os.getenv("LLM_CONTEXT_DROP_STEP", 8))
+LLM_CONTEXT_SUMMARY: bool = bool(os.getenv("LLM_CONTEXT_SUMMARY", False))
+MAX_SUMMARIES: int = 256
+# Rough estimate that works well enough for English text and code without loading a tokenizer
+CHARS_PER_TOKEN: int = 4
+MESSAGE_OVERHEAD_TOKENS: int = 4
+PROMPT_TOKEN_BUCKETS: Tuple[float, ...] = (500, 1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000)
+HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+\d+(?:,\d+)? @@")
+
+
+def estimate_tokens(messages: List[Dict[str, str]]) -> int:
+    """
+    Estimate the number of prompt tokens of the messages.
+
+    Args:
+        messages (List[Dict[str, str]]): Messages in OpenAI format.
+
+    Returns:
+        int: Estimated number of tokens.
+    """
+    return sum(len(message["content"]) // CHARS_PER_TOKEN + MESSAGE_OVERHEAD_TOKENS for message in messages)
+
+
+def split_code(content: str) -> Tuple[str, Optional[str]]:
+    """
+    Split a candidate message into the spoken part and the attached code snapshot.
+
+    Args:
+        content (str): Message content.
+
+    Returns:
+        Tuple[str, Optional[str]]: The spoken part and the code, or None if there is no code snapshot.
+    """
+    if CODE_MARKER not in content:
+        return content, None
+    message, code = content.split(CODE_MARKER, 1)
+    return message, code
+
+
+def code_diff(old_code: str, new_code: str, context_lines: int = 1) -> str:
+    """
+    Get a compact unified diff between two versions of the code.
+
+    Args:
+        old_code (str): Previous version.
+        new_code (str): Current version.
+        context_lines (int): Number of unchanged lines around every change. Defaults to 1.
+
+    Returns:
+        str: The diff without the file headers.
+    """
+    lines = list(difflib.unified_diff(old_code.splitlines(), new_code.splitlines(), lineterm="", n=context_lines))
+    # The file headers are the first two lines, a changed line may start with "--" or "++" too
+    return "\n".join(lines[2:])
+
+
+def apply_code_diff(old_code: str, diff: str) -> str:
+    """
+    Apply a diff made by code_diff to the version it was made against.
+
+    Args:
+        old_code (str): Previous version.
+        diff (str): Diff from the previous version to the new one.
+
+    Returns:
+        str: The new version.
+    """
+    old_lines = old_code.splitlines()
+    new_lines = []
+    position = 0
+    for line in diff.split("\n") if diff else []:
+        header = HUNK_HEADER.match(line)
+        if header:
+            # An empty range starts after its line number, any other one at it
+            start = int(header.group(1)) - (header.group(2) != "0")
+            new_lines += old_lines[position:start]
+            position = start
+        elif line.startswith("+"):
+            new_lines.append(line[1:])
+        elif line.startswith("-"):
+            position += 1
+        elif line.startswith(" "):
+            new_lines.append(line[1:])
+            position += 1
+    return "\n".join(new_lines + old_lines[position:])
+
+
+def latest_code(chat_history: List[Dict[str, str]]) -> Optional[str]:
+    """
+    Get the last version of the code the candidate shared, following the diffs after the last full snapshot.
+
+    Args:
+        chat_history (List[Dict[str, str]]): The chat history.
+
+    Returns:
+        Optional[str]: The code, or None if no code was shared.
+    """
+    code = None
+    for message in chat_history:
+        if message["role"] != "user":
+            continue
+        if CODE_MARKER in message["content"]:
+            code = split_code(message["content"])[1]
+        elif CODE_DIFF_MARKER in message["content"] and code is not None:
+            code = apply_code_diff(code, message["content"].split(CODE_DIFF_MARKER, 1)[1])
+    return code
+
+
+class ContextWindow:
+    """
+    Builds the messages sent to the LLM on every turn from the full chat history, within a token budget.
+    The chat history itself is never changed, it is still used as a whole for the feedback.
+
+    The window is opt-in, with a budget of 0 the chat history is sent as it is.
+    The system prompt, the latest code snapshot, the code diffs sent after it and the recent messages are sent
+    verbatim. Older code snapshots are replaced by the diff to the snapshot before them if it is shorter, the oldest
+    snapshot that is kept is sent in full, so every diff is based on code the model can see. If it is still over the
+    budget, the oldest messages are dropped in steps of several messages and replaced by a stub or, if enabled, by a
+    summary made in the background. Both replacements only change when the window moves, so the prompt prefix stays
+    the same between most turns and can be served from the prompt cache.
+    """
+
+    def __init__(
+        self,
+        budget: int = LLM_CONTEXT_TOKENS,
+        recent_messages: int = LLM_CONTEXT_RECENT_MESSAGES,
+        drop_step: int = LLM_CONTEXT_DROP_STEP,
+        summarize: Optional[Callable[[List[Dict[str, str]]], str]] = None,
+    ):
+        """
+        Initialize the ContextWindow.
+
+        Args:
+            budget (int): Token budget of the prompt, 0 disables the window. Defaults to LLM_CONTEXT_TOKENS.
+            recent_messages (int): Number of latest messages that are never dropped. Defaults to LLM_CONTEXT_RECENT_MESSAGES.
+            drop_step (int): Number of messages dropped at once when the prompt is over the budget. Defaults to LLM_CONTEXT_DROP_STEP.
+            summarize (Optional[Callable[[List[Dict[str, str]]], str]]): Function that summarizes dropped messages.
+                It is called in a background thread, the dropped messages are replaced by a stub until it is done.
+                Defaults to None, dropped messages are always replaced by a stub.
+        """
+        self.budget = budget
+        self.recent_messages = recent_messages
+        self.drop_step = max(1, drop_step)
+        self.summarize = summarize
+        self.summaries: OrderedDict[str, str] = OrderedDict()
+        self.pending: set = set()
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="context-summary") if summarize else None
+        self.prompt_tokens = metrics.histogram("llm_prompt_tokens", "Estimated prompt tokens per turn", buckets=PROMPT_TOKEN_BUCKETS)
+        self.saved_tokens = metrics.counter("llm_context_saved_tokens", "Estimated prompt tokens removed by the context window")
+
+    def build(self, chat_history: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """
+        Build the messages for the next LLM call.
+
+        Args:
+            chat_history (List[Dict[str, str]]): Full chat history, starting with the system prompt.
+
+        Returns:
+            List[Dict[str, str]]: Messages to send.
+        """
+        if not self.budget:
+            self.prompt_tokens.observe(estimate_tokens(chat_history))
+            return list(chat_history)
+
+        num_system = 0
+        while num_system < len(chat_history) and chat_history[num_system]["role"] == "system":
+            num_system += 1
+        system, turns = chat_history[:num_system], chat_history[num_system:]
+        compacted = self.compact_code(turns)
+
+        drop = self._drop_count(system, turns, compacted)
+        if drop:
+            # The code kept after the dropped messages is compacted again, anchored at its oldest snapshot
+            compacted = [self._replacement(compacted[:drop])] + self.compact_code(turns[drop:])
+        messages = system + compacted
+
+        full_tokens = estimate_tokens(chat_history)
+        tokens = estimate_tokens(messages)
+        self.prompt_tokens.observe(tokens)
+        self.saved_tokens.inc(full_tokens - tokens)
+        logging.info(f"Prompt size: ~{tokens} tokens, ~{full_tokens} without compaction, {drop} oldest messages dropped")
+        return messages
+
+    def compact_code(self, turns: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """
+        Replace the code snapshots between the oldest and the latest one by diffs to the snapshot before them.
+        The oldest snapshot stays in full, as does a snapshot whose diff is not shorter, so every diff is based on
+        code the model can see. Code diffs sent before the oldest snapshot are based on code that was dropped,
+        they are replaced by a stub.
+
+        Args:
+            turns (List[Dict[str, str]]): Messages without the system prompt.
+
+        Returns:
+            List[Dict[str, str]]: Messages with compacted code, the unchanged ones are not copied.
+        """
+        snapshots = self._snapshots(turns)
+        compacted = list(turns)
+        for i in range(snapshots[0] if snapshots else len(turns)):
+            if turns[i]["role"] == "user" and CODE_DIFF_MARKER in turns[i]["content"]:
+                compacted[i] = {"role": "user", "content": turns[i]["content"].split(CODE_DIFF_MARKER, 1)[0] + OLD_CODE_STUB}
+        previous_code = None
+        for i in snapshots[:-1]:
+            message, code = split_code(turns[i]["content"])
+            diff = code_diff(previous_code, code) if previous_code is not None else None
+            if diff is not None and len(diff) < len(code):
+                compacted[i] = {"role": "user", "content": message + CODE_CHANGES_MARKER + diff}
+            previous_code = code
+        return compacted
+
+    @staticmethod
+    def _snapshots(turns: List[Dict[str, str]]) -> List[int]:
+        return [i for i, message in enumerate(turns) if message["role"] == "user" and CODE_MARKER in message["content"]]
+
+    def _drop_count(self, system: List[Dict[str, str]], turns: List[Dict[str, str]], compacted: List[Dict[str, str]]) -> int:
+        tokens = estimate_tokens(system) + estimate_tokens(compacted)
+        if tokens <= self.budget:
+            return 0
+        # Never drop the recent messages or the latest code snapshot
+        max_drop = max(0, len(turns) - self.recent_messages)
+        snapshots = self._snapshots(turns)
+        if snapshots:
+            max_drop = min(max_drop, snapshots[-1])
+
+        drop = 0
+        while drop < max_drop:
+            next_drop = min(drop + self.drop_step, max_drop)
+            tokens -= estimate_tokens(compacted[drop:next_drop])
+            drop = next_drop
+            # The oldest snapshot left is sent in full again, the stubs of the diffs before it are not counted
+            anchor = next((i for i in snapshots if i >= drop), None)
+            extra = estimate_tokens([turns[anchor]]) - estimate_tokens([compacted[anchor]]) if anchor is not None else 0
+            extra += len(DROPPED_STUB.format(drop)) // CHARS_PER_TOKEN + MESSAGE_OVERHEAD_TOKENS
+            if tokens + extra <= self.budget:
+                break
+        return drop
+
+    def _replacement(self, dropped: List[Dict[str, str]]) -> Dict[str, str]:
+        summary = self._get_summary(dropped)
+        if summary:
+            content = f"[Summary of the first {len(dropped)} messages of the interview]\n{summary}"
+        else:
+            content = DROPPED_STUB.format(len(dropped))
+        # Sent as a candidate message, so the conversation still starts with one after the system prompt
+        return {"role": "user", "content": content}
+
+    def _get_summary(self, dropped: List[Dict[str, str]]) -> Optional[str]:
+        if self.executor is None:
+            return None
+        key = hashlib.sha256(json.dumps(dropped, sort_keys=True).encode()).hexdigest()
+        with self.lock:
+            if key in self.summaries:
+                self.summaries.move_to_end(key)
+                return self.summaries[key]
+            if key not in self.pending:
+                self.pending.add(key)
+                self.executor.submit(self._summarize, key, dropped)
+        return None
+
+    def _summarize(self, key: str, dropped: List[Dict[str, str]]) -> None:
+        try:
+            summary = self.summarize(dropped)
+        except Exception as e:
+            logging.error(f"Failed to summarize {len(dropped)} messages: {e}")
+            summary = None
+        with self.lock:
+            self.pending.discard(key)
+            if summary:
+                self.summaries[key] = summary
+                while len(self.summaries) > MAX_SUMMARIES:
+                    self.summaries.popitem(last=False)
@@ -1,10 +1,64 @@
+import asyncio
+import contextlib
 import os
-from openai import OpenAI
-import anthropic
-from utils.errors import APIError
-from typing import List, Dict, Generator, Optional, Tuple, Any
+import queue
+import threading
+import time
+from api.mock import DEFAULT_LLM_CONTENT, MockService
+from api.response_cache import ResponseCache
+from api.context import (
+    CODE_DIFF_MARKER,
+    CODE_MARKER,
+    CHARS_PER_TOKEN,
+    LLM_CONTEXT_SUMMARY,
+    ContextWindow,
+    code_diff,
+    estimate_tokens,
+    latest_code,
+)
+from resources.prompts import context_summary_prompt
+from utils.admission import PRIORITY_TASK, PRIORITY_TURN, admission
+from utils.errors import AdmissionTimeout, APIError
+from utils.metrics import metrics
+from utils.resilience import CircuitBreaker, backoff_delay, is_retryable
+from utils.tracing import tracer
+from typing import List, Dict, Generator, AsyncGenerator, Optional, Tuple, Any
 import logging
 
+# Mark the stable prompt prefix for Anthropic prompt caching, the OpenAI API caches long prefixes automatically
+PROMPT_CACHING: bool = not os.getenv("DISABLE_PROMPT_CACHING", False)
+ANTHROPIC_PROMPT_CACHING_BETA = "prompt-caching-2024-07-31"
+# Ask OpenAI compatible APIs to send the token usage at the end of a stream, can be disabled for APIs that reject it
+LLM_STREAM_USAGE: bool = not os.getenv("DISABLE_LLM_STREAM_USAGE", False)
+# Interview types that send code changes as unified diffs, e.g. "coding,sql", and how many diffs in a row before a full
+# snapshot again. None by default, every turn then sends the full code
+CODE_DIFF_INTERVIEW_TYPES: List[str] = [t for t in os.getenv("CODE_DIFF_INTERVIEW_TYPES", "").split(",") if t]
+CODE_FULL_REFRESH_EVERY: int = int(os.getenv("CODE_FULL_REFRESH_EVERY", 5))
+CODE_DIFF_CONTEXT_LINES: int = 3
+# Calls that fail before their first token with a transient error are retried with exponential backoff on the next endpoint.
+# Unset, they are retried twice if there are fallback endpoints and not at all with a single one
+LLM_MAX_RETRIES: Optional[int] = int(os.environ["LLM_MAX_RETRIES"]) if os.getenv("LLM_MAX_RETRIES") else None
+LLM_RETRY_BACKOFF: float = float(os.getenv("LLM_RETRY_BACKOFF", 0.5))
+LLM_RETRY_MAX_BACKOFF: float = 8
+# An endpoint is skipped for a cooldown after this many failures in a row
+LLM_BREAKER_FAILURES: int = int(os.getenv("LLM_BREAKER_FAILURES", 3))
+LLM_BREAKER_COOLDOWN: float = float(os.getenv("LLM_BREAKER_COOLDOWN", 30))
+# Seconds without the first token of a stream before a second call is started, 0 disables hedging
+LLM_HEDGE_AFTER: float = float(os.getenv("LLM_HEDGE_AFTER", 0))
+
+
+def text_tokens(text: str) -> float:
+    """
+    Estimate the number of tokens of generated text.
+
+    Args:
+        text (str): Text chunk.
+
+    Returns:
+        float: Estimated number of tokens.
+    """
+    return len(text) / CHARS_PER_TOKEN
+
 
 class PromptManager:
     def __init__(self, prompts: Dict[str, str]):
@@ -66,35 +120,178 @@ class PromptManager:
         return self.add_limit(prompt)
 
 
+class _CallHandle:
+    """Responses of a call that runs in a thread, so another thread can close them to stop the call."""
+
+    def __init__(self):
+        self.responses: List[Any] = []
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def track(self, response: Any) -> Any:
+        """
+        Register a response of the call, it is closed right away if the call was closed already.
+
+        Args:
+            response (Any): SDK stream with a close method.
+
+        Returns:
+            Any: The response.
+        """
+        with self.lock:
+            self.responses.append(response)
+            closed = self.closed
+        if closed:
+            response.close()
+        return response
+
+    def close(self) -> None:
+        """
+        Close the responses of the call, a read blocked on one of them fails.
+        """
+        with self.lock:
+            self.closed = True
+            responses, self.responses = self.responses, []
+        for response in responses:
+            try:
+                response.close()
+            except Exception as e:
+                logging.debug(f"Closing an LLM response failed: {e}")
+
+
+class LLMEndpoint:
+    """One LLM API with its SDK clients and circuit breaker."""
+
+    def __init__(self, config: Any, name: str):
+        """
+        Initialize the LLMEndpoint.
+
+        Args:
+            config (Any): Service configuration of the endpoint (see utils.config.ServiceConfig).
+            name (str): Endpoint name, the prefix of its metrics.
+        """
+        self.config = config
+        self.type = config.type
+        self.mock: Optional[MockService] = MockService(config.mock, DEFAULT_LLM_CONTENT) if self.type == "MOCK" else None
+        # The SDK clients are created on first use, so only the SDK of the configured API is ever imported
+        self._client: Any = None
+        self._async_client: Any = None
+        self.client_lock = threading.Lock()
+        self.breaker = CircuitBreaker(name, LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN)
+
+    def _create_clients(self) -> None:
+        with self.client_lock:
+            if self.type == "ANTHROPIC_API":
+                import anthropic
+
+                self._client = self._client or anthropic.Anthropic(api_key=self.config.key)
+                self._async_client = self._async_client or anthropic.AsyncAnthropic(api_key=self.config.key)
+            else:
+                # all other API types suppose to support OpenAI format
+                from openai import OpenAI, AsyncOpenAI
+
+                self._client = self._client or OpenAI(base_url=self.config.url, api_key=self.config.key)
+                self._async_client = self._async_client or AsyncOpenAI(base_url=self.config.url, api_key=self.config.key)
+
+    @property
+    def client(self) -> Any:
+        """Synchronous SDK client, created on first use."""
+        if self._client is None:
+            self._create_clients()
+        return self._client
+
+    @client.setter
+    def client(self, client: Any) -> None:
+        self._client = client
+
+    @property
+    def async_client(self) -> Any:
+        """Asynchronous SDK client, created on first use."""
+        if self._async_client is None:
+            self._create_clients()
+        return self._async_client
+
+    @async_client.setter
+    def async_client(self, client: Any) -> None:
+        self._async_client = client
+
+
 class LLMManager:
-    def __init__(self, config: Any, prompts: Dict[str, str]):
+    def __init__(self, config: Any, prompts: Dict[str, str], check_status: bool = True, response_cache: Optional[ResponseCache] = None):
         """
         Initialize the LLMManager.
 
         Args:
             config (Any): Configuration object containing LLM settings.
             prompts (Dict[str, str]): A dictionary of prompts for the PromptManager.
+            check_status (bool): Whether to test the connection right away. Otherwise status and streaming stay None
+                until they are set externally (see utils.probes.ServiceProbes). Defaults to True.
+            response_cache (Optional[ResponseCache]): Cache of responses, used by the calls that allow caching.
+                Defaults to None, every call goes to the API.
         """
         self.config = config
+        self.response_cache = response_cache
         self.llm_type = config.llm.type
-        if self.llm_type == "ANTHROPIC_API":
-            self.client = anthropic.Anthropic(api_key=config.llm.key)
-        else:
-            # all other API types suppose to support OpenAI format
-            self.client = OpenAI(base_url=config.llm.url, api_key=config.llm.key)
+        # The main endpoint first, then the fallbacks (see utils.config.fallback_configs)
+        endpoints = getattr(config, "llm_endpoints", None)
+        if not isinstance(endpoints, list) or not endpoints:
+            endpoints = [config.llm]
+        self.endpoints = [LLMEndpoint(endpoint, f"llm_endpoint_{i + 1}") for i, endpoint in enumerate(endpoints)]
+        # Shared by every LLMManager of the process, the limits belong to the provider account
+        self.admission = admission.controller("llm")
 
         self.prompt_manager = PromptManager(prompts)
+        self.uncached_input_tokens = metrics.counter("llm_uncached_input_tokens", "Input tokens processed without the prompt cache")
+        self.cached_input_tokens = metrics.counter("llm_cached_input_tokens", "Input tokens read from the prompt cache")
+        self.output_tokens = metrics.counter("llm_output_tokens", "Generated tokens")
+        self.code_diff_saved_tokens = metrics.counter("llm_code_diff_saved_tokens", "Estimated tokens saved by sending code diffs")
+        self.retries = metrics.counter("llm_retries", "LLM calls retried after a failure")
+        self.hedges = metrics.counter("llm_hedged_requests", "Second LLM calls started because the first token was late")
+        self.hedge_wins = metrics.counter("llm_hedge_wins", "Second LLM calls that produced the first token before the first call")
+        self.context_window = ContextWindow(summarize=self.summarize_messages if LLM_CONTEXT_SUMMARY else None)
+
+        self.status: Optional[bool] = None
+        self.streaming: Optional[bool] = None
+        if check_status:
+            self.status = self.test_llm(stream=False)
+            self.streaming = self.test_llm(stream=True) if self.status else False
+
+    @property
+    def mock(self) -> Optional[MockService]:
+        """Mock service of the main endpoint, if it is a MOCK one."""
+        return self.endpoints[0].mock
+
+    @property
+    def client(self) -> Any:
+        """Synchronous SDK client of the main endpoint, created on first use."""
+        return self.endpoints[0].client
+
+    @client.setter
+    def client(self, client: Any) -> None:
+        self.endpoints[0].client = client
+
+    @property
+    def async_client(self) -> Any:
+        """Asynchronous SDK client of the main endpoint, created on first use."""
+        return self.endpoints[0].async_client
 
-        self.status = self.test_llm(stream=False)
-        self.streaming = self.test_llm(stream=True) if self.status else False
+    @async_client.setter
+    def async_client(self, client: Any) -> None:
+        self.endpoints[0].async_client = client
 
-    def get_text(self, messages: List[Dict[str, str]], stream: Optional[bool] = None) -> Generator[str, None, None]:
+    def get_text(
+        self, messages: List[Dict[str, str]], stream: Optional[bool] = None, cache: bool = False, priority: int = PRIORITY_TURN
+    ) -> Generator[str, None, None]:
         """
         Generate text from the LLM, optionally streaming the response.
+        Calls to the API wait for admission (see utils.admission), responses from the cache do not.
 
         Args:
             messages (List[Dict[str, str]]): List of message dictionaries.
             stream (Optional[bool]): Whether to stream the response. Defaults to self.streaming if not provided.
+            cache (bool): Whether the response may come from the response cache, if there is one. Only for the calls
+                whose replay is acceptable, e.g. reruns of simulated interviews. Defaults to False.
+            priority (int): Admission priority of the call. Defaults to PRIORITY_TURN.
 
         Yields:
             str: Generated text chunks.
@@ -105,58 +302,531 @@ class LLMManager:
         if stream is None:
             stream = self.streaming
         try:
-            if self.llm_type == "OPENAI_API":
-                yield from self._get_text_openai(messages, stream)
-            elif self.llm_type == "ANTHROPIC_API":
-                yield from self._get_text_anthropic(messages, stream)
+            with tracer.span("llm_get_text", unit="tokens", type=self.llm_type, stream=bool(stream)) as span:
+                # Endpoints that answered, a reply from a fallback is not stored under the key of the main endpoint
+                answered: List[LLMEndpoint] = []
+                generate = lambda: self._generate(messages, stream, answered, priority)
+                if cache and self.response_cache is not None:
+                    store = lambda: answered == [self.endpoints[0]]
+                    replies = self.response_cache.cached(self._cache_key(messages, stream), generate, store)
+                else:
+                    replies = generate()
+                for text in replies:
+                    span.chunk(text_tokens(text))
+                    yield text
         except Exception as e:
             raise APIError(f"LLM Get Text Error: Unexpected error: {e}")
 
-    def _get_text_openai(self, messages: List[Dict[str, str]], stream: bool) -> Generator[str, None, None]:
+    def _pick_endpoint(self, offset: int) -> LLMEndpoint:
+        """
+        Choose the endpoint of a call: the first one with a closed circuit, starting from the offset.
+
+        Args:
+            offset (int): Index of the first endpoint to consider, retries and hedged calls start from the next ones.
+
+        Returns:
+            LLMEndpoint: The endpoint.
+        """
+        order = [self.endpoints[(offset + i) % len(self.endpoints)] for i in range(len(self.endpoints))]
+        for endpoint in order:
+            if endpoint.breaker.allow():
+                return endpoint
+        # Every circuit is open, the one that opened first is the closest to recovery
+        return min(order, key=lambda endpoint: endpoint.breaker.opened_at)
+
+    def _max_retries(self) -> int:
+        if LLM_MAX_RETRIES is not None:
+            return LLM_MAX_RETRIES
+        return 2 if len(self.endpoints) > 1 else 0
+
+    def _generate(
+        self, messages: List[Dict[str, str]], stream: bool, answered: Optional[List[LLMEndpoint]] = None, priority: int = PRIORITY_TURN
+    ) -> Generator[str, None, None]:
+        """
+        Generate text, retrying the calls that fail before their first token with a transient error with exponential backoff.
+        Every retry goes to the next endpoint, and streamed calls are hedged if LLM_HEDGE_AFTER is set.
+        Every attempt is an admitted call (see utils.admission), the slot is released while waiting for the retry.
+
+        Args:
+            messages (List[Dict[str, str]]): List of message dictionaries.
+            stream (bool): Whether to stream the response.
+            answered (Optional[List[LLMEndpoint]]): The endpoint of the successful call is added to it. Defaults to None.
+            priority (int): Admission priority of the call. Defaults to PRIORITY_TURN.
+
+        Yields:
+            str: Generated text chunks.
+        """
+        tokens = estimate_tokens(messages)
+        retries = self._max_retries()
+        for attempt in range(retries + 1):
+            if attempt:
+                self.retries.inc()
+                time.sleep(backoff_delay(attempt, LLM_RETRY_BACKOFF, LLM_RETRY_MAX_BACKOFF))
+            endpoints = [self._pick_endpoint(attempt)]
+            if stream and LLM_HEDGE_AFTER:
+                replies = self._hedged(messages, stream, attempt, endpoints, tokens)
+            else:
+                replies = self._call(endpoints[0], messages, stream)
+            started = False
+            try:
+                for text in self.admission.stream(replies, priority, tokens, text_tokens):
+                    started = True
+                    yield text
+                if answered is not None:
+                    answered.append(endpoints[-1])
+                return
+            except AdmissionTimeout:
+                raise
+            except Exception as e:
+                # The text that is already shown can't be taken back, such calls are not retried
+                if started or attempt == retries or not is_retryable(e):
+                    raise
+                logging.warning(f"LLM call failed, retrying: {e}")
+
+    def _call(
+        self, endpoint: LLMEndpoint, messages: List[Dict[str, str]], stream: bool, handle: Optional[_CallHandle] = None
+    ) -> Generator[str, None, None]:
+        """
+        Generate text with one endpoint and report the outcome to its circuit breaker.
+        Only transient errors count as failures of the endpoint, an invalid request would fail on any endpoint.
+        """
+        try:
+            if endpoint.type == "OPENAI_API":
+                yield from self._get_text_openai(endpoint, messages, stream, handle)
+            elif endpoint.type == "ANTHROPIC_API":
+                yield from self._get_text_anthropic(endpoint, messages, stream, handle)
+            elif endpoint.type == "MOCK":
+                yield from self._get_text_mock(endpoint, stream)
+        except Exception as e:
+            # A call stopped by closing its response fails too, but the endpoint did not
+            if is_retryable(e) and not (handle is not None and handle.closed):
+                endpoint.breaker.failure()
+            else:
+                endpoint.breaker.release()
+            raise
+        except BaseException:
+            # Closed or cancelled before the end, e.g. a hedged call that lost, the trial call must not stay claimed
+            endpoint.breaker.release()
+            raise
+        endpoint.breaker.success()
+
+    def _hedged(
+        self, messages: List[Dict[str, str]], stream: bool, attempt: int, endpoints: List[LLMEndpoint], tokens: float = 0
+    ) -> Generator[str, None, None]:
+        """
+        Stream from one endpoint and, if there is no token after LLM_HEDGE_AFTER seconds, from the next one too.
+        The hedged call is an admitted call of its own and is skipped if it can't be admitted right away.
+        The first call to produce a token wins and the response of the other one is closed. The calls run in threads.
+
+        Args:
+            messages (List[Dict[str, str]]): List of message dictionaries.
+            stream (bool): Whether to stream the response.
+            attempt (int): Number of the attempt, it decides the endpoint of the hedged call.
+            endpoints (List[LLMEndpoint]): Endpoint of the first call, the endpoint of the winning call is left in it.
+            tokens (float): Estimated input tokens of the call, charged to admission for the hedged call. Defaults to 0.
+
+        Yields:
+            str: Generated text chunks of the winning call.
+        """
+        chunks: queue.Queue = queue.Queue()
+        winner: List[int] = []
+        done = threading.Event()
+        handles = [_CallHandle(), _CallHandle()]
+
+        def run(index: int, endpoint: LLMEndpoint) -> None:
+            try:
+                # The call of a thread that stops early is closed, which releases its circuit breaker
+                with contextlib.closing(self._call(endpoint, messages, stream, handles[index])) as replies:
+                    for text in replies:
+                        if done.is_set() or (winner and winner[0] != index):
+                            return
+                        chunks.put((index, text, None))
+            except Exception as e:
+                chunks.put((index, None, e))
+            else:
+                chunks.put((index, None, None))
+            finally:
+                if index:
+                    self.admission.release()
+
+        threading.Thread(target=run, args=(0, endpoints[0]), daemon=True).start()
+        running = 1
+        hedged = False
+        try:
+            while True:
+                try:
+                    index, text, error = chunks.get(timeout=None if hedged or winner else LLM_HEDGE_AFTER)
+                except queue.Empty:
+                    hedged = True
+                    # The hedged call doubles the load, it is only made while admission has room for it
+                    if not self.admission.try_acquire(tokens):
+                        continue
+                    self.hedges.inc()
+                    endpoints.append(self._pick_endpoint(attempt + 1))
+                    threading.Thread(target=run, args=(1, endpoints[1]), daemon=True).start()
+                    running += 1
+                    continue
+                if winner and index != winner[0]:
+                    continue
+                if text is None:
+                    running -= 1
+                    # Before the first token the other call may still succeed
+                    if not winner and running:
+                        continue
+                    if error is not None:
+                        raise error
+                    return
+                if not winner:
+                    winner.append(index)
+                    endpoints[:] = [endpoints[index]]
+                    if index:
+                        self.hedge_wins.inc()
+                    # The losing call may wait for a token for long, closing its response stops it right away
+                    handles[1 - index].close()
+                yield text
+        finally:
+            done.set()
+            for index, handle in enumerate(handles):
+                if not winner or index != winner[0]:
+                    handle.close()
+
+    def _cache_key(self, messages: List[Dict[str, str]], stream: bool) -> str:
+        # Keyed by the main endpoint, the replies of the fallbacks are not stored
+        endpoint = self.endpoints[0]
+        params = {"type": endpoint.type, "url": endpoint.config.url, "stream": stream, "temperature": 1, "max_tokens": 2000}
+        return ResponseCache.key(endpoint.config.name, messages, **params)
+
+    def _get_text_openai(
+        self, endpoint: LLMEndpoint, messages: List[Dict[str, str]], stream: bool, handle: Optional[_CallHandle] = None
+    ) -> Generator[str, None, None]:
         """
         Generate text using OpenAI API.
 
         Args:
+            endpoint (LLMEndpoint): Endpoint to call.
             messages (List[Dict[str, str]]): List of message dictionaries.
             stream (bool): Whether to stream the response.
+            handle (Optional[_CallHandle]): Handle the stream is registered with, so it can be closed. Defaults to None.
 
         Yields:
             str: Generated text chunks.
         """
         if not stream:
-            response = self.client.chat.completions.create(model=self.config.llm.name, messages=messages, temperature=1, max_tokens=2000)
+            response = endpoint.client.chat.completions.create(
+                model=endpoint.config.name, messages=messages, temperature=1, max_tokens=2000
+            )
+            self._record_openai_usage(response.usage)
             yield response.choices[0].message.content.strip()
         else:
-            response = self.client.chat.completions.create(
-                model=self.config.llm.name, messages=messages, temperature=1, stream=True, max_tokens=2000
+            response = endpoint.client.chat.completions.create(
+                model=endpoint.config.name, messages=messages, temperature=1, stream=True, max_tokens=2000, **self._stream_options()
             )
+            if handle is not None:
+                handle.track(response)
             for chunk in response:
-                if chunk.choices[0].delta.content:
+                # The usage chunk at the end of the stream has no choices
+                if chunk.choices and chunk.choices[0].delta.content:
                     yield chunk.choices[0].delta.content
+                self._record_openai_usage(chunk.usage)
 
-    def _get_text_anthropic(self, messages: List[Dict[str, str]], stream: bool) -> Generator[str, None, None]:
+    def _get_text_anthropic(
+        self, endpoint: LLMEndpoint, messages: List[Dict[str, str]], stream: bool, handle: Optional[_CallHandle] = None
+    ) -> Generator[str, None, None]:
         """
         Generate text using Anthropic API.
 
         Args:
+            endpoint (LLMEndpoint): Endpoint to call.
             messages (List[Dict[str, str]]): List of message dictionaries.
             stream (bool): Whether to stream the response.
+            handle (Optional[_CallHandle]): Handle the stream is registered with, so it can be closed. Defaults to None.
 
         Yields:
             str: Generated text chunks.
         """
         system_message, consolidated_messages = self._prepare_anthropic_messages(messages)
+        params = self._anthropic_params(system_message, consolidated_messages, endpoint.config.name)
 
         if not stream:
-            response = self.client.messages.create(
-                model=self.config.llm.name, max_tokens=2000, temperature=1, system=system_message, messages=consolidated_messages
-            )
+            response = endpoint.client.messages.create(**params)
+            self._record_anthropic_usage(response.usage)
             yield response.content[0].text
         else:
-            with self.client.messages.stream(
-                model=self.config.llm.name, max_tokens=2000, temperature=1, system=system_message, messages=consolidated_messages
-            ) as stream:
+            with endpoint.client.messages.stream(**params) as stream:
+                if handle is not None:
+                    handle.track(stream)
                 yield from stream.text_stream
+                self._record_anthropic_usage(stream.get_final_message().usage)
+
+    async def aget_text(
+        self, messages: List[Dict[str, str]], stream: Optional[bool] = None, cache: bool = False, priority: int = PRIORITY_TURN
+    ) -> AsyncGenerator[str, None]:
+        """
+        Asynchronously generate text from the LLM, optionally streaming the response.
+        Calls to the API wait for admission (see utils.admission) without holding a thread.
+
+        Args:
+            messages (List[Dict[str, str]]): List of message dictionaries.
+            stream (Optional[bool]): Whether to stream the response. Defaults to self.streaming if not provided.
+            cache (bool): Whether the response may come from the response cache, if there is one. Only for the calls
+                whose replay is acceptable, e.g. reruns of simulated interviews. Defaults to False.
+            priority (int): Admission priority of the call. Defaults to PRIORITY_TURN.
+
+        Yields:
+            str: Generated text chunks.
+
+        Raises:
+            APIError: If an unexpected error occurs during text generation.
+        """
+        if stream is None:
+            stream = self.streaming
+        try:
+            with tracer.span("llm_get_text", unit="tokens", type=self.llm_type, stream=bool(stream)) as span:
+                # Endpoints that answered, a reply from a fallback is not stored under the key of the main endpoint
+                answered: List[LLMEndpoint] = []
+                generate = lambda: self._agenerate(messages, stream, answered, priority)
+                if cache and self.response_cache is not None:
+                    store = lambda: answered == [self.endpoints[0]]
+                    replies = self.response_cache.acached(self._cache_key(messages, stream), generate, store)
+                else:
+                    replies = generate()
+                async for text in replies:
+                    span.chunk(text_tokens(text))
+                    yield text
+        except Exception as e:
+            raise APIError(f"LLM Get Text Error: Unexpected error: {e}")
+
+    async def _agenerate(
+        self, messages: List[Dict[str, str]], stream: bool, answered: Optional[List[LLMEndpoint]] = None, priority: int = PRIORITY_TURN
+    ) -> AsyncGenerator[str, None]:
+        """
+        Asynchronously generate text, retrying the calls that fail before their first token with a transient error with
+        exponential backoff. Every retry goes to the next endpoint, and streamed calls are hedged if LLM_HEDGE_AFTER is set.
+        Every attempt is an admitted call (see utils.admission), the slot is released while waiting for the retry.
+
+        Args:
+            messages (List[Dict[str, str]]): List of message dictionaries.
+            stream (bool): Whether to stream the response.
+            answered (Optional[List[LLMEndpoint]]): The endpoint of the successful call is added to it. Defaults to None.
+            priority (int): Admission priority of the call. Defaults to PRIORITY_TURN.
+
+        Yields:
+            str: Generated text chunks.
+        """
+        tokens = estimate_tokens(messages)
+        retries = self._max_retries()
+        for attempt in range(retries + 1):
+            if attempt:
+                self.retries.inc()
+                await asyncio.sleep(backoff_delay(attempt, LLM_RETRY_BACKOFF, LLM_RETRY_MAX_BACKOFF))
+            endpoints = [self._pick_endpoint(attempt)]
+            if stream and LLM_HEDGE_AFTER:
+                replies = self._ahedged(messages, stream, attempt, endpoints, tokens)
+            else:
+                replies = self._acall(endpoints[0], messages, stream)
+            started = False
+            try:
+                async for text in self.admission.astream(replies, priority, tokens, text_tokens):
+                    started = True
+                    yield text
+                if answered is not None:
+                    answered.append(endpoints[-1])
+                return
+            except AdmissionTimeout:
+                raise
+            except Exception as e:
+                # The text that is already shown can't be taken back, such calls are not retried
+                if started or attempt == retries or not is_retryable(e):
+                    raise
+                logging.warning(f"LLM call failed, retrying: {e}")
+
+    async def _acall(self, endpoint: LLMEndpoint, messages: List[Dict[str, str]], stream: bool) -> AsyncGenerator[str, None]:
+        """
+        Asynchronously generate text with one endpoint and report the outcome to its circuit breaker.
+        Only transient errors count as failures of the endpoint, an invalid request would fail on any endpoint.
+        """
+        try:
+            if endpoint.type == "OPENAI_API":
+                async for text in self._aget_text_openai(endpoint, messages, stream):
+                    yield text
+            elif endpoint.type == "ANTHROPIC_API":
+                async for text in self._aget_text_anthropic(endpoint, messages, stream):
+                    yield text
+            elif endpoint.type == "MOCK":
+                async for text in self._aget_text_mock(endpoint, stream):
+                    yield text
+        except Exception as e:
+            if is_retryable(e):
+                endpoint.breaker.failure()
+            else:
+                endpoint.breaker.release()
+            raise
+        except BaseException:
+            # Closed or cancelled before the end, e.g. a hedged call that lost, the trial call must not stay claimed
+            endpoint.breaker.release()
+            raise
+        endpoint.breaker.success()
+
+    async def _ahedged(
+        self, messages: List[Dict[str, str]], stream: bool, attempt: int, endpoints: List[LLMEndpoint], tokens: float = 0
+    ) -> AsyncGenerator[str, None]:
+        """
+        Asynchronously stream from one endpoint and, if there is no token after LLM_HEDGE_AFTER seconds, from the next one too.
+        The hedged call is an admitted call of its own and is skipped if it can't be admitted right away.
+        The first call to produce a token wins and the other one is cancelled.
+
+        Args:
+            messages (List[Dict[str, str]]): List of message dictionaries.
+            stream (bool): Whether to stream the response.
+            attempt (int): Number of the attempt, it decides the endpoint of the hedged call.
+            endpoints (List[LLMEndpoint]): Endpoint of the first call, the endpoint of the winning call is left in it.
+            tokens (float): Estimated input tokens of the call, charged to admission for the hedged call. Defaults to 0.
+
+        Yields:
+            str: Generated text chunks of the winning call.
+        """
+        chunks: asyncio.Queue = asyncio.Queue()
+
+        async def run(index: int, endpoint: LLMEndpoint) -> None:
+            try:
+                async for text in self._acall(endpoint, messages, stream):
+                    await chunks.put((index, text, None))
+            except Exception as e:
+                await chunks.put((index, None, e))
+            else:
+                await chunks.put((index, None, None))
+
+        tasks = [asyncio.create_task(run(0, endpoints[0]))]
+        running = 1
+        hedged = False
+        winner: Optional[int] = None
+        try:
+            while True:
+                try:
+                    timeout = None if hedged or winner is not None else LLM_HEDGE_AFTER
+                    index, text, error = await asyncio.wait_for(chunks.get(), timeout)
+                except asyncio.TimeoutError:
+                    hedged = True
+                    # The hedged call doubles the load, it is only made while admission has room for it
+                    if not self.admission.try_acquire(tokens):
+                        continue
+                    self.hedges.inc()
+                    endpoints.append(self._pick_endpoint(attempt + 1))
+                    tasks.append(asyncio.create_task(run(1, endpoints[1])))
+                    # Released when the task is done, even if it is cancelled before it starts
+                    tasks[1].add_done_callback(lambda task: self.admission.release())
+                    running += 1
+                    continue
+                if winner is not None and index != winner:
+                    continue
+                if text is None:
+                    running -= 1
+                    # Before the first token the other call may still succeed
+                    if winner is None and running:
+                        continue
+                    if error is not None:
+                        raise error
+                    return
+                if winner is None:
+                    winner = index
+                    endpoints[:] = [endpoints[index]]
+                    if index:
+                        self.hedge_wins.inc()
+                    for other, task in enumerate(tasks):
+                        if other != index:
+                            task.cancel()
+                yield text
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _aget_text_openai(self, endpoint: LLMEndpoint, messages: List[Dict[str, str]], stream: bool) -> AsyncGenerator[str, None]:
+        """
+        Asynchronously generate text using OpenAI API.
+
+        Args:
+            endpoint (LLMEndpoint): Endpoint to call.
+            messages (List[Dict[str, str]]): List of message dictionaries.
+            stream (bool): Whether to stream the response.
+
+        Yields:
+            str: Generated text chunks.
+        """
+        if not stream:
+            response = await endpoint.async_client.chat.completions.create(
+                model=endpoint.config.name, messages=messages, temperature=1, max_tokens=2000
+            )
+            self._record_openai_usage(response.usage)
+            yield response.choices[0].message.content.strip()
+        else:
+            response = await endpoint.async_client.chat.completions.create(
+                model=endpoint.config.name, messages=messages, temperature=1, stream=True, max_tokens=2000, **self._stream_options()
+            )
+            async for chunk in response:
+                # The usage chunk at the end of the stream has no choices
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+                self._record_openai_usage(chunk.usage)
+
+    async def _aget_text_anthropic(self, endpoint: LLMEndpoint, messages: List[Dict[str, str]], stream: bool) -> AsyncGenerator[str, None]:
+        """
+        Asynchronously generate text using Anthropic API.
+
+        Args:
+            endpoint (LLMEndpoint): Endpoint to call.
+            messages (List[Dict[str, str]]): List of message dictionaries.
+            stream (bool): Whether to stream the response.
+
+        Yields:
+            str: Generated text chunks.
+        """
+        system_message, consolidated_messages = self._prepare_anthropic_messages(messages)
+        params = self._anthropic_params(system_message, consolidated_messages, endpoint.config.name)
+
+        if not stream:
+            response = await endpoint.async_client.messages.create(**params)
+            self._record_anthropic_usage(response.usage)
+            yield response.content[0].text
+        else:
+            async with endpoint.async_client.messages.stream(**params) as stream:
+                async for text in stream.text_stream:
+                    yield text
+                self._record_anthropic_usage((await stream.get_final_message()).usage)
+
+    def _get_text_mock(self, endpoint: LLMEndpoint, stream: bool) -> Generator[str, None, None]:
+        """
+        Generate canned text with the delays of the mock settings.
+
+        Args:
+            endpoint (LLMEndpoint): Endpoint with the mock service.
+            stream (bool): Whether to stream the response.
+
+        Yields:
+            str: Generated text chunks.
+        """
+        tokens = endpoint.mock.stream(endpoint.mock.text_chunks())
+        if stream:
+            yield from tokens
+        else:
+            yield "".join(tokens)
+
+    async def _aget_text_mock(self, endpoint: LLMEndpoint, stream: bool) -> AsyncGenerator[str, None]:
+        """
+        Asynchronously generate canned text with the delays of the mock settings.
+
+        Args:
+            endpoint (LLMEndpoint): Endpoint with the mock service.
+            stream (bool): Whether to stream the response.
+
+        Yields:
+            str: Generated text chunks.
+        """
+        tokens = endpoint.mock.astream(endpoint.mock.text_chunks())
+        if stream:
+            async for token in tokens:
+                yield token
+        else:
+            yield "".join([token async for token in tokens])
 
     def _prepare_anthropic_messages(self, messages: List[Dict[str, str]]) -> Tuple[Optional[str], List[Dict[str, str]]]:
         """
@@ -185,6 +855,74 @@ class LLMManager:
 
         return system_message, consolidated_messages
 
+    def _anthropic_params(
+        self, system_message: Optional[str], messages: List[Dict[str, str]], model: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Build the Anthropic API call parameters, marking the stable prefix for prompt caching.
+
+        The system prompt with the problem statement is the same for the whole interview and the chat history only
+        grows, so there is one cache breakpoint after the system prompt and one after the latest message.
+        The next turn reads everything up to the previous latest message from the cache.
+
+        Args:
+            system_message (Optional[str]): System message.
+            messages (List[Dict[str, str]]): Consolidated messages.
+            model (Optional[str]): Model name. Defaults to the model of the main endpoint.
+
+        Returns:
+            Dict[str, Any]: Keyword arguments for messages.create and messages.stream.
+        """
+        params: Dict[str, Any] = {"model": model or self.config.llm.name, "max_tokens": 2000, "temperature": 1, "messages": messages}
+        if system_message is not None:
+            params["system"] = system_message
+        if not PROMPT_CACHING:
+            return params
+
+        cache_control = {"type": "ephemeral"}
+        if system_message is not None:
+            params["system"] = [{"type": "text", "text": system_message, "cache_control": cache_control}]
+        if messages:
+            last_message = messages[-1]
+            content = [{"type": "text", "text": last_message["content"], "cache_control": cache_control}]
+            params["messages"] = messages[:-1] + [{"role": last_message["role"], "content": content}]
+        params["extra_headers"] = {"anthropic-beta": ANTHROPIC_PROMPT_CACHING_BETA}
+        return params
+
+    def _stream_options(self) -> Dict[str, Any]:
+        return {"stream_options": {"include_usage": True}} if LLM_STREAM_USAGE else {}
+
+    def _record_openai_usage(self, usage: Any) -> None:
+        if not usage:
+            return
+        # Cached tokens are part of prompt_tokens, the details are not typed in all client versions
+        details = getattr(usage, "prompt_tokens_details", None) or {}
+        cached = details.get("cached_tokens", 0) if isinstance(details, dict) else getattr(details, "cached_tokens", 0)
+        cached = cached or 0
+        self._record_usage(usage.prompt_tokens - cached, cached, usage.completion_tokens)
+
+    def _record_anthropic_usage(self, usage: Any) -> None:
+        if not usage:
+            return
+        # input_tokens excludes the cache reads and writes, writing to the cache is full price processing
+        uncached = usage.input_tokens + (getattr(usage, "cache_creation_input_tokens", 0) or 0)
+        cached = getattr(usage, "cache_read_input_tokens", 0) or 0
+        self._record_usage(uncached, cached, usage.output_tokens)
+
+    def _record_usage(self, uncached: int, cached: int, output: int) -> None:
+        """
+        Report the token usage of one call.
+
+        Args:
+            uncached (int): Input tokens processed without the prompt cache.
+            cached (int): Input tokens read from the prompt cache.
+            output (int): Generated tokens.
+        """
+        self.uncached_input_tokens.inc(uncached)
+        self.cached_input_tokens.inc(cached)
+        self.output_tokens.inc(output)
+        logging.info(f"LLM usage: {uncached + cached} input tokens ({cached} cached, {uncached} uncached), {output} output tokens")
+
     def test_llm(self, stream: bool = False) -> bool:
         """
         Test the LLM connection with or without streaming.
@@ -201,7 +939,8 @@ class LLMManager:
                 {"role": "user", "content": "Hi!"},
                 {"role": "user", "content": "Ping!"},
             ]
-            list(self.get_text(test_messages, stream=stream))
+            # Never from the cache, the point is to reach the API
+            list(self.get_text(test_messages, stream=stream, cache=False))
             return True
         except APIError as e:
             logging.error(f"LLM test failed: {e}")
@@ -213,6 +952,8 @@ class LLMManager:
     def init_bot(self, problem: str, interview_type: str = "coding") -> List[Dict[str, str]]:
         """
         Initialize the bot with a system prompt and problem description.
+        The result is the prefix of every request of the interview and nothing changes in it between turns,
+        which lets the APIs serve it from the prompt cache.
 
         Args:
             problem (str): The problem description.
@@ -244,7 +985,9 @@ class LLMManager:
             {"role": "user", "content": full_prompt},
         ]
 
-    def get_problem(self, requirements: str, difficulty: str, topic: str, interview_type: str) -> Generator[str, None, None]:
+    def get_problem(
+        self, requirements: str, difficulty: str, topic: str, interview_type: str, priority: int = PRIORITY_TASK, cache: bool = False
+    ) -> Generator[str, None, None]:
         """
         Get a problem from the LLM based on the given requirements, difficulty, and topic.
 
@@ -253,27 +996,62 @@ class LLMManager:
             difficulty (str): Difficulty level of the problem.
             topic (str): Topic of the problem.
             interview_type (str): Type of interview.
+            priority (int): Admission priority of the call. Defaults to PRIORITY_TASK, behind live interview turns.
+            cache (bool): Whether the problem may come from the response cache, if there is one. Defaults to False.
+
+        Yields:
+            str: Incrementally generated problem statement.
+        """
+        messages = self.get_problem_prepare_messages(requirements, difficulty, topic, interview_type)
+        problem = ""
+        for text in self.get_text(messages, cache=cache, priority=priority):
+            problem += text
+            yield problem
+
+    async def aget_problem(
+        self, requirements: str, difficulty: str, topic: str, interview_type: str, priority: int = PRIORITY_TASK, cache: bool = False
+    ) -> AsyncGenerator[str, None]:
+        """
+        Asynchronously get a problem from the LLM based on the given requirements, difficulty, and topic.
+
+        Args:
+            requirements (str): Specific requirements for the problem.
+            difficulty (str): Difficulty level of the problem.
+            topic (str): Topic of the problem.
+            interview_type (str): Type of interview.
+            priority (int): Admission priority of the call. Defaults to PRIORITY_TASK, behind live interview turns.
+            cache (bool): Whether the problem may come from the response cache, if there is one. Defaults to False.
 
         Yields:
             str: Incrementally generated problem statement.
         """
         messages = self.get_problem_prepare_messages(requirements, difficulty, topic, interview_type)
         problem = ""
-        for text in self.get_text(messages):
+        async for text in self.aget_text(messages, cache=cache, priority=priority):
             problem += text
             yield problem
 
     def update_chat_history(
-        self, code: str, previous_code: str, chat_history: List[Dict[str, str]], chat_display: List[List[Optional[str]]]
+        self,
+        code: str,
+        previous_code: str,
+        chat_history: List[Dict[str, str]],
+        chat_display: List[List[Optional[str]]],
+        interview_type: Optional[str] = None,
     ) -> List[Dict[str, str]]:
         """
         Update chat history with the latest user message and code.
 
+        For the interview types in CODE_DIFF_INTERVIEW_TYPES changed code is sent as a unified diff against the previous
+        code, which is the last version the model saw. Every CODE_FULL_REFRESH_EVERY diffs in a row, or when the diff
+        is not shorter than the code, the full code is sent instead.
+
         Args:
             code (str): Current code.
             previous_code (str): Previous code.
             chat_history (List[Dict[str, str]]): Current chat history.
             chat_display (List[List[Optional[str]]]): Current chat display.
+            interview_type (Optional[str]): The type of interview. Defaults to None, always sending the full code.
 
         Returns:
             List[Dict[str, str]]: Updated chat history.
@@ -282,15 +1060,53 @@ class LLMManager:
         if not message:
             message = ""
         if code != previous_code:
-            message += "\nMY NOTES AND CODE:\n" + code
+            diff = None
+            if (
+                interview_type in CODE_DIFF_INTERVIEW_TYPES
+                and previous_code
+                and self._diffs_in_a_row(chat_history) < CODE_FULL_REFRESH_EVERY
+            ):
+                diff = code_diff(previous_code, code, CODE_DIFF_CONTEXT_LINES)
+            if diff is not None and len(diff) < len(code):
+                message += CODE_DIFF_MARKER + diff
+                self.code_diff_saved_tokens.inc((len(code) - len(diff)) // CHARS_PER_TOKEN)
+            else:
+                message += CODE_MARKER + code
         chat_history.append({"role": "user", "content": message})
         return chat_history
 
+    def _diffs_in_a_row(self, chat_history: List[Dict[str, str]]) -> int:
+        count = 0
+        for message in reversed(chat_history):
+            if CODE_MARKER in message["content"]:
+                break
+            if CODE_DIFF_MARKER in message["content"]:
+                count += 1
+        return count
+
+    def summarize_messages(self, messages: List[Dict[str, str]]) -> str:
+        """
+        Summarize a part of the interview, used by the context window for the dropped messages.
+
+        Args:
+            messages (List[Dict[str, str]]): Messages to summarize.
+
+        Returns:
+            str: The summary.
+        """
+        transcript = [f"{message['role'].capitalize()}: {message['content']}" for message in messages]
+        summary_messages = [
+            {"role": "system", "content": context_summary_prompt},
+            {"role": "user", "content": "\n\n".join(transcript)},
+        ]
+        return "".join(self.get_text(summary_messages, stream=False))
+
     def end_interview_prepare_messages(
         self, problem_description: str, chat_history: List[Dict[str, str]], interview_type: str
     ) -> List[Dict[str, str]]:
         """
         Prepare messages to end the interview and generate feedback.
+        The transcript ends with the full final code, even if the last turns only sent diffs.
 
         Args:
             problem_description (str): The original problem description.
@@ -301,6 +1117,9 @@ class LLMManager:
             List[Dict[str, str]]: Prepared messages for generating feedback.
         """
         transcript = [f"{message['role'].capitalize()}: {message['content']}" for message in chat_history[1:]]
+        code = latest_code(chat_history)
+        if code is not None:
+            transcript.append(f"The final version of the candidate's notes and code:\n{code}")
         system_prompt = self.prompt_manager.get_system_prompt(f"{interview_type}_grading_feedback_prompt")
         return [
             {"role": "system", "content": system_prompt},
@@ -328,6 +1147,30 @@ class LLMManager:
             return
         messages = self.end_interview_prepare_messages(problem_description, chat_history, interview_type)
         feedback = ""
-        for text in self.get_text(messages):
+        # Feedback waits behind live interview turns of the other candidates
+        for text in self.get_text(messages, priority=PRIORITY_TASK):
+            feedback += text
+            yield feedback
+
+    async def aend_interview(
+        self, problem_description: str, chat_history: List[Dict[str, str]], interview_type: str = "coding"
+    ) -> AsyncGenerator[str, None]:
+        """
+        Asynchronously end the interview and get feedback from the LLM.
+
+        Args:
+            problem_description (str): The original problem description.
+            chat_history (List[Dict[str, str]]): The chat history.
+            interview_type (str): The type of interview. Defaults to "coding".
+
+        Yields:
+            str: Incrementally generated feedback.
+        """
+        if len(chat_history) <= 2:
+            yield "No interview history available"
+            return
+        messages = self.end_interview_prepare_messages(problem_description, chat_history, interview_type)
+        feedback = ""
+        async for text in self.aget_text(messages, priority=PRIORITY_TASK):
             feedback += text
             yield feedback
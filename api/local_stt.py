@@ -0,0 +1,143 @@
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+STT_LOCAL_MAX_BATCH_SIZE: int = int(os.getenv("STT_LOCAL_MAX_BATCH_SIZE", 8))
+STT_LOCAL_MAX_WAIT_MS: float = float(os.getenv("STT_LOCAL_MAX_WAIT_MS", 50))
+STT_LOCAL_TORCH_THREADS: int = int(os.getenv("STT_LOCAL_TORCH_THREADS", 0))
+
+
+def create_pipeline(model_name: str) -> Any:
+    """
+    Load a local speech recognition pipeline.
+    transformers is only imported here, so it is not loaded at all when STT is served by a remote API.
+
+    Args:
+        model_name (str): Hugging Face model name.
+
+    Returns:
+        Any: The transformers pipeline.
+    """
+    from transformers import pipeline
+
+    return pipeline("automatic-speech-recognition", model=model_name)
+
+
+class LocalInferenceServer:
+    """
+    In-process inference service that shares one loaded speech recognition model between all sessions.
+    Requests are put in a queue and a single worker thread runs them in micro-batches: it takes everything that
+    arrives within the max wait time after the first request, up to the max batch size, and runs one forward pass.
+    The model is loaded by the worker thread, so creating a server starts a background warm-up and requests
+    that arrive before the model is ready simply wait in the queue.
+    """
+
+    servers: Dict[str, "LocalInferenceServer"] = {}
+    servers_lock = threading.Lock()
+
+    @classmethod
+    def get(cls, model_name: str) -> "LocalInferenceServer":
+        """
+        Get the server of a model, creating it on first use.
+
+        Args:
+            model_name (str): Hugging Face model name.
+
+        Returns:
+            LocalInferenceServer: The shared server.
+        """
+        with cls.servers_lock:
+            if model_name not in cls.servers:
+                cls.servers[model_name] = cls(model_name)
+            return cls.servers[model_name]
+
+    def __init__(
+        self,
+        model_name: str,
+        max_batch_size: int = STT_LOCAL_MAX_BATCH_SIZE,
+        max_wait_ms: float = STT_LOCAL_MAX_WAIT_MS,
+        torch_threads: int = STT_LOCAL_TORCH_THREADS,
+        pipeline_factory: Callable[[str], Any] = create_pipeline,
+    ):
+        """
+        Initialize the LocalInferenceServer and start loading the model in the background.
+
+        Args:
+            model_name (str): Hugging Face model name.
+            max_batch_size (int): Maximum number of requests in one forward pass. Defaults to STT_LOCAL_MAX_BATCH_SIZE.
+            max_wait_ms (float): How long to wait for more requests after the first one. Defaults to STT_LOCAL_MAX_WAIT_MS.
+            torch_threads (int): Number of torch CPU threads, 0 keeps the torch default. Defaults to STT_LOCAL_TORCH_THREADS.
+            pipeline_factory (Callable[[str], Any]): Function that loads the pipeline. Defaults to create_pipeline.
+        """
+        self.model_name = model_name
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.torch_threads = torch_threads
+        self.pipeline_factory = pipeline_factory
+        self.pipe: Optional[Any] = None
+        self.ready = threading.Event()
+        self.requests: queue.Queue = queue.Queue()
+        self.worker = threading.Thread(target=self._run, name=f"stt-local-{model_name}", daemon=True)
+        self.worker.start()
+
+    def _load(self) -> None:
+        started = time.perf_counter()
+        if self.torch_threads > 0:
+            import torch
+
+            torch.set_num_threads(self.torch_threads)
+        self.pipe = self.pipeline_factory(self.model_name)
+        self.ready.set()
+        logging.info(f"Local STT model {self.model_name} loaded in {time.perf_counter() - started:.1f} seconds")
+
+    def transcribe(self, audio: np.ndarray, sampling_rate: int) -> str:
+        """
+        Transcribe audio, blocking until the batch that contains it is processed.
+
+        Args:
+            audio (np.ndarray): Float32 audio samples in the range [-1, 1].
+            sampling_rate (int): Sample rate of the audio.
+
+        Returns:
+            str: Transcribed text.
+        """
+        future: Future = Future()
+        self.requests.put(({"sampling_rate": sampling_rate, "raw": audio}, future))
+        return future.result()
+
+    def _next_batch(self) -> List[Tuple[Dict[str, Any], Future]]:
+        batch = [self.requests.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self.requests.get(timeout=max(0.0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        try:
+            self._load()
+        except Exception as e:
+            logging.error(f"Failed to load local STT model {self.model_name}: {e}")
+            while True:
+                _, future = self.requests.get()
+                future.set_exception(e)
+        while True:
+            batch = self._next_batch()
+            inputs = [request for request, _ in batch]
+            try:
+                results = self.pipe(inputs, batch_size=len(inputs))
+            except Exception as e:
+                logging.error(f"Local STT batch of {len(inputs)} failed: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result["text"])
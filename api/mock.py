@@ -0,0 +1,197 @@
+import asyncio
+import io
+import itertools
+import os
+import random
+import re
+import threading
+import time
+import wave
+from typing import AsyncGenerator, Generator, List, Optional, Sequence, Tuple, TypeVar
+
+import numpy as np
+
+from utils.config import MockConfig
+
+T = TypeVar("T")
+
+DEFAULT_LLM_CONTENT = (
+    "Thank you, that sounds like a reasonable start.\n\nCould you walk me through the time and space complexity of your approach? "
+    "What happens with an empty input?#NOTES#Mock note: the candidate has not discussed edge cases yet."
+)
+DEFAULT_STT_CONTENT = "I would use a hash map to store the values I have already seen."
+TTS_SAMPLE_RATE = 16000
+TTS_SECONDS_PER_CHAR = 0.06
+TTS_CHUNK_SIZE = 1024
+
+
+class MockError(RuntimeError):
+    """Error injected by a mock service."""
+
+    # Injected errors stand for an unavailable service, so they are retried like one
+    status_code = 503
+
+
+def load_content(content: Optional[str], default: str) -> List[str]:
+    """
+    Load canned responses.
+
+    Args:
+        content (Optional[str]): Text or path to a file, responses are separated by lines with "---".
+        default (str): Response used when no content is configured.
+
+    Returns:
+        List[str]: Canned responses.
+    """
+    if not content:
+        return [default]
+    if os.path.isfile(content):
+        with open(content) as file:
+            content = file.read()
+    responses = [response.strip("\n") for response in re.split(r"^---$", content, flags=re.MULTILINE)]
+    return [response for response in responses if response] or [default]
+
+
+def split_tokens(text: str) -> List[str]:
+    """
+    Split text into word-sized tokens that join back into the same text.
+
+    Args:
+        text (str): Text to split.
+
+    Returns:
+        List[str]: Tokens.
+    """
+    return re.findall(r"\s*\S+|\s+", text)
+
+
+def silent_wav(num_chars: int) -> bytes:
+    """
+    Make a silent WAV file as long as it would take to read the text.
+
+    Args:
+        num_chars (int): Length of the text.
+
+    Returns:
+        bytes: WAV file.
+    """
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(TTS_SAMPLE_RATE)
+        wf.writeframes(np.zeros(int(num_chars * TTS_SECONDS_PER_CHAR * TTS_SAMPLE_RATE), dtype=np.int16).tobytes())
+    return buffer.getvalue()
+
+
+class MockService:
+    """
+    Offline stand-in of an LLM, STT or TTS service, used for load testing and benchmarks without network.
+    It returns canned content in chunks with a configurable time to first chunk, chunk rate, jitter and error rate.
+    """
+
+    def __init__(self, config: MockConfig, default_content: str):
+        """
+        Initialize the MockService.
+
+        Args:
+            config (MockConfig): Mock settings of the service.
+            default_content (str): Response used when no canned content is configured.
+        """
+        self.config = config
+        self.responses = load_content(config.content, default_content)
+        self.turns = itertools.count()
+        self.random = random.Random(config.seed)
+        self.lock = threading.Lock()
+
+    def next_response(self) -> str:
+        """
+        Get the next canned response, they are used in turn.
+
+        Returns:
+            str: Response text.
+        """
+        return self.responses[next(self.turns) % len(self.responses)]
+
+    def schedule(self, chunks: Sequence[T]) -> List[Tuple[float, Optional[T]]]:
+        """
+        Plan the delay before every chunk, and an injected error if this request fails.
+
+        Args:
+            chunks (Sequence[T]): Chunks to send.
+
+        Returns:
+            List[Tuple[float, Optional[T]]]: Delays in seconds with chunks, a None chunk means the error is raised there.
+        """
+        with self.lock:
+            # A rate of 0 sends the chunks after the first one without delay
+            interval = 1 / self.config.rate if self.config.rate > 0 else 0.0
+            delays = [self._jitter(self.config.ttft)] + [self._jitter(interval) for _ in chunks[1:]]
+            fail_at = self.random.randrange(len(chunks) + 1) if self.random.random() < self.config.error_rate else None
+        plan: List[Tuple[float, Optional[T]]] = list(zip(delays, chunks))
+        if fail_at is not None:
+            plan = plan[:fail_at] + [(delays[fail_at] if fail_at < len(delays) else 0.0, None)]
+        return plan
+
+    def _jitter(self, delay: float) -> float:
+        return max(0.0, delay * (1 + self.config.jitter * self.random.uniform(-1, 1)))
+
+    def stream(self, chunks: Sequence[T]) -> Generator[T, None, None]:
+        """
+        Send the chunks with the planned delays.
+
+        Args:
+            chunks (Sequence[T]): Chunks to send.
+
+        Yields:
+            T: Chunks.
+
+        Raises:
+            MockError: If an error is injected into this request.
+        """
+        for delay, chunk in self.schedule(chunks):
+            time.sleep(delay)
+            if chunk is None:
+                raise MockError("Injected mock service error")
+            yield chunk
+
+    async def astream(self, chunks: Sequence[T]) -> AsyncGenerator[T, None]:
+        """
+        Asynchronously send the chunks with the planned delays.
+
+        Args:
+            chunks (Sequence[T]): Chunks to send.
+
+        Yields:
+            T: Chunks.
+
+        Raises:
+            MockError: If an error is injected into this request.
+        """
+        for delay, chunk in self.schedule(chunks):
+            await asyncio.sleep(delay)
+            if chunk is None:
+                raise MockError("Injected mock service error")
+            yield chunk
+
+    def text_chunks(self) -> List[str]:
+        """
+        Get the next canned response split into tokens.
+
+        Returns:
+            List[str]: Tokens.
+        """
+        return split_tokens(self.next_response())
+
+    def audio_chunks(self, text: str) -> List[bytes]:
+        """
+        Get silent audio for the text, split into chunks.
+
+        Args:
+            text (str): Text to read.
+
+        Returns:
+            List[bytes]: Chunks of a WAV file.
+        """
+        audio = silent_wav(len(text))
+        return [audio[i : i + TTS_CHUNK_SIZE] for i in range(0, len(audio), TTS_CHUNK_SIZE)]
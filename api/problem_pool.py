@@ -0,0 +1,275 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, AsyncGenerator, Dict, Generator, List, Optional, Tuple
+
+from resources.data import topic_lists
+from utils.admission import PRIORITY_BACKGROUND
+from utils.metrics import metrics
+
+PROBLEM_POOL_PATH: str = os.getenv("PROBLEM_POOL_PATH", os.path.join(".cache", "problems.sqlite3"))
+# Number of ready problems kept per (interview type, difficulty, topic), 0 disables the pool
+PROBLEM_POOL_DEPTH: int = int(os.getenv("PROBLEM_POOL_DEPTH", 0))
+PROBLEM_POOL_TYPES: List[str] = [t for t in os.getenv("PROBLEM_POOL_TYPES", "").split(",") if t]
+PROBLEM_POOL_MAX_BACKOFF: float = 300
+# Seconds between the checks of a full pool, other processes sharing the store may have taken problems meanwhile
+PROBLEM_POOL_CHECK_INTERVAL: float = 30
+DIFFICULTIES: Tuple[str, ...] = ("Easy", "Medium", "Hard")
+
+PoolKey = Tuple[str, str, str]
+
+
+def pool_keys(interview_types: Optional[List[str]] = None) -> List[PoolKey]:
+    """
+    Get all pool keys of the predefined topics.
+
+    Args:
+        interview_types (Optional[List[str]]): Interview types to include. Defaults to all except custom.
+
+    Returns:
+        List[PoolKey]: (interview_type, difficulty, topic) keys.
+    """
+    interview_types = interview_types or [t for t in topic_lists if t != "custom"]
+    return [(t, difficulty, topic) for t in interview_types for difficulty in DIFFICULTIES for topic in topic_lists[t]]
+
+
+def normalize_key(interview_type: str, difficulty: str, topic: str) -> PoolKey:
+    return interview_type, difficulty.capitalize(), topic
+
+
+class ProblemStore:
+    """
+    SQLite store of generated problems, shared by all sessions and processes on the machine.
+    Problems are stored per model, so switching the LLM does not serve problems made by another one.
+    """
+
+    def __init__(self, path: str = PROBLEM_POOL_PATH):
+        """
+        Initialize the ProblemStore and create the table if needed.
+
+        Args:
+            path (str): Path to the SQLite database.
+        """
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS problems (id INTEGER PRIMARY KEY, model TEXT, interview_type TEXT, "
+                "difficulty TEXT, topic TEXT, problem TEXT, created_at REAL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS problems_key ON problems (model, interview_type, difficulty, topic)")
+
+    @contextmanager
+    def _connect(self) -> Generator[sqlite3.Connection, None, None]:
+        # Autocommit mode, a connection per operation keeps the store safe to use from any thread
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+    def add(self, model: str, key: PoolKey, problem: str) -> None:
+        """
+        Store a problem.
+
+        Args:
+            model (str): Name of the model that generated it.
+            key (PoolKey): (interview_type, difficulty, topic) key.
+            problem (str): Problem statement.
+        """
+        with self._connect() as connection:
+            connection.execute("INSERT INTO problems VALUES (NULL, ?, ?, ?, ?, ?, ?)", (model, *key, problem, time.time()))
+
+    def pop(self, model: str, key: PoolKey) -> Optional[str]:
+        """
+        Take the oldest problem of a key out of the store.
+
+        Args:
+            model (str): Name of the model.
+            key (PoolKey): (interview_type, difficulty, topic) key.
+
+        Returns:
+            Optional[str]: Problem statement or None if there is none.
+        """
+        with self._connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            row = connection.execute(
+                "SELECT id, problem FROM problems WHERE model = ? AND interview_type = ? AND difficulty = ? AND topic = ? "
+                "ORDER BY id LIMIT 1",
+                (model, *key),
+            ).fetchone()
+            if row is not None:
+                connection.execute("DELETE FROM problems WHERE id = ?", (row[0],))
+            connection.execute("COMMIT")
+        return row[1] if row else None
+
+    def counts(self, model: str) -> Dict[PoolKey, int]:
+        """
+        Count the stored problems per key.
+
+        Args:
+            model (str): Name of the model.
+
+        Returns:
+            Dict[PoolKey, int]: Number of problems per key, keys without problems are missing.
+        """
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT interview_type, difficulty, topic, COUNT(*) FROM problems WHERE model = ? GROUP BY 1, 2, 3", (model,)
+            ).fetchall()
+        return {(t, difficulty, topic): count for t, difficulty, topic, count in rows}
+
+
+class ProblemPool:
+    """
+    Keeps a few ready problems for every predefined (interview type, difficulty, topic), so starting an interview
+    does not wait for the problem generation. A background thread tops up the pool, starting with the keys that were
+    requested most recently. Requests with custom requirements or topics are always generated live.
+    """
+
+    def __init__(
+        self, llm: Any, store: Optional[ProblemStore] = None, depth: int = PROBLEM_POOL_DEPTH, keys: Optional[List[PoolKey]] = None
+    ):
+        """
+        Initialize the ProblemPool.
+
+        Args:
+            llm (Any): LLM manager used to generate problems.
+            store (Optional[ProblemStore]): Problem store. Defaults to a store at PROBLEM_POOL_PATH if the pool is enabled.
+            depth (int): Number of problems kept per key. Defaults to PROBLEM_POOL_DEPTH.
+            keys (Optional[List[PoolKey]]): Keys to keep problems for. Defaults to all predefined topics of PROBLEM_POOL_TYPES.
+        """
+        self.llm = llm
+        self.depth = depth
+        self.store = store or (ProblemStore() if depth > 0 else None)
+        self.keys = keys if keys is not None else pool_keys(PROBLEM_POOL_TYPES)
+        self.key_set = set(self.keys)
+        # Recently requested keys, they are refilled first
+        self.demand: OrderedDict[PoolKey, None] = OrderedDict()
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopped = threading.Event()
+        self.worker: Optional[threading.Thread] = None
+        self.hits = metrics.counter("problem_pool_hits", "Problems served from the pool")
+        self.misses = metrics.counter("problem_pool_misses", "Problems generated live")
+
+    @property
+    def model(self) -> str:
+        return self.llm.config.llm.name
+
+    def start(self) -> None:
+        """
+        Start the background refill, does nothing if the pool is disabled.
+        """
+        if self.depth <= 0 or self.worker is not None:
+            return
+        self.worker = threading.Thread(target=self._run, name="problem-pool", daemon=True)
+        self.worker.start()
+
+    def stop(self) -> None:
+        """
+        Stop the background refill after the current generation.
+        """
+        self.stopped.set()
+        self.wakeup.set()
+
+    def hit_rate(self) -> float:
+        """
+        Get the share of problems served from the pool.
+
+        Returns:
+            float: Hit rate between 0 and 1, 0 if nothing was requested yet.
+        """
+        total = self.hits.value + self.misses.value
+        return self.hits.value / total if total else 0.0
+
+    def take(self, requirements: str, difficulty: str, topic: str, interview_type: str) -> Optional[str]:
+        """
+        Take a ready problem from the pool.
+
+        Args:
+            requirements (str): Specific requirements for the problem, only requests without them can be served.
+            difficulty (str): Difficulty level of the problem.
+            topic (str): Topic of the problem.
+            interview_type (str): Type of interview.
+
+        Returns:
+            Optional[str]: Problem statement or None on a miss, always None if the pool is disabled.
+        """
+        if self.depth <= 0:
+            return None
+        key = normalize_key(interview_type, difficulty, topic)
+        problem = None
+        if not (requirements or "").strip() and key in self.key_set:
+            problem = self.store.pop(self.model, key)
+            with self.lock:
+                self.demand[key] = None
+                self.demand.move_to_end(key)
+            self.wakeup.set()
+        if problem is None:
+            self.misses.inc()
+        else:
+            self.hits.inc()
+        logging.info(f"Problem pool {'hit' if problem else 'miss'} for {key}, hit rate {self.hit_rate():.0%}")
+        return problem
+
+    async def aget_problem(self, requirements: str, difficulty: str, topic: str, interview_type: str) -> AsyncGenerator[str, None]:
+        """
+        Get a problem from the pool, or generate it live on a miss.
+        It is a drop-in replacement of LLMManager.aget_problem.
+
+        Args:
+            requirements (str): Specific requirements for the problem.
+            difficulty (str): Difficulty level of the problem.
+            topic (str): Topic of the problem.
+            interview_type (str): Type of interview.
+
+        Yields:
+            str: Incrementally generated problem statement.
+        """
+        problem = None
+        if self.depth > 0:
+            # The store is SQLite, don't block the event loop while it waits for the lock
+            problem = await asyncio.to_thread(self.take, requirements, difficulty, topic, interview_type)
+        if problem is not None:
+            yield problem
+            return
+        async for problem in self.llm.aget_problem(requirements, difficulty, topic, interview_type):
+            yield problem
+
+    def _next_key(self) -> Optional[PoolKey]:
+        counts = self.store.counts(self.model)
+        with self.lock:
+            recent = list(reversed(self.demand))
+        for key in recent + self.keys:
+            if counts.get(key, 0) < self.depth:
+                return key
+        return None
+
+    def _run(self) -> None:
+        backoff = 1.0
+        while not self.stopped.is_set():
+            key = self._next_key()
+            if key is None:
+                self.wakeup.wait(PROBLEM_POOL_CHECK_INTERVAL)
+                self.wakeup.clear()
+                continue
+            try:
+                interview_type, difficulty, topic = key
+                messages = self.llm.get_problem_prepare_messages("", difficulty, topic, interview_type)
+                # Not from the response cache, every pooled problem must be a new one
+                problem = "".join(self.llm.get_text(messages, stream=False, cache=False, priority=PRIORITY_BACKGROUND)).strip()
+                if problem:
+                    self.store.add(self.model, key, problem)
+                backoff = 1.0
+            except Exception as e:
+                logging.error(f"Problem pool refill failed for {key}: {e}")
+                self.stopped.wait(backoff)
+                backoff = min(backoff * 2, PROBLEM_POOL_MAX_BACKOFF)
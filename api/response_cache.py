@@ -0,0 +1,210 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Any, AsyncGenerator, Callable, Dict, Generator, Iterable, List, Optional, Tuple
+
+from utils.metrics import metrics
+
+LLM_RESPONSE_CACHE_PATH: str = os.getenv("LLM_RESPONSE_CACHE_PATH", os.path.join(".cache", "responses.sqlite3"))
+LLM_RESPONSE_CACHE_TTL: float = float(os.getenv("LLM_RESPONSE_CACHE_TTL", 7 * 24 * 3600))
+LLM_RESPONSE_CACHE_MAX_ENTRIES: int = int(os.getenv("LLM_RESPONSE_CACHE_MAX_ENTRIES", 10000))
+# 1 replays cached streams with their original timing, 0 replays them instantly
+LLM_RESPONSE_CACHE_REPLAY_SPEED: float = float(os.getenv("LLM_RESPONSE_CACHE_REPLAY_SPEED", 1))
+
+# Text chunks with their offsets in seconds from the start of the request
+Chunks = List[Tuple[float, str]]
+
+
+class ResponseCache:
+    """
+    Content-addressed on-disk cache of LLM responses, keyed by a hash of the model, the messages and the parameters.
+    Responses are stored as timed chunks, so a cached stream can be replayed the way it was generated.
+    Entries expire after the time to live and the least recently used ones are evicted above the size limit.
+    """
+
+    def __init__(
+        self,
+        path: str = LLM_RESPONSE_CACHE_PATH,
+        ttl: float = LLM_RESPONSE_CACHE_TTL,
+        max_entries: int = LLM_RESPONSE_CACHE_MAX_ENTRIES,
+        replay_speed: float = LLM_RESPONSE_CACHE_REPLAY_SPEED,
+    ):
+        """
+        Initialize the ResponseCache and create the table if needed.
+
+        Args:
+            path (str): Path to the SQLite database. Defaults to LLM_RESPONSE_CACHE_PATH.
+            ttl (float): Number of seconds an entry stays valid. Defaults to LLM_RESPONSE_CACHE_TTL.
+            max_entries (int): Maximum number of entries. Defaults to LLM_RESPONSE_CACHE_MAX_ENTRIES.
+            replay_speed (float): Timing factor of replayed streams, 0 replays instantly. Defaults to LLM_RESPONSE_CACHE_REPLAY_SPEED.
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.replay_speed = replay_speed
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, chunks TEXT, created_at REAL, used_at REAL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS responses_used_at ON responses (used_at)")
+        self.hits = metrics.counter("llm_response_cache_hits", "LLM responses served from the cache")
+        self.misses = metrics.counter("llm_response_cache_misses", "LLM responses not found in the cache")
+
+    @contextmanager
+    def _connect(self) -> Generator[sqlite3.Connection, None, None]:
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+    @staticmethod
+    def key(model: str, messages: List[Dict[str, Any]], **params: Any) -> str:
+        """
+        Build the cache key of a request.
+
+        Args:
+            model (str): Model name.
+            messages (List[Dict[str, Any]]): Request messages.
+            **params: All other parameters that change the response.
+
+        Returns:
+            str: Hex digest of the request.
+        """
+        request = json.dumps({"model": model, "messages": messages, "params": params}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(request.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Chunks]:
+        """
+        Get a fresh cached response and mark it as recently used.
+
+        Args:
+            key (str): Cache key.
+
+        Returns:
+            Optional[Chunks]: Timed chunks or None if the response is missing or expired.
+        """
+        now = time.time()
+        with self._connect() as connection:
+            row = connection.execute("SELECT chunks FROM responses WHERE key = ? AND created_at > ?", (key, now - self.ttl)).fetchone()
+            if row is not None:
+                connection.execute("UPDATE responses SET used_at = ? WHERE key = ?", (now, key))
+        if row is None:
+            self.misses.inc()
+            return None
+        self.hits.inc()
+        return [tuple(chunk) for chunk in json.loads(row[0])]
+
+    def set(self, key: str, chunks: Chunks) -> None:
+        """
+        Store a response and evict the expired and least recently used entries.
+
+        Args:
+            key (str): Cache key.
+            chunks (Chunks): Timed chunks.
+        """
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", (key, json.dumps(chunks), now, now))
+            connection.execute("DELETE FROM responses WHERE created_at <= ?", (now - self.ttl,))
+            connection.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def _delays(self, chunks: Chunks) -> Iterable[Tuple[float, str]]:
+        previous = 0.0
+        for offset, text in chunks:
+            yield max(0.0, offset - previous) * self.replay_speed, text
+            previous = offset
+
+    def cached(
+        self, key: str, generate: Callable[[], Iterable[str]], store: Optional[Callable[[], bool]] = None
+    ) -> Generator[str, None, None]:
+        """
+        Replay a cached response, or generate and record it on a miss.
+        A response is only stored if it was generated completely.
+
+        Args:
+            key (str): Cache key.
+            generate (Callable[[], Iterable[str]]): Function that starts the generation.
+            store (Optional[Callable[[], bool]]): Called after a complete generation, it is only stored if it returns True.
+                Defaults to None, always storing it.
+
+        Yields:
+            str: Text chunks.
+        """
+        chunks = self.get(key)
+        if chunks is not None:
+            for delay, text in self._delays(chunks):
+                if delay:
+                    time.sleep(delay)
+                yield text
+            return
+
+        recorded: Chunks = []
+        started = time.perf_counter()
+        for text in generate():
+            recorded.append((time.perf_counter() - started, text))
+            yield text
+        if store is None or store():
+            self.set(key, recorded)
+
+    async def acached(
+        self, key: str, generate: Callable[[], AsyncGenerator[str, None]], store: Optional[Callable[[], bool]] = None
+    ) -> AsyncGenerator[str, None]:
+        """
+        Asynchronously replay a cached response, or generate and record it on a miss.
+        A response is only stored if it was generated completely.
+
+        Args:
+            key (str): Cache key.
+            generate (Callable[[], AsyncGenerator[str, None]]): Function that starts the generation.
+            store (Optional[Callable[[], bool]]): Called after a complete generation, it is only stored if it returns True.
+                Defaults to None, always storing it.
+
+        Yields:
+            str: Text chunks.
+        """
+        chunks = await asyncio.to_thread(self.get, key)
+        if chunks is not None:
+            for delay, text in self._delays(chunks):
+                if delay:
+                    await asyncio.sleep(delay)
+                yield text
+            return
+
+        recorded: Chunks = []
+        started = time.perf_counter()
+        async for text in generate():
+            recorded.append((time.perf_counter() - started, text))
+            yield text
+        if store is None or store():
+            await asyncio.to_thread(self.set, key, recorded)
+
+
+def create_chat_completion(client: Any, cache: Optional[ResponseCache] = None, **params: Any) -> str:
+    """
+    Get the content of a non-streamed OpenAI chat completion, through the cache if one is given.
+
+    Args:
+        client (Any): OpenAI client.
+        cache (Optional[ResponseCache]): Response cache. Defaults to None, always calling the API.
+        **params: Parameters of chat.completions.create, the model and messages are required.
+
+    Returns:
+        str: Message content.
+    """
+
+    def generate() -> Iterable[str]:
+        yield client.chat.completions.create(**params).choices[0].message.content
+
+    if cache is None:
+        return "".join(generate())
+    key_params = {name: value for name, value in params.items() if name not in ("model", "messages", "timeout")}
+    return "".join(cache.cached(cache.key(params["model"], params["messages"], base_url=str(client.base_url), **key_params), generate))
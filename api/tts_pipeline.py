@@ -0,0 +1,210 @@
+import contextvars
+import os
+import queue
+import re
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Deque, List, Optional, Tuple
+
+NOTES_MARKER: str = "#NOTES#"
+MIN_SEGMENT_LENGTH: int = int(os.getenv("TTS_MIN_SEGMENT_LENGTH", 40))
+# Segments of one reply synthesized at the same time
+TTS_PREFETCH_WORKERS: int = int(os.getenv("TTS_PREFETCH_WORKERS", 2))
+# Threads synthesizing segments, shared by every reply of the process
+TTS_WORKERS: int = int(os.getenv("TTS_WORKERS", 10))
+
+# A sentence ends with punctuation followed by whitespace, a paragraph ends with an empty line
+SEGMENT_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
+
+_END = object()
+
+
+class SentenceSegmenter:
+    """Splits a streamed LLM reply into sentence-level segments for speech synthesis."""
+
+    def __init__(self, min_length: int = MIN_SEGMENT_LENGTH):
+        """
+        Initialize the SentenceSegmenter.
+
+        Args:
+            min_length (int): Minimal segment length in characters, shorter sentences are joined with the next ones.
+        """
+        self.min_length = min_length
+        self.buffer: str = ""
+        self.pending: str = ""
+        self.stopped: bool = False
+
+    def feed(self, text: str) -> List[str]:
+        """
+        Add a chunk of the reply and get the segments completed by it.
+        Everything after the notes marker is hidden from the candidate and is never returned.
+
+        Args:
+            text (str): New chunk of the reply.
+
+        Returns:
+            List[str]: Completed segments.
+        """
+        if self.stopped:
+            return []
+        self.buffer += text
+        if NOTES_MARKER in self.buffer:
+            self.buffer = self.buffer.split(NOTES_MARKER)[0]
+            return self.flush()
+
+        segments = []
+        start = 0
+        for boundary in SEGMENT_BOUNDARY.finditer(self.buffer):
+            segments += self._add_sentence(self.buffer[start : boundary.start()])
+            start = boundary.end()
+        self.buffer = self.buffer[start:]
+        return segments
+
+    def flush(self) -> List[str]:
+        """
+        Finish the reply and get the remaining text as the last segment.
+
+        Returns:
+            List[str]: The remaining segment if there is any text left.
+        """
+        self.stopped = True
+        last_segment = f"{self.pending} {self.buffer}".strip()
+        self.pending = self.buffer = ""
+        return [last_segment] if last_segment else []
+
+    def _add_sentence(self, sentence: str) -> List[str]:
+        self.pending = f"{self.pending} {sentence.strip()}".strip()
+        if len(self.pending) < self.min_length:
+            return []
+        segment, self.pending = self.pending, ""
+        return [segment]
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """
+    Get the thread pool shared by all pipelines, it is created on the first use.
+
+    Returns:
+        ThreadPoolExecutor: Pool of TTS_WORKERS threads.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=TTS_WORKERS, thread_name_prefix="tts")
+        return _executor
+
+
+class TTSPipeline:
+    """
+    Synthesizes text segments ahead of playback in the shared thread pool, a few segments of a reply at a time.
+    Audio of each segment is buffered separately, so chunks are always returned in the order the segments were added.
+    """
+
+    def __init__(self, tts: Any, max_workers: int = TTS_PREFETCH_WORKERS):
+        """
+        Initialize the TTSPipeline.
+
+        Args:
+            tts (Any): TTS manager instance.
+            max_workers (int): Maximum number of segments synthesized at the same time.
+        """
+        self.tts = tts
+        self.max_workers = max_workers
+        self.segments: Deque[queue.Queue] = deque()
+        self.waiting: Deque[Tuple[contextvars.Context, str, queue.Queue]] = deque()
+        self.running: int = 0
+        self.lock = threading.Lock()
+        self.closed: bool = False
+        self.cancelled: bool = False
+
+    def add(self, text: str) -> None:
+        """
+        Schedule synthesis of a text segment.
+
+        Args:
+            text (str): Text to synthesize.
+        """
+        audio_queue = queue.Queue()
+        self.segments.append(audio_queue)
+        with self.lock:
+            # The synthesis runs in the context of the caller, so its span is a child of the caller's span
+            self.waiting.append((contextvars.copy_context(), text, audio_queue))
+            self._submit()
+
+    def _submit(self) -> None:
+        while self.waiting and self.running < self.max_workers and not self.cancelled:
+            context, text, audio_queue = self.waiting.popleft()
+            self.running += 1
+            get_executor().submit(context.run, self._synthesize, text, audio_queue)
+
+    def _synthesize(self, text: str, audio_queue: queue.Queue) -> None:
+        chunks = None
+        try:
+            chunks = self.tts.read_text(text)
+            for chunk in chunks:
+                if self.cancelled:
+                    break
+                audio_queue.put(chunk)
+        except Exception as e:
+            audio_queue.put(e)
+        finally:
+            # Closing the stream of a cancelled segment also releases its HTTP response
+            if hasattr(chunks, "close"):
+                chunks.close()
+            audio_queue.put(_END)
+            with self.lock:
+                self.running -= 1
+                self._submit()
+
+    def close(self) -> None:
+        """
+        Mark that no more segments will be added.
+        """
+        self.closed = True
+
+    def cancel(self) -> None:
+        """
+        Stop the synthesis of all segments, the running ones stop at their next chunk.
+        """
+        self.closed = True
+        with self.lock:
+            self.cancelled = True
+            for _, _, audio_queue in self.waiting:
+                audio_queue.put(_END)
+            self.waiting.clear()
+
+    def get(self, block: bool = True) -> Optional[bytes]:
+        """
+        Get all audio that is ready, in order.
+
+        Args:
+            block (bool): Whether to wait for the next chunk if nothing is ready yet.
+
+        Returns:
+            Optional[bytes]: Audio data, empty bytes if nothing is ready, or None once the pipeline is closed and exhausted.
+
+        Raises:
+            APIError: If synthesis of a segment failed.
+        """
+        chunks = []
+        while self.segments:
+            try:
+                item = self.segments[0].get(block=block and not chunks)
+            except queue.Empty:
+                break
+            if item is _END:
+                self.segments.popleft()
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                chunks.append(item)
+        if chunks:
+            return b"".join(chunks)
+        if self.closed and not self.segments:
+            return None
+        return b""
@@ -1,38 +1,60 @@
+import argparse
 import os
-import gradio as gr
 
-from api.audio import STTManager, TTSManager
-from api.llm import LLMManager
-from utils.config import Config
-from resources.prompts import prompts
-from ui.coding import get_problem_solving_ui
-from ui.instructions import get_instructions_ui
-from utils.params import default_audio_params
+from utils.profiling import ImportProfiler
 
 
 def initialize_services():
     """
     Initialize configuration, LLM, TTS, and STT services.
 
+    Health checks of the services run concurrently in the background, fresh cached results are applied right away.
+    SDK clients and local models are loaded lazily, only for the configured service types.
+
     Returns:
-        tuple: Containing Config, LLMManager, TTSManager, and STTManager instances.
+        tuple: Containing Config, LLMManager, TTSManager, STTManager, ServiceProbes, and ProblemPool instances.
     """
-    config = Config()
-    llm = LLMManager(config, prompts)
-    tts = TTSManager(config)
-    stt = STTManager(config)
+    # Imported here, so that --profile-startup covers them
+    from api.audio import STTManager, TTSManager
+    from api.llm import LLMManager
+    from api.problem_pool import ProblemPool
+    from utils.config import Config
+    from resources.prompts import prompts
+    from utils.params import default_audio_params
+    from utils.probes import ServiceProbes
+    from utils.workers import is_primary_worker
 
-    # Update default audio parameters with STT streaming setting
-    default_audio_params["streaming"] = stt.streaming
+    config = Config()
+    llm = LLMManager(config, prompts, check_status=False)
+    tts = TTSManager(config, check_status=False)
+    stt = STTManager(config, check_status=False)
+
+    # With several workers only the first one probes the services and refills the problem pool for all of them,
+    # the others read the probe results from the shared cache and take problems from the shared store
+    primary = is_primary_worker()
+    probes = ServiceProbes(llm, tts, stt)
+    if not probes.apply_cached():
+        if primary:
+            probes.start()
+        else:
+            probes.follow()
+
+    # Keep pre-generated problems topped up in the background, if enabled
+    problem_pool = ProblemPool(llm)
+    if primary:
+        problem_pool.start()
+
+    # Update default audio parameters with STT streaming setting, assume it works until the probe says otherwise
+    default_audio_params["streaming"] = stt.streaming is not False
 
     # Disable TTS in silent mode
     if os.getenv("SILENT", False):
         tts.read_last_message = lambda x: None
 
-    return config, llm, tts, stt
+    return config, llm, tts, stt, probes, problem_pool
 
 
-def create_interface(llm, tts, stt, audio_params):
+def create_interface(llm, tts, stt, audio_params, probes, problem_pool=None):
     """
     Create and configure the Gradio interface.
 
@@ -41,17 +63,27 @@ def create_interface(llm, tts, stt, audio_params):
         tts (TTSManager): Text-to-speech manager instance.
         stt (STTManager): Speech-to-text manager instance.
         audio_params (dict): Audio parameters for the interface.
+        probes (ServiceProbes): Service health checks, used to refresh the status lights.
+        problem_pool (ProblemPool, optional): Pool of pre-generated problems.
 
     Returns:
         gr.Blocks: Configured Gradio interface.
     """
+    # Gradio is the slowest import, the service probes are already running in the background while it loads
+    import gradio as gr
+
+    from ui.coding import get_problem_solving_ui
+    from ui.instructions import get_instructions_ui
+
     with gr.Blocks(title="AI Interviewer", theme=gr.themes.Default()) as demo:
         # Create audio output component (visible only in debug mode)
-        audio_output = gr.Audio(label="Play audio", autoplay=True, visible=os.environ.get("DEBUG", False), streaming=tts.streaming)
+        audio_output = gr.Audio(
+            label="Play audio", autoplay=True, visible=os.environ.get("DEBUG", False), streaming=tts.streaming is not False
+        )
 
         # Render problem-solving and instructions UI components
-        get_problem_solving_ui(llm, tts, stt, audio_params, audio_output).render()
-        get_instructions_ui(llm, tts, stt, audio_params).render()
+        get_problem_solving_ui(llm, tts, stt, audio_params, audio_output, problem_pool).render()
+        get_instructions_ui(llm, tts, stt, audio_params, probes).render()
 
     return demo
 
@@ -60,11 +92,45 @@ def main():
     """
     Main function to initialize services and launch the Gradio interface.
     """
-    config, llm, tts, stt = initialize_services()
-    demo = create_interface(llm, tts, stt, default_audio_params)
+    parser = argparse.ArgumentParser(description="AI Interviewer")
+    parser.add_argument("--profile-startup", action="store_true", help="Report the startup import times and exit without launching")
+    parser.add_argument("--workers", type=int, default=1, help="Run the app in several processes behind a sticky router")
+    parser.add_argument("--host", default=os.getenv("GRADIO_SERVER_NAME", "127.0.0.1"), help="Host to listen on")
+    parser.add_argument("--port", type=int, default=int(os.getenv("GRADIO_SERVER_PORT", 7860)), help="Port to listen on")
+    args = parser.parse_args()
+
+    # The router only forwards requests, the services are initialized in every worker process
+    if args.workers > 1 and not args.profile_startup:
+        from utils.workers import serve
+
+        serve(args.workers, args.host, args.port)
+        return
+
+    profiler = ImportProfiler()
+    if args.profile_startup:
+        profiler.start()
+
+    config, llm, tts, stt, probes, problem_pool = initialize_services()
+    profiler.stage("services initialized")
+
+    from utils.params import default_audio_params
+
+    demo = create_interface(llm, tts, stt, default_audio_params, probes, problem_pool)
+    profiler.stage("interface created")
+
+    if args.profile_startup:
+        profiler.stop()
+        print(profiler.report())
+        return
+
+    # Prometheus /metrics endpoint on a separate port, if enabled
+    from utils.metrics import METRICS_PORT, start_metrics_server
+
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT)
 
     # Launch the Gradio interface
-    demo.launch(show_api=False)
+    demo.launch(show_api=False, server_name=args.host, server_port=args.port)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,318 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+import httpx
+
+from benchmarks.turn_latency import CODE, PROBLEM, RESULTS_DIR, git_commit, summarize
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+# The MOCK backends answer right away, so a turn is bound by the app's own work: Gradio, the router, the session store,
+# reply parsing and audio
+INSTANT_SERVICES = {f"{service}_TYPE": "MOCK" for service in ("LLM", "STT", "TTS")} | {
+    f"{service}_MOCK_{setting}": value
+    for service in ("LLM", "STT", "TTS")
+    for setting, value in (("TTFT", "0"), ("RATE", "100000"), ("JITTER", "0"))
+}
+# Seconds to wait for the workers to start, the first one also imports the models
+STARTUP_TIMEOUT = 180
+CANDIDATE_MESSAGE = "I would use a hash map to store the values I have already seen."
+
+
+def default_worker_counts() -> List[int]:
+    """
+    Numbers of worker processes to measure: powers of two up to the number of cores, and the number of cores itself.
+
+    Returns:
+        List[int]: Worker counts.
+    """
+    cores = os.cpu_count() or 1
+    counts = [2**i for i in range(cores.bit_length()) if 2**i <= cores]
+    return counts if counts[-1] == cores else counts + [cores]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class AppServer:
+    """
+    The app started like a deployment, `python app.py --workers N`, with MOCK backends.
+    With several workers the requests go through the sticky router and the sessions through the shared SQLite store.
+    """
+
+    def __init__(self, workers: int, directory: str):
+        """
+        Initialize the AppServer.
+
+        Args:
+            workers (int): Number of worker processes.
+            directory (str): Directory of the session store, the problem pool and the probe cache of the run.
+        """
+        self.workers = workers
+        self.port = free_port()
+        self.env = dict(
+            os.environ,
+            **INSTANT_SERVICES,
+            SESSION_STORE_PATH=os.path.join(directory, "sessions.sqlite3"),
+            PROBE_CACHE_PATH=os.path.join(directory, "probes.json"),
+            PROBLEM_POOL_PATH=os.path.join(directory, "problems.sqlite3"),
+        )
+        self.process: Optional[subprocess.Popen] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self) -> "AppServer":
+        """
+        Start the app and wait until every worker serves requests.
+
+        Returns:
+            AppServer: The started app.
+        """
+        args = [sys.executable, APP_PATH, "--workers", str(self.workers), "--host", "127.0.0.1", "--port", str(self.port)]
+        self.process = subprocess.Popen(args, env=self.env, stdout=subprocess.DEVNULL)
+        # The workers listen on the ports after the router, a single worker is the app itself
+        ports = [self.port + 1 + i for i in range(self.workers)] if self.workers > 1 else [self.port]
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        for port in ports:
+            while not self._ready(port):
+                if self.process.poll() is not None:
+                    raise RuntimeError(f"The app exited with code {self.process.returncode}")
+                if time.monotonic() > deadline:
+                    self.stop()
+                    raise TimeoutError(f"The app did not start in {STARTUP_TIMEOUT} seconds")
+                time.sleep(0.5)
+        return self
+
+    @staticmethod
+    def _ready(port: int) -> bool:
+        try:
+            return httpx.get(f"http://127.0.0.1:{port}/config", timeout=5).status_code == 200
+        except httpx.HTTPError:
+            return False
+
+    def stop(self) -> None:
+        """
+        Stop the app, the router stops its workers.
+        """
+        if self.process is None or self.process.poll() is not None:
+            return
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+class GradioSession:
+    """
+    A browser session of the app, it runs the events through the Gradio queue like the web client does.
+    The cookies are kept, so the router sends every request of the session to the same worker.
+    """
+
+    def __init__(self, url: str, fn_indexes: Dict[str, int]):
+        """
+        Initialize the GradioSession.
+
+        Args:
+            url (str): Base URL of the app.
+            fn_indexes (Dict[str, int]): Event indexes by API name, from the app config.
+        """
+        self.client = httpx.AsyncClient(base_url=url, timeout=httpx.Timeout(120, connect=10))
+        self.fn_indexes = fn_indexes
+        self.session_hash = uuid.uuid4().hex[:11]
+
+    async def run(self, api_name: str, data: List[Any]) -> List[Any]:
+        """
+        Run an event and wait until it is completed.
+
+        Args:
+            api_name (str): API name of the event handler.
+            data (List[Any]): Values of the inputs.
+
+        Returns:
+            List[Any]: Values of the outputs.
+        """
+        body = {
+            "data": data,
+            "event_data": None,
+            "fn_index": self.fn_indexes[api_name],
+            "trigger_id": None,
+            "session_hash": self.session_hash,
+        }
+        response = await self.client.post("/queue/join", json=body)
+        response.raise_for_status()
+        event_id = response.json()["event_id"]
+        async with self.client.stream("GET", "/queue/data", params={"session_hash": self.session_hash}) as stream:
+            async for line in stream.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                message = json.loads(line[len("data:") :])
+                if message.get("event_id") != event_id or message.get("msg") != "process_completed":
+                    continue
+                if not message.get("success"):
+                    raise RuntimeError(f"{api_name} failed: {message.get('output', {}).get('error')}")
+                return message["output"]["data"]
+        raise RuntimeError(f"{api_name} ended without a result")
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+async def fetch_fn_indexes(url: str) -> Dict[str, int]:
+    async with httpx.AsyncClient(base_url=url) as client:
+        config = (await client.get("/config")).json()
+    return {dependency["api_name"]: dependency["id"] for dependency in config["dependencies"] if dependency.get("api_name")}
+
+
+async def run_session(url: str, fn_indexes: Dict[str, int], turns: int, latencies: List[float]) -> int:
+    """
+    Run an interview of several turns: the candidate sends the code with a message and waits for the reply.
+
+    Returns:
+        int: Number of failed turns.
+    """
+    session = GradioSession(url, fn_indexes)
+    errors = 0
+    try:
+        await session.run("init_bot", [PROBLEM, "coding"])
+        chat: List[List[Optional[str]]] = []
+        for _ in range(turns):
+            chat = chat + [[CANDIDATE_MESSAGE, None]]
+            started = time.perf_counter()
+            try:
+                chat = (await session.run("send_interview_request", [CODE, chat, "coding"]))[0]
+                latencies.append(time.perf_counter() - started)
+            except Exception:
+                errors += 1
+    except Exception:
+        errors += turns
+    finally:
+        await session.close()
+    return errors
+
+
+async def run_load(url: str, sessions: int, turns: int) -> Dict[str, Any]:
+    """
+    Run concurrent interview sessions against the app.
+
+    Args:
+        url (str): Base URL of the app.
+        sessions (int): Number of concurrent sessions.
+        turns (int): Turns per session.
+
+    Returns:
+        Dict[str, Any]: Number of turns and errors, duration and the summary of the turn latency.
+    """
+    fn_indexes = await fetch_fn_indexes(url)
+    latencies: List[float] = []
+    started = time.perf_counter()
+    errors = await asyncio.gather(*[run_session(url, fn_indexes, turns, latencies) for _ in range(sessions)])
+    return {"turns": len(latencies), "errors": sum(errors), "duration": time.perf_counter() - started, "turn": summarize(latencies)}
+
+
+def run_workers(workers: int, sessions: int, turns: int) -> Dict[str, Any]:
+    """
+    Measure the throughput of the app with several worker processes behind the router.
+
+    Args:
+        workers (int): Number of worker processes.
+        sessions (int): Concurrent sessions per worker.
+        turns (int): Turns per session.
+
+    Returns:
+        Dict[str, Any]: Number of workers, turns and errors, duration, turns per second and the turn latency.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        app = AppServer(workers, directory).start()
+        try:
+            level = asyncio.run(run_load(app.url, sessions * workers, turns))
+        finally:
+            app.stop()
+    return {"workers": workers, **level, "turns_per_second": level["turns"] / level["duration"]}
+
+
+def run_scaling(worker_counts: Sequence[int], sessions: int = 10, turns: int = 3) -> Dict[str, Any]:
+    """
+    Measure how the throughput grows with the number of worker processes.
+
+    Args:
+        worker_counts (Sequence[int]): Numbers of worker processes.
+        sessions (int): Concurrent sessions per worker. Defaults to 10.
+        turns (int): Turns per session. Defaults to 3.
+
+    Returns:
+        Dict[str, Any]: Results with the run settings and every level, keyed by the number of workers.
+            The speedup is relative to a single worker, the efficiency is the speedup per worker.
+    """
+    levels: Dict[str, Dict[str, Any]] = {}
+    single: Optional[float] = None
+    for workers in worker_counts:
+        level = run_workers(workers, sessions, turns)
+        if single is None:
+            single = level["turns_per_second"] / workers
+        level["speedup"] = level["turns_per_second"] / single
+        level["efficiency"] = level["speedup"] / workers
+        levels[str(workers)] = level
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "commit": git_commit(),
+        "settings": {"cores": os.cpu_count(), "sessions_per_worker": sessions, "turns": turns},
+        "levels": levels,
+    }
+
+
+def format_results(results: Dict[str, Any]) -> str:
+    """
+    Format the results as a table.
+
+    Args:
+        results (Dict[str, Any]): Scaling results.
+
+    Returns:
+        str: The table.
+    """
+    lines = [f"{'workers':>7}{'turns/s':>10}{'speedup':>9}{'efficiency':>12}{'p95 turn':>10}{'errors':>8}"]
+    for level in results["levels"].values():
+        p95 = level["turn"]["p95"]
+        lines.append(
+            f"{level['workers']:>7}{level['turns_per_second']:>10.1f}{level['speedup']:>9.2f}{level['efficiency']:>12.0%}"
+            f"{(f'{p95:.2f} s' if p95 is not None else '-'):>10}{level['errors']:>8}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput of interview turns with several app worker processes behind the router")
+    parser.add_argument("--workers", type=int, nargs="+", default=default_worker_counts(), help="Numbers of worker processes")
+    parser.add_argument("--sessions", type=int, default=10, help="Concurrent sessions per worker")
+    parser.add_argument("--turns", type=int, default=3, help="Turns per session")
+    parser.add_argument("--output", help="Path of the JSON results, defaults to a new file in benchmarks/results")
+    args = parser.parse_args()
+
+    results = run_scaling(args.workers, args.sessions, args.turns)
+    print(format_results(results))
+
+    output = args.output or os.path.join(RESULTS_DIR, datetime.now().strftime("scaling-%Y%m%d-%H%M%S") + ".json")
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional, Sequence
+
+from api.mock import DEFAULT_LLM_CONTENT, DEFAULT_STT_CONTENT, MockService
+from utils.config import MockConfig
+
+STAND_IN_MODEL = "stand-in"
+
+
+class StandInServer(ThreadingHTTPServer):
+    """
+    Local stand-in of the OpenAI chat completions, transcription and speech endpoints.
+    Responses come from mock services (see api.mock), configured with the LLM_MOCK_*, STT_MOCK_* and TTS_MOCK_* variables,
+    so the app talks to it through its real HTTP clients.
+    """
+
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        """
+        Initialize the StandInServer, port 0 picks a free port.
+
+        Args:
+            host (str): Host to listen on. Defaults to 127.0.0.1.
+            port (int): Port to listen on. Defaults to 0.
+        """
+        super().__init__((host, port), StandInHandler)
+        self.llm = MockService(MockConfig("LLM"), DEFAULT_LLM_CONTENT)
+        self.stt = MockService(MockConfig("STT"), DEFAULT_STT_CONTENT)
+        self.tts = MockService(MockConfig("TTS"), "")
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """Base URL of the OpenAI compatible API."""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "StandInServer":
+        """
+        Serve requests in a background thread.
+
+        Returns:
+            StandInServer: The server itself.
+        """
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        """
+        Stop serving and close the socket.
+        """
+        self.shutdown()
+        self.server_close()
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: StandInServer
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path.endswith("/chat/completions"):
+            self._chat_completions(json.loads(body))
+        elif self.path.endswith("/audio/transcriptions"):
+            tokens = self.server.stt.text_chunks()
+            self._send_whole(self.server.stt, tokens, "".join(tokens).encode(), "text/plain")
+        elif self.path.endswith("/audio/speech"):
+            self._send_stream(self.server.tts, self.server.tts.audio_chunks(json.loads(body)["input"]), "audio/wav")
+        else:
+            self._send_error(404, "Not found")
+
+    def _chat_completions(self, request: dict) -> None:
+        tokens = self.server.llm.text_chunks()
+        if not request.get("stream"):
+            message = {"role": "assistant", "content": "".join(tokens)}
+            response = {**self._completion("chat.completion"), "choices": [{"index": 0, "message": message, "finish_reason": "stop"}]}
+            response["usage"] = self._usage(request, tokens)
+            self._send_whole(self.server.llm, tokens, json.dumps(response).encode(), "application/json")
+            return
+
+        events = []
+        for token in tokens:
+            choice = {"index": 0, "delta": {"content": token}, "finish_reason": None}
+            events.append({**self._completion("chat.completion.chunk"), "choices": [choice]})
+        closing = [{**self._completion("chat.completion.chunk"), "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}]
+        if (request.get("stream_options") or {}).get("include_usage"):
+            closing.append({**self._completion("chat.completion.chunk"), "choices": [], "usage": self._usage(request, tokens)})
+        chunks = [f"data: {json.dumps(event)}\n\n".encode() for event in events]
+        trailer = b"".join(f"data: {json.dumps(event)}\n\n".encode() for event in closing) + b"data: [DONE]\n\n"
+        self._send_stream(self.server.llm, chunks, "text/event-stream", trailer)
+
+    def _completion(self, kind: str) -> dict:
+        return {"id": "chatcmpl-stand-in", "object": kind, "created": int(time.time()), "model": STAND_IN_MODEL}
+
+    def _usage(self, request: dict, tokens: List[str]) -> dict:
+        prompt_tokens = sum(len(message.get("content") or "") for message in request.get("messages", [])) // 4
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens), "total_tokens": prompt_tokens + len(tokens)}
+
+    def _send_whole(self, service: MockService, chunks: Sequence[str], body: bytes, content_type: str) -> None:
+        """
+        Send a non-streamed response when the planned generation of all chunks is done.
+        """
+        plan = service.schedule(chunks)
+        time.sleep(sum(delay for delay, _ in plan))
+        if plan[-1][1] is None:
+            self._send_error(500, "Injected stand-in error")
+        else:
+            self._send_headers(content_type, len(body))
+            self.wfile.write(body)
+
+    def _send_stream(self, service: MockService, chunks: Sequence[bytes], content_type: str, trailer: bytes = b"") -> None:
+        """
+        Send the chunks with the delays planned by the mock service, followed by the trailer. The body length is known
+        upfront, so the connection is kept alive, and an injected error either fails the request or cuts the body short.
+        """
+        plan = service.schedule(chunks)
+        if plan[0][1] is None:
+            time.sleep(plan[0][0])
+            self._send_error(500, "Injected stand-in error")
+            return
+
+        self._send_headers(content_type, sum(len(chunk) for chunk in chunks) + len(trailer))
+        for delay, chunk in plan:
+            time.sleep(delay)
+            if chunk is None:
+                self.close_connection = True
+                return
+            self.wfile.write(chunk)
+            self.wfile.flush()
+        self.wfile.write(trailer)
+
+    def _send_headers(self, content_type: str, length: int) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(length))
+        self.end_headers()
+
+    def _send_error(self, status: int, message: str) -> None:
+        body = json.dumps({"error": {"message": message, "type": "stand_in_error"}}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
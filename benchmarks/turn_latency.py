@@ -0,0 +1,319 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Any, Dict, Generator, List, Optional, Sequence
+
+import numpy as np
+
+from api.audio import SAMPLE_RATE, STTManager, TTSManager
+from api.llm import LLMManager
+from benchmarks.stand_in import STAND_IN_MODEL, StandInServer
+from resources.prompts import prompts
+from ui.coding import send_request
+from utils.admission import PRIORITY_TURN
+from utils.config import MockConfig
+
+SESSION_COUNTS = (1, 10, 100)
+PERCENTILES = (50, 95, 99)
+# Every stage is measured from the moment the candidate stops speaking, except the first TTS byte of each sentence
+STAGES = ("stt", "llm_first_token", "tts_first_byte", "first_audio", "turn")
+# Gradio runs synchronous handlers in a thread pool with 40 threads by default
+WORKER_THREADS = 40
+SPEECH_SECONDS = 3.0
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+PROBLEM = "Given an array of integers, return the indices of the two numbers that add up to a target."
+CODE = "def two_sum(nums, target):\n    pass\n"
+
+
+class TimedTTSManager(TTSManager):
+    """TTSManager that records the time to the first audio byte of every request."""
+
+    def __init__(self, config: Any):
+        super().__init__(config, check_status=False)
+        self.first_byte: List[float] = []
+
+    def read_text(self, text: str, stream: Optional[bool] = None, priority: int = PRIORITY_TURN) -> Generator[bytes, None, None]:
+        started = time.perf_counter()
+        first = True
+        for chunk in super().read_text(text, stream, priority):
+            if first and chunk:
+                self.first_byte.append(time.perf_counter() - started)
+                first = False
+            yield chunk
+
+
+def speech(seconds: float, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """
+    Synthesize a voiced signal that the voice activity detector accepts as speech.
+
+    Args:
+        seconds (float): Duration of the signal.
+        sample_rate (int): Sample rate. Defaults to SAMPLE_RATE.
+
+    Returns:
+        np.ndarray: Audio as int16 samples.
+    """
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    harmonics = sum(np.sin(2 * np.pi * 120 * k * t) / k for k in range(1, 20))
+    return (harmonics * (0.6 + 0.4 * np.sin(2 * np.pi * 4 * t)) * 4000).astype(np.int16)
+
+
+def speech_chunks(seconds: float = SPEECH_SECONDS) -> List[np.ndarray]:
+    """
+    Split speech into the chunks the browser streams: half a second each, the last shorter one marks the end of recording.
+
+    Args:
+        seconds (float): Duration of the speech. Defaults to SPEECH_SECONDS.
+
+    Returns:
+        List[np.ndarray]: Audio chunks.
+    """
+    audio = speech(seconds)
+    chunk_size = SAMPLE_RATE // 2
+    chunks = [audio[i : i + chunk_size] for i in range(0, len(audio), chunk_size)]
+    if len(chunks[-1]) == chunk_size:
+        chunks.append(audio[: chunk_size // 2])
+    return chunks
+
+
+def stand_in_config(url: str) -> SimpleNamespace:
+    """
+    Build the configuration of OpenAI compatible services at the stand-in server.
+
+    Args:
+        url (str): Base URL of the stand-in server.
+
+    Returns:
+        SimpleNamespace: Configuration with llm, stt and tts service settings.
+    """
+    service = lambda: SimpleNamespace(url=url, type="OPENAI_API", name=STAND_IN_MODEL, key="stand-in", mock=None)
+    return SimpleNamespace(llm=service(), stt=service(), tts=service())
+
+
+async def run_turn(
+    llm: LLMManager, tts: TTSManager, stt: STTManager, chat_history: List[Dict[str, str]], samples: Dict[str, List[float]]
+) -> List[Dict[str, str]]:
+    """
+    Run one interview turn: stream the candidate's speech, transcribe it and stream the interviewer's reply with audio.
+
+    Args:
+        llm (LLMManager): LLM manager instance.
+        tts (TTSManager): TTS manager instance.
+        stt (STTManager): STT manager instance.
+        chat_history (List[Dict[str, str]]): Chat history of the session.
+        samples (Dict[str, List[float]]): Collected latencies in seconds per stage, updated in place.
+
+    Returns:
+        List[Dict[str, str]]: Updated chat history.
+    """
+    chunks = speech_chunks()
+    audio_buffer, vad, text = None, None, ""
+    for i, chunk in enumerate(chunks):
+        if i == len(chunks) - 1:
+            stopped = time.perf_counter()
+        audio_buffer, audio, vad = await asyncio.to_thread(stt.process_audio_chunk, (SAMPLE_RATE, chunk), audio_buffer, vad)
+        if len(audio):
+            text = await asyncio.to_thread(stt.transcribe_audio, audio, text)
+    chat_display = stt.add_to_chat(text, [[None, PROBLEM]])
+    samples["stt"].append(time.perf_counter() - stopped)
+
+    first_token = first_audio = None
+    async for chat_history, chat_display, _, audio_chunk in send_request(CODE, CODE, chat_history, chat_display, llm, tts, False, "coding"):
+        if first_token is None and chat_display[-1][1]:
+            first_token = time.perf_counter() - stopped
+        if first_audio is None and audio_chunk:
+            first_audio = time.perf_counter() - stopped
+    samples["llm_first_token"].append(first_token)
+    samples["first_audio"].append(first_audio)
+    samples["turn"].append(time.perf_counter() - stopped)
+    return chat_history
+
+
+async def run_session(llm: LLMManager, tts: TTSManager, stt: STTManager, turns: int, samples: Dict[str, List[float]]) -> int:
+    """
+    Run an interview session of several turns.
+
+    Returns:
+        int: Number of failed turns.
+    """
+    chat_history = [{"role": "system", "content": prompts["coding_interviewer_prompt"]}, {"role": "assistant", "content": PROBLEM}]
+    errors = 0
+    for _ in range(turns):
+        try:
+            chat_history = await run_turn(llm, tts, stt, chat_history, samples)
+        except Exception:
+            errors += 1
+    return errors
+
+
+def summarize(values: Sequence[Optional[float]]) -> Dict[str, Any]:
+    """
+    Summarize the latencies of a stage.
+
+    Args:
+        values (Sequence[Optional[float]]): Latencies in seconds, None for turns where the stage never happened.
+
+    Returns:
+        Dict[str, Any]: Count and percentiles in seconds.
+    """
+    values = [value for value in values if value is not None]
+    summary: Dict[str, Any] = {"count": len(values)}
+    for percentile in PERCENTILES:
+        summary[f"p{percentile}"] = float(np.percentile(values, percentile)) if values else None
+    return summary
+
+
+async def run_level(url: str, sessions: int, turns: int, worker_threads: int = WORKER_THREADS) -> Dict[str, Any]:
+    """
+    Run concurrent sessions against the stand-in server.
+
+    Args:
+        url (str): Base URL of the stand-in server.
+        sessions (int): Number of concurrent sessions.
+        turns (int): Number of turns per session.
+        worker_threads (int): Threads for the synchronous handlers. Defaults to WORKER_THREADS.
+
+    Returns:
+        Dict[str, Any]: Number of sessions, turns and errors, duration and the latency summary of every stage.
+    """
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=worker_threads))
+    config = stand_in_config(url)
+    llm = LLMManager(config, prompts, check_status=False)
+    tts = TimedTTSManager(config)
+    stt = STTManager(config, check_status=False)
+    llm.streaming = tts.streaming = stt.streaming = True
+
+    samples: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+    started = time.perf_counter()
+    errors = await asyncio.gather(*[run_session(llm, tts, stt, turns, samples) for _ in range(sessions)])
+    samples["tts_first_byte"] = tts.first_byte
+    return {
+        "sessions": sessions,
+        "turns": sessions * turns,
+        "errors": sum(errors),
+        "duration": time.perf_counter() - started,
+        "stages": {stage: summarize(samples[stage]) for stage in STAGES},
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def run_benchmark(session_counts: Sequence[int] = SESSION_COUNTS, turns: int = 3, worker_threads: int = WORKER_THREADS) -> Dict[str, Any]:
+    """
+    Measure the latency of interview turns at every level of concurrency.
+
+    Args:
+        session_counts (Sequence[int]): Numbers of concurrent sessions. Defaults to SESSION_COUNTS.
+        turns (int): Number of turns per session. Defaults to 3.
+        worker_threads (int): Threads for the synchronous handlers. Defaults to WORKER_THREADS.
+
+    Returns:
+        Dict[str, Any]: Results with the run settings and the summary of every level, keyed by the number of sessions.
+    """
+    server = StandInServer().start()
+    try:
+        levels = {str(sessions): asyncio.run(run_level(server.url, sessions, turns, worker_threads)) for sessions in session_counts}
+    finally:
+        server.stop()
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "commit": git_commit(),
+        "settings": {
+            "turns": turns,
+            "worker_threads": worker_threads,
+            "speech_seconds": SPEECH_SECONDS,
+            "mock": {service: vars(MockConfig(service)) for service in ("LLM", "STT", "TTS")},
+        },
+        "levels": levels,
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.2, percentile: int = 95) -> List[str]:
+    """
+    Find the stages that got slower than in the baseline.
+
+    Args:
+        results (Dict[str, Any]): Results of the current run.
+        baseline (Dict[str, Any]): Results of the baseline run.
+        tolerance (float): Allowed relative slowdown. Defaults to 0.2.
+        percentile (int): Compared percentile. Defaults to 95.
+
+    Returns:
+        List[str]: Descriptions of the regressions.
+    """
+    regressions = []
+    for level, result in results["levels"].items():
+        for stage, summary in result["stages"].items():
+            old = baseline["levels"].get(level, {}).get("stages", {}).get(stage, {}).get(f"p{percentile}")
+            new = summary[f"p{percentile}"]
+            if old is not None and new is not None and new > old * (1 + tolerance):
+                regressions.append(f"{stage} p{percentile} at {level} sessions: {old * 1000:.0f} ms -> {new * 1000:.0f} ms")
+    return regressions
+
+
+def format_results(results: Dict[str, Any]) -> str:
+    """
+    Format the results as a table in milliseconds.
+
+    Args:
+        results (Dict[str, Any]): Benchmark results.
+
+    Returns:
+        str: The table.
+    """
+    columns = [f"p{percentile}" for percentile in PERCENTILES]
+    lines = [f"{'sessions':>8}  {'stage':<16}" + "".join(f"{column:>9}" for column in columns) + f"{'count':>7}"]
+    for level, result in results["levels"].items():
+        for stage, summary in result["stages"].items():
+            values = "".join(f"{summary[column] * 1000:9.0f}" if summary[column] is not None else f"{'-':>9}" for column in columns)
+            lines.append(f"{level:>8}  {stage:<16}{values}{summary['count']:>7}")
+        lines.append(f"{'':>8}  {result['errors']} failed of {result['turns']} turns in {result['duration']:.1f} s")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Interview turn latency benchmark against local stand-in servers")
+    parser.add_argument("--sessions", type=int, nargs="+", default=list(SESSION_COUNTS), help="Numbers of concurrent sessions")
+    parser.add_argument("--turns", type=int, default=3, help="Turns per session")
+    parser.add_argument("--workers", type=int, default=WORKER_THREADS, help="Threads for the synchronous handlers")
+    parser.add_argument("--output", help="Path of the JSON results, defaults to a new file in benchmarks/results")
+    parser.add_argument("--baseline", help="JSON results to compare with, the exit code is 1 if any stage regressed")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative p95 slowdown against the baseline")
+    args = parser.parse_args()
+
+    # Every session shares the HTTP pools of the managers, raise HTTP_POOL_SIZE to keep all connections alive
+    logging.getLogger("urllib3.connectionpool").setLevel(logging.ERROR)
+    results = run_benchmark(args.sessions, args.turns, args.workers)
+    print(format_results(results))
+
+    output = args.output or os.path.join(RESULTS_DIR, datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"Results saved to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -74,6 +74,14 @@ The feedback plan:
 
 """
 
+context_summary_prompt = """
+You are helping an AI interviewer to keep track of a long interview. Summarize the part of the interview transcript you are given.
+- Keep every fact the interviewer will need later: the candidate's approach, decisions, answers, mistakes and open questions.
+- Keep the interviewer's hidden notes that follow the #NOTES# delimiter.
+- Don't evaluate the candidate and don't add anything that is not in the transcript.
+- Be concise, use plain text, no more than 200 words.
+"""
+
 base_prompts = {
     "base_problem_generation": base_problem_generation,
     "base_interviewer": base_interviewer,
@@ -1,3 +1,4 @@
+import asyncio
 import json
 import os
 import random
@@ -7,7 +8,9 @@ from collections import defaultdict
 from typing import Dict, Optional, Tuple
 
 from openai import OpenAI
+from api.context import CHARS_PER_TOKEN, CODE_DIFF_MARKER
 from api.llm import LLMManager
+from api.response_cache import ResponseCache, create_chat_completion
 from utils.config import Config
 from resources.data import fixed_messages, topic_lists
 from resources.prompts import prompts
@@ -15,6 +18,19 @@ from tests.testing_prompts import candidate_prompt
 from ui.coding import send_request
 
 
+async def collect_last(async_generator):
+    """
+    Exhaust an async generator and return its last item.
+
+    :param async_generator: Async generator to consume.
+    :return: The last yielded item or None if nothing was yielded.
+    """
+    last_item = None
+    async for item in async_generator:
+        last_item = item
+    return last_item
+
+
 def complete_interview(
     interview_type: str,
     exp_name: str,
@@ -26,6 +42,7 @@ def complete_interview(
     pause: int = 0,
     mode: str = "normal",
     max_messages: Optional[int] = None,
+    use_cache: bool = False,
 ) -> Tuple[str, Dict]:
     """
     Complete an interview and record the results with additional strange use cases.
@@ -40,13 +57,15 @@ def complete_interview(
     :param pause: Pause duration between requests to prevent rate limits.
     :param mode: Mode of operation ("normal", "empty", "gibberish", "repeat").
     :param max_messages: Maximum number of messages in the conversation.
+    :param use_cache: Whether to serve the interviewer and candidate calls from the response cache, making reruns free.
     :return: Tuple containing the file path and interview data.
     """
     client = OpenAI(base_url="https://api.openai.com/v1")
     config = Config()
     if llm_config:
         config.llm = llm_config
-    llm = LLMManager(config, prompts)
+    cache = ResponseCache(replay_speed=0) if use_cache else None
+    llm = LLMManager(config, prompts, response_cache=cache)
     llm_name = config.llm.name
     print(f"Starting evaluation interviewer LLM: {llm_name}, candidate LLM: {model}, interview type: {interview_type}")
     # Select a random topic or difficulty if not provided
@@ -55,7 +74,7 @@ def complete_interview(
 
     # Fix: Iterate over all elements and keep the last one
     problem_statement_text = None
-    for text in llm.get_problem(requirements, difficulty, topic, interview_type):
+    for text in llm.get_problem(requirements, difficulty, topic, interview_type, cache=use_cache):
         problem_statement_text = text
 
     if problem_statement_text is None:
@@ -76,6 +95,7 @@ def complete_interview(
             "transcript": [],
             "feedback": None,
             "average_response_time_seconds": 0,
+            "code_diff_saved_tokens": 0,
         },
     )
     # Initialize interviewer and candidate messages
@@ -91,78 +111,101 @@ def complete_interview(
     response_times = []
     previous_code = ""
 
-    if max_messages is None:
-        max_messages = 25 if mode == "normal" else 5
-
-    for _ in range(max_messages):
-        code = ""
-        if mode == "empty":
-            candidate_message = ""
-        elif mode == "gibberish":
-            candidate_message = "".join(random.choices(string.ascii_letters + string.digits, k=50))
-        elif mode == "repeat":
-            candidate_message = chat_display[-1][1]
-        else:
-            try:
-                response = client.chat.completions.create(
-                    model=model,
-                    messages=messages_candidate,
-                    temperature=1,
-                    response_format={"type": "json_object"},
-                    timeout=30,  # Add a timeout to prevent indefinite waiting
-                )
+    # One loop per interview, so the async LLM client keeps its connection pool between turns
+    loop = asyncio.new_event_loop()
+    try:
+        if max_messages is None:
+            max_messages = 25 if mode == "normal" else 5
+
+        for _ in range(max_messages):
+            code = ""
+            if mode == "empty":
+                candidate_message = ""
+            elif mode == "gibberish":
+                candidate_message = "".join(random.choices(string.ascii_letters + string.digits, k=50))
+            elif mode == "repeat":
+                candidate_message = chat_display[-1][1]
+            else:
                 try:
-                    response_json = json.loads(response.choices[0].message.content)
-                    candidate_message = response_json.get("message", "")
-                    code = response_json.get("code_and_notes", "")
-                    finished = response_json.get("finished", False)
-                    question = response_json.get("question", False)
-
-                    if finished and not question and not code:
-                        break
-                except:
+                    response = create_chat_completion(
+                        client,
+                        cache,
+                        model=model,
+                        messages=messages_candidate,
+                        temperature=1,
+                        response_format={"type": "json_object"},
+                        timeout=30,  # Add a timeout to prevent indefinite waiting
+                    )
+                    try:
+                        response_json = json.loads(response)
+                        candidate_message = response_json.get("message", "")
+                        code = response_json.get("code_and_notes", "")
+                        finished = response_json.get("finished", False)
+                        question = response_json.get("question", False)
+
+                        if finished and not question and not code:
+                            break
+                    except:
+                        continue
+                except Exception as e:
+                    print(f"Error in API call: {str(e)}, skipping this iteration")
                     continue
-            except Exception as e:
-                print(f"Error in API call: {str(e)}, skipping this iteration")
-                continue
-
-        if not candidate_message and not code and mode != "empty":
-            print("No message or code in response")
-            continue
-
-        if candidate_message:
-            messages_candidate.append({"role": "assistant", "content": candidate_message})
-            interview_data["transcript"].append(f"CANDIDATE MESSAGE: {candidate_message}")
-        if code:
-            interview_data["transcript"].append(f"CANDIDATE CODE AND NOTES: {code}")
-            messages_candidate.append({"role": "assistant", "content": code})
 
-        chat_display.append([candidate_message, None])
+            if not candidate_message and not code and mode != "empty":
+                print("No message or code in response")
+                continue
 
-        send_time = time.time()
+            if candidate_message:
+                messages_candidate.append({"role": "assistant", "content": candidate_message})
+                interview_data["transcript"].append(f"CANDIDATE MESSAGE: {candidate_message}")
+            if code:
+                interview_data["transcript"].append(f"CANDIDATE CODE AND NOTES: {code}")
+                messages_candidate.append({"role": "assistant", "content": code})
+
+            chat_display.append([candidate_message, None])
+
+            send_time = time.time()
+
+            last_result = loop.run_until_complete(
+                collect_last(
+                    send_request(
+                        code,
+                        previous_code,
+                        messages_interviewer,
+                        chat_display,
+                        llm,
+                        tts=None,
+                        silent=True,
+                        interview_type=interview_type,
+                        cache=use_cache,
+                    )
+                )
+            )
 
-        # Fix: Iterate over all elements and keep the last one
-        last_result = None
-        for result in send_request(code, previous_code, messages_interviewer, chat_display, llm, tts=None, silent=True):
-            last_result = result
+            if last_result is not None:
+                messages_interviewer, chat_display, previous_code, _ = last_result
+            else:
+                print("send_request did not return any results, skipping this iteration")
+                continue
 
-        if last_result is not None:
-            messages_interviewer, chat_display, previous_code, _ = last_result
-        else:
-            print("send_request did not return any results, skipping this iteration")
-            continue
+            response_times.append(time.time() - send_time)
 
-        response_times.append(time.time() - send_time)
+            candidate_content = messages_interviewer[-2]["content"] if len(messages_interviewer) > 1 else ""
+            if CODE_DIFF_MARKER in candidate_content:
+                diff = candidate_content.split(CODE_DIFF_MARKER, 1)[1]
+                interview_data["code_diff_saved_tokens"] += (len(code) - len(diff)) // CHARS_PER_TOKEN
 
-        messages_candidate.append({"role": "user", "content": chat_display[-1][1]})
+            messages_candidate.append({"role": "user", "content": chat_display[-1][1]})
 
-        message_split = messages_interviewer[-1]["content"].split("#NOTES#")
-        interview_data["transcript"].append(f"INTERVIEWER MESSAGE: {message_split[0]}")
+            message_split = messages_interviewer[-1]["content"].split("#NOTES#")
+            interview_data["transcript"].append(f"INTERVIEWER MESSAGE: {message_split[0]}")
 
-        if len(message_split) > 1:
-            interview_data["transcript"].append(f"INTERVIEWER HIDDEN NOTE: {message_split[1]}")
+            if len(message_split) > 1:
+                interview_data["transcript"].append(f"INTERVIEWER HIDDEN NOTE: {message_split[1]}")
 
-        time.sleep(pause)  # to prevent exceeding rate limits
+            time.sleep(pause)  # to prevent exceeding rate limits
+    finally:
+        loop.close()
 
     # Fix: Iterate over all elements and keep the last one
     feedback = None
@@ -1,6 +1,7 @@
 import json
 from typing import Dict, Any, List
 from openai import OpenAI
+from api.response_cache import ResponseCache, create_chat_completion
 from tests.testing_prompts import grader_prompt
 
 BASE_URL = "https://api.openai.com/v1"
@@ -33,13 +34,14 @@ def generate_interview_summary(interview_data: Dict[str, Any]) -> List[str]:
     return summary
 
 
-def grade(json_file_path: str, model: str = "gpt-4o", suffix: str = "") -> Dict[str, Any]:
+def grade(json_file_path: str, model: str = "gpt-4o", suffix: str = "", use_cache: bool = False) -> Dict[str, Any]:
     """
     Grade the interview data and provide feedback.
 
     :param json_file_path: Path to the JSON file containing interview data.
     :param model: Model to use for grading.
     :param suffix: Suffix to add to the feedback file name.
+    :param use_cache: Whether to serve the grading from the response cache, so reruns on the same interviews are free.
     :return: Feedback dictionary.
     """
     try:
@@ -57,7 +59,7 @@ def grade(json_file_path: str, model: str = "gpt-4o", suffix: str = "") -> Dict[
         {"role": "user", "content": f"Please evaluate the interviewer based on the following data: \n {'\n'.join(interview_summary_list)}"},
     ]
 
-    feedback = call_openai_api(messages, model)
+    feedback = call_openai_api(messages, model, use_cache)
 
     populate_feedback_metadata(feedback, json_file_path, interview_data, model)
     calculate_overall_score(feedback)
@@ -67,10 +69,12 @@ def grade(json_file_path: str, model: str = "gpt-4o", suffix: str = "") -> Dict[
     return feedback
 
 
-def call_openai_api(messages, model):
+def call_openai_api(messages, model, use_cache: bool = False):
+    # Grading runs at temperature 0, so with use_cache reruns on the same interviews are served from the response cache
     client = OpenAI(base_url=BASE_URL)
-    response = client.chat.completions.create(model=model, messages=messages, temperature=0, response_format={"type": "json_object"})
-    return json.loads(response.choices[0].message.content)
+    cache = ResponseCache(replay_speed=0) if use_cache else None
+    content = create_chat_completion(client, cache, model=model, messages=messages, temperature=0, response_format={"type": "json_object"})
+    return json.loads(content)
 
 
 def populate_feedback_metadata(feedback: Dict[str, Any], json_file_path: str, interview_data: Dict[str, Any], model: str) -> None:
@@ -0,0 +1,131 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from api.llm import LLMManager
+from utils.admission import PRIORITY_BACKGROUND, PRIORITY_TASK, PRIORITY_TURN, AdmissionController, AdmissionRegistry
+from utils.config import Config
+from utils.errors import AdmissionTimeout
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_priority_queue_and_concurrency():
+    controller = AdmissionController("test_priority", concurrency=1)
+    controller.acquire()
+    order = []
+
+    def call(priority, name):
+        with controller.slot(priority):
+            order.append(name)
+
+    threads = []
+    for priority, name in [(PRIORITY_BACKGROUND, "pool"), (PRIORITY_TASK, "feedback"), (PRIORITY_TURN, "turn"), (PRIORITY_TASK, "problem")]:
+        threads.append(threading.Thread(target=call, args=(priority, name)))
+        threads[-1].start()
+        wait_for(lambda: controller.waiting == len(threads))
+    assert controller.queue_depth.value == 4
+
+    controller.release()
+    for thread in threads:
+        thread.join(5)
+    assert order == ["turn", "feedback", "problem", "pool"]
+    assert controller.in_flight == 0 and controller.queue_depth.value == 0
+    assert controller.wait_time.count == 5
+
+
+def test_token_budget():
+    controller = AdmissionController("test_budget", tokens_per_minute=60)
+    # A full bucket lets a call through even when it is larger than the budget, the next calls wait for the refill
+    started = time.perf_counter()
+    with controller.slot(tokens=100):
+        pass
+    assert time.perf_counter() - started < 0.1
+    assert not controller._can_admit(0)
+
+    # 3 tokens over the budget at 10 tokens per second
+    controller = AdmissionController("test_budget", tokens_per_minute=600)
+    controller.charge(603)
+    started = time.perf_counter()
+    with controller.slot(tokens=0):
+        pass
+    assert 0.2 < time.perf_counter() - started < 2
+
+
+def test_timeout_and_cancellation():
+    controller = AdmissionController("test_timeout", concurrency=1, timeout=0.1)
+    timeouts = controller.timeouts.value
+    controller.acquire()
+    with pytest.raises(AdmissionTimeout):
+        controller.acquire()
+    assert controller.timeouts.value == timeouts + 1
+    assert controller.waiting == 0
+
+    async def run():
+        task = asyncio.create_task(controller.aacquire(PRIORITY_TURN))
+        await asyncio.sleep(0.05)
+        assert controller.waiting == 1
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert controller.waiting == 0
+
+        waiting = asyncio.create_task(controller.aacquire(PRIORITY_TURN))
+        await asyncio.sleep(0.01)
+        # Released from another thread, the waiting coroutine is woken up on its loop
+        threading.Thread(target=controller.release).start()
+        await waiting
+
+    asyncio.run(run())
+    assert controller.in_flight == 1
+
+
+def test_stream_charges_output():
+    controller = AdmissionController("test_stream", concurrency=2, tokens_per_minute=6000)
+    chunks = controller.stream(iter(["ab", "cdef"]), tokens=10, cost=len)
+    assert controller.in_flight == 0
+    assert next(chunks) == "ab"
+    assert controller.in_flight == 1
+    assert list(chunks) == ["cdef"]
+    assert controller.in_flight == 0
+    assert 5984 <= controller.budget <= 5985
+
+
+def test_managers_share_backend_controller(monkeypatch):
+    monkeypatch.setattr("utils.config.load_dotenv", lambda override: None)
+    monkeypatch.setenv("LLM_TYPE", "MOCK")
+    monkeypatch.setenv("LLM_MOCK_TTFT", "0.05")
+    monkeypatch.setenv("LLM_MOCK_RATE", "1000")
+    monkeypatch.setenv("LLM_CONCURRENCY", "1")
+    registry = AdmissionRegistry()
+    monkeypatch.setattr("api.llm.admission", registry)
+    first = LLMManager(Config(), {}, check_status=False)
+    second = LLMManager(Config(), {}, check_status=False)
+    assert first.admission is second.admission is registry.controller("llm")
+    assert first.admission.concurrency == 1
+
+    # The reply of a live turn goes ahead of the feedback queued before it
+    order = []
+
+    def call(llm, priority, name):
+        "".join(llm.get_text([{"role": "user", "content": "Hi"}], stream=True, priority=priority))
+        order.append(name)
+
+    threads = [
+        threading.Thread(target=call, args=(first, PRIORITY_TURN, "first turn")),
+        threading.Thread(target=call, args=(second, PRIORITY_TASK, "feedback")),
+        threading.Thread(target=call, args=(first, PRIORITY_TURN, "second turn")),
+    ]
+    for thread in threads:
+        thread.start()
+        wait_for(lambda: first.admission.in_flight + first.admission.waiting == threads.index(thread) + 1)
+    for thread in threads:
+        thread.join(5)
+    assert order == ["first turn", "second turn", "feedback"]
@@ -0,0 +1,28 @@
+import copy
+
+from benchmarks.turn_latency import STAGES, compare, format_results, run_benchmark
+
+
+def test_turn_latency_benchmark(monkeypatch):
+    for service in ["LLM", "STT", "TTS"]:
+        monkeypatch.setenv(f"{service}_MOCK_TTFT", "0.01")
+        monkeypatch.setenv(f"{service}_MOCK_RATE", "2000")
+
+    results = run_benchmark([1, 2], turns=1)
+    assert list(results["levels"]) == ["1", "2"]
+    assert results["settings"]["mock"]["LLM"]["ttft"] == 0.01
+    for level in results["levels"].values():
+        assert level["errors"] == 0
+        assert list(level["stages"]) == list(STAGES)
+        assert level["stages"]["turn"]["count"] == level["sessions"]
+        stages = level["stages"]
+        assert stages["stt"]["p50"] < stages["llm_first_token"]["p50"] < stages["first_audio"]["p50"] <= stages["turn"]["p50"]
+    assert "llm_first_token" in format_results(results)
+
+    assert compare(results, results) == []
+    slower = copy.deepcopy(results)
+    slower["levels"]["2"]["stages"]["turn"]["p95"] *= 2
+    assert compare(slower, results) == [
+        f"turn p95 at 2 sessions: {results['levels']['2']['stages']['turn']['p95'] * 1000:.0f} ms -> "
+        f"{slower['levels']['2']['stages']['turn']['p95'] * 1000:.0f} ms"
+    ]
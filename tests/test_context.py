@@ -0,0 +1,125 @@
+import time
+
+from api.context import (
+    CODE_CHANGES_MARKER,
+    CODE_DIFF_MARKER,
+    CODE_MARKER,
+    OLD_CODE_STUB,
+    ContextWindow,
+    apply_code_diff,
+    code_diff,
+    estimate_tokens,
+    latest_code,
+)
+
+
+def make_history(num_turns, code_lines=50):
+    history = [{"role": "system", "content": "You are an interviewer. " * 20}]
+    code = [f"x{i} = {i}" for i in range(code_lines)]
+    for turn in range(num_turns):
+        code[turn % code_lines] = f"x{turn % code_lines} = {turn * 100}"
+        history.append({"role": "user", "content": f"Message {turn}." + CODE_MARKER + "\n".join(code)})
+        history.append({"role": "assistant", "content": f"Reply {turn}."})
+    return history
+
+
+def test_old_code_is_replaced_by_diffs():
+    history = make_history(5)
+    messages = ContextWindow(budget=100000).build(history)
+
+    assert len(messages) == len(history)
+    assert messages[0] == history[0] and messages[-2:] == history[-2:]
+    # The oldest snapshot is the base of the diffs after it
+    assert messages[1] == history[1]
+    assert messages[3]["content"] == "Message 1." + CODE_CHANGES_MARKER + "@@ -1,3 +1,3 @@\n x0 = 0\n-x1 = 1\n+x1 = 100\n x2 = 2"
+    assert estimate_tokens(messages[1:]) < estimate_tokens(history[1:]) * 0.6
+    # The chat history is still complete for the feedback
+    assert CODE_MARKER in history[1]["content"]
+
+
+def test_oldest_messages_are_dropped_in_steps():
+    window = ContextWindow(budget=2000, recent_messages=4, drop_step=4)
+    history = make_history(60)
+    messages = window.build(history)
+
+    assert estimate_tokens(messages) <= 2000
+    assert messages[0] == history[0] and messages[-2:] == history[-2:]
+    assert messages[-4]["content"].startswith("Message 58." + CODE_CHANGES_MARKER)
+    dropped = len(history) - len(messages) + 1
+    assert dropped % 4 == 0
+    assert messages[1] == {"role": "user", "content": f"[The first {dropped} messages of the interview are omitted]"}
+
+    # The prompt prefix does not change until the window moves again
+    history += [{"role": "user", "content": "Next."}, {"role": "assistant", "content": "Reply."}]
+    assert window.build(history)[:-2] == messages
+
+
+def test_dropped_messages_are_summarized_in_background():
+    summarized = []
+
+    def summarize(messages):
+        summarized.append(len(messages))
+        return "The candidate proposed a hash map."
+
+    window = ContextWindow(budget=150, recent_messages=2, drop_step=2, summarize=summarize)
+    history = make_history(10, code_lines=5)
+    assert "omitted" in window.build(history)[1]["content"]
+
+    for _ in range(100):
+        if window.summaries:
+            break
+        time.sleep(0.01)
+    assert window.build(history)[1]["content"].endswith("The candidate proposed a hash map.")
+    assert len(summarized) == 1
+
+
+def test_window_is_opt_in():
+    history = make_history(5)
+    assert ContextWindow(budget=0).build(history) == history
+
+
+def test_diffs_keep_their_base_after_drops():
+    code = [f"x{i} = {i}" for i in range(50)]
+    history = [
+        {"role": "system", "content": "You are an interviewer."},
+        {"role": "user", "content": "First." + CODE_MARKER + "\n".join(code)},
+        {"role": "assistant", "content": "Reply."},
+        {"role": "user", "content": "Diff 1." + CODE_DIFF_MARKER + "@@ -1 +1 @@\n-x0 = 0\n+x0 = 1"},
+        {"role": "assistant", "content": "Reply."},
+        {"role": "user", "content": "Second." + CODE_MARKER + "\n".join(["x0 = 1"] + code[1:])},
+        {"role": "assistant", "content": "Reply."},
+        {"role": "user", "content": "Diff 2." + CODE_DIFF_MARKER + "@@ -1 +1 @@\n-x0 = 1\n+x0 = 2"},
+        {"role": "assistant", "content": "Reply."},
+    ]
+
+    # The oldest snapshot stays in full as the base of the diff after it
+    assert ContextWindow(budget=100000).build(history) == history
+
+    # Once it is dropped, the diff based on it is replaced by a stub and the next snapshot is sent in full
+    messages = ContextWindow(budget=1, recent_messages=6, drop_step=1).build(history)
+    assert messages[1]["content"] == "[The first 2 messages of the interview are omitted]"
+    assert messages[2]["content"] == "Diff 1." + OLD_CODE_STUB
+    assert messages[4:] == history[5:]
+
+
+def test_code_diffs_are_applied():
+    old_code = "-- totals\nSELECT a\nFROM t\n\nWHERE b = 1\n++i;"
+    versions = [
+        "SELECT a, b\nFROM t\n\nWHERE b = 1\n++i;",
+        "-- new comment\nSELECT a\nFROM t\nWHERE b = 2\n++j;\nextra",
+        "",
+        old_code,
+    ]
+    for new_code in versions:
+        for context_lines in (0, 3):
+            assert apply_code_diff(old_code, code_diff(old_code, new_code, context_lines)) == new_code
+
+    history = [
+        {"role": "system", "content": "You are an interviewer."},
+        {"role": "user", "content": "Hi." + CODE_MARKER + old_code},
+        {"role": "assistant", "content": "Hello."},
+        {"role": "user", "content": "Edit." + CODE_DIFF_MARKER + code_diff(old_code, versions[0], 3)},
+        {"role": "user", "content": "Edit." + CODE_DIFF_MARKER + code_diff(versions[0], versions[1], 3)},
+    ]
+    assert latest_code(history) == versions[1]
+    assert latest_code(history[:1]) is None
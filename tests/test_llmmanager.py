@@ -0,0 +1,214 @@
+import asyncio
+from unittest.mock import patch, Mock, AsyncMock
+
+import pytest
+from anthropic.types import Usage as AnthropicUsage
+from openai.types import CompletionUsage
+
+from api.context import CODE_DIFF_MARKER, CODE_MARKER
+from api.llm import LLMManager, APIError
+from ui.coding import BackgroundStream, ReplyParser, send_request
+
+
+async def collect(async_generator):
+    return [item async for item in async_generator]
+
+
+class AsyncStream:
+    def __init__(self, items):
+        self.items = items
+
+    def __aiter__(self):
+        return self.gen()
+
+    async def gen(self):
+        for item in self.items:
+            yield item
+
+
+def openai_chunk(text):
+    chunk = Mock()
+    chunk.choices = [Mock()]
+    chunk.choices[0].delta.content = text
+    chunk.usage = None
+    return chunk
+
+
+class TestLLMManager:
+
+    def setup_method(self):
+        self.config = Mock()
+        self.config.llm.key = "test-key"
+        self.config.llm.url = "https://api.example.com"
+        self.config.llm.name = "test-llm-model"
+        self.config.llm.type = "OPENAI_API"
+        with patch.object(LLMManager, "test_llm", return_value=True):
+            self.llm = LLMManager(self.config, {"coding_interviewer_prompt": "You are an interviewer."})
+        self.llm.async_client = Mock()
+
+    @pytest.mark.parametrize("stream", [False, True])
+    def test_aget_text(self, stream):
+        if stream:
+            response = AsyncStream([openai_chunk("Hello"), openai_chunk(None), openai_chunk(", world!")])
+            expected = ["Hello", ", world!"]
+        else:
+            response = Mock()
+            response.choices = [Mock()]
+            response.choices[0].message.content = " Hello, world! "
+            response.usage = None
+            expected = ["Hello, world!"]
+        self.llm.async_client.chat.completions.create = AsyncMock(return_value=response)
+
+        result = asyncio.run(collect(self.llm.aget_text([{"role": "user", "content": "Hi!"}], stream=stream)))
+        assert result == expected
+
+    def test_aget_text_error(self):
+        self.llm.async_client.chat.completions.create = AsyncMock(side_effect=RuntimeError("boom"))
+
+        with pytest.raises(APIError):
+            asyncio.run(collect(self.llm.aget_text([{"role": "user", "content": "Hi!"}])))
+
+    def test_stream_usage_is_recorded(self):
+        usage_chunk = Mock(choices=[])
+        usage_chunk.usage = CompletionUsage.model_validate(
+            {"prompt_tokens": 1200, "completion_tokens": 30, "total_tokens": 1230, "prompt_tokens_details": {"cached_tokens": 1024}}
+        )
+        response = AsyncStream([openai_chunk("Hello"), usage_chunk])
+        self.llm.async_client.chat.completions.create = AsyncMock(return_value=response)
+        cached, uncached = self.llm.cached_input_tokens.value, self.llm.uncached_input_tokens.value
+
+        assert asyncio.run(collect(self.llm.aget_text([{"role": "user", "content": "Hi!"}], stream=True))) == ["Hello"]
+        assert self.llm.async_client.chat.completions.create.call_args.kwargs["stream_options"] == {"include_usage": True}
+        assert self.llm.cached_input_tokens.value - cached == 1024
+        assert self.llm.uncached_input_tokens.value - uncached == 176
+
+    def test_anthropic_cache_breakpoints(self):
+        messages = self.llm.init_bot("Two sum") + [
+            {"role": "assistant", "content": "Hi!"},
+            {"role": "user", "content": "Hello"},
+            {"role": "user", "content": "MY NOTES AND CODE:\npass"},
+        ]
+        system_message, consolidated_messages = self.llm._prepare_anthropic_messages(messages)
+        params = self.llm._anthropic_params(system_message, consolidated_messages)
+
+        assert params["system"] == [{"type": "text", "text": messages[0]["content"], "cache_control": {"type": "ephemeral"}}]
+        assert params["messages"][0] == {"role": "assistant", "content": "Hi!"}
+        assert params["messages"][-1]["content"] == [
+            {"type": "text", "text": "Hello\nMY NOTES AND CODE:\npass", "cache_control": {"type": "ephemeral"}}
+        ]
+        assert consolidated_messages[-1]["content"] == "Hello\nMY NOTES AND CODE:\npass"
+
+        cached = self.llm.cached_input_tokens.value
+        self.llm._record_anthropic_usage(
+            AnthropicUsage.model_validate({"input_tokens": 20, "output_tokens": 5, "cache_read_input_tokens": 2000})
+        )
+        assert self.llm.cached_input_tokens.value - cached == 2000
+
+    @patch("api.llm.CODE_DIFF_INTERVIEW_TYPES", ["coding"])
+    def test_code_diffs(self):
+        code = "\n".join(f"line {i}" for i in range(100))
+        chat_history = self.llm.init_bot("Two sum", "coding")
+        previous_code = ""
+        for turn in range(7):
+            new_code = code.replace("line 50", f"line 50 # edit {turn}") if turn else code
+            chat_history = self.llm.update_chat_history(new_code, previous_code, chat_history, [[f"Turn {turn}", None]], "coding")
+            previous_code = new_code
+
+        contents = [message["content"] for message in chat_history[1:]]
+        # The first code is always sent in full, then 5 diffs in a row and a full snapshot again
+        assert [CODE_DIFF_MARKER in content for content in contents] == [False, True, True, True, True, True, False]
+        assert contents[2] == "Turn 2" + CODE_DIFF_MARKER + (
+            "@@ -48,7 +48,7 @@\n line 47\n line 48\n line 49\n-line 50 # edit 1\n+line 50 # edit 2\n line 51\n line 52\n line 53"
+        )
+        assert contents[6] == "Turn 6" + CODE_MARKER + previous_code
+
+        # The feedback always gets the full final code
+        chat_history = self.llm.update_chat_history(code, previous_code, chat_history, [["Last turn", None]], "coding")
+        assert CODE_DIFF_MARKER in chat_history[-1]["content"]
+        self.llm.prompt_manager.prompts["coding_grading_feedback_prompt"] = "Grade the interview."
+        transcript = self.llm.end_interview_prepare_messages("Two sum", chat_history, "coding")[2]["content"]
+        assert transcript.endswith("The final version of the candidate's notes and code:\n" + code)
+
+        chat_history = self.llm.update_chat_history(code, previous_code, chat_history, [["Other type", None]], "math")
+        assert chat_history[-1]["content"] == "Other type" + CODE_MARKER + code
+
+    def test_code_is_sent_in_full_by_default(self):
+        chat_history = self.llm.init_bot("Two sum", "coding")
+        chat_history = self.llm.update_chat_history("a = 1\nb = 2", "a = 1", chat_history, [["Turn", None]], "coding")
+        assert chat_history[-1]["content"] == "Turn" + CODE_MARKER + "a = 1\nb = 2"
+
+    def test_send_request(self):
+        response = AsyncStream([openai_chunk("First paragraph.\n\nSecond"), openai_chunk(" paragraph.#NOTES#hidden")])
+        self.llm.async_client.chat.completions.create = AsyncMock(return_value=response)
+
+        chat_history = self.llm.init_bot("Two sum", "coding")
+        chat_display = [[None, "Hi!"], ["Let's go", None]]
+        results = asyncio.run(collect(send_request("code", "", chat_history, chat_display, self.llm, tts=None, silent=True)))
+
+        chat_history, chat_display, code, audio = results[-1]
+        assert code == "code"
+        assert chat_history[-1] == {"role": "assistant", "content": "First paragraph.\n\nSecond paragraph.#NOTES#hidden"}
+        assert chat_display[-2:] == [[None, "First paragraph."], [None, "Second paragraph."]]
+
+    def test_reply_parser(self):
+        reply = "First\n\n\nsecond para#NOT\nnot notes\n\nthird#NOTES#hidden\n\n"
+        for size in [1, 2, 3, 7, len(reply)]:
+            chat_display = [[None, "Hi!"], [None, ""]]
+            parser = ReplyParser(chat_display)
+            for i in range(0, len(reply), size):
+                parser.feed(reply[i : i + size])
+            parser.finish()
+            assert [message[1] for message in chat_display[1:]] == reply.split("#NOTES#")[0].split("\n\n")
+
+    def test_send_request_coalesces_updates(self):
+        reply = "word " * 200 + "#NOTES#hidden"
+        response = AsyncStream([openai_chunk(reply[i : i + 5]) for i in range(0, len(reply), 5)])
+        self.llm.async_client.chat.completions.create = AsyncMock(return_value=response)
+
+        chat_display = [[None, "Hi!"], ["Let's go", None]]
+        send = send_request("code", "", self.llm.init_bot("Two sum"), chat_display, self.llm, tts=None, silent=True, update_rate=1)
+
+        async def collect_messages():
+            # The same chat display is updated in place, so take the last message on every update
+            return [result[1][-1][1] async for result in send]
+
+        # Only the first token and the final state are sent
+        assert asyncio.run(collect_messages()) == ["word ", "word " * 200]
+
+    def test_send_request_with_audio(self):
+        reply = "Sure, the first sentence is read right away. And this one follows it.#NOTES#Do not read this."
+        response = AsyncStream([openai_chunk(reply[i : i + 5]) for i in range(0, len(reply), 5)])
+        self.llm.async_client.chat.completions.create = AsyncMock(return_value=response)
+        tts = Mock()
+        tts.read_text = lambda text: iter([f"<{text}>".encode()])
+
+        chat_display = [[None, "Hi!"], ["Let's go", None]]
+        results = asyncio.run(collect(send_request("", "", self.llm.init_bot("Two sum"), chat_display, self.llm, tts=tts)))
+
+        audio = b"".join(result[3] for result in results)
+        assert audio == b"<Sure, the first sentence is read right away.><And this one follows it.>"
+
+    def test_background_stream_buffers_feedback(self):
+        resume = None
+
+        async def feedback():
+            yield "Good"
+            yield "Good job"
+            await resume.wait()
+            yield "Good job overall"
+            raise APIError("Connection lost")
+
+        async def run():
+            nonlocal resume
+            resume = asyncio.Event()
+            stream = BackgroundStream(feedback())
+            # Generated before anything reads it, the reader starts with the buffered text and then follows the live one
+            await asyncio.sleep(0.01)
+            texts = []
+            with pytest.raises(APIError):
+                async for text in stream.follow():
+                    texts.append(text)
+                    resume.set()
+            return texts
+
+        assert asyncio.run(run()) == ["Good job", "Good job overall"]
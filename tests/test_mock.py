@@ -0,0 +1,93 @@
+import asyncio
+import io
+import time
+import wave
+from unittest.mock import Mock
+
+import numpy as np
+import pytest
+
+from api.audio import STTManager, TTSManager
+from api.llm import APIError, LLMManager
+from api.mock import DEFAULT_LLM_CONTENT, TTS_SAMPLE_RATE, TTS_SECONDS_PER_CHAR, load_content
+from utils.config import Config
+
+
+@pytest.fixture
+def mock_config(monkeypatch):
+    monkeypatch.setattr("utils.config.load_dotenv", lambda override: None)
+    for service in ["LLM", "STT", "TTS"]:
+        monkeypatch.setenv(f"{service}_TYPE", "MOCK")
+        monkeypatch.setenv(f"{service}_MOCK_TTFT", "0.05")
+        monkeypatch.setenv(f"{service}_MOCK_RATE", "1000")
+        monkeypatch.setenv(f"{service}_MOCK_SEED", "0")
+    return Config()
+
+
+def test_config(mock_config, monkeypatch):
+    assert mock_config.llm.mock.ttft == 0.05 and mock_config.llm.mock.seed == 0
+    assert mock_config.llm.mock.error_rate == 0
+
+    monkeypatch.setenv("LLM_TYPE", "OPENAI_API")
+    assert Config().llm.mock is None
+
+
+def test_zero_rate_sends_without_delay(mock_config):
+    mock_config.llm.mock.rate = 0
+    llm = LLMManager(mock_config, {}, check_status=False)
+    started = time.perf_counter()
+    assert "".join(llm.get_text([], stream=True)) == DEFAULT_LLM_CONTENT
+    assert time.perf_counter() - started < 1
+
+
+def test_load_content(tmp_path):
+    assert load_content(None, "default") == ["default"]
+    path = tmp_path / "responses.txt"
+    path.write_text("First\nresponse\n---\nSecond response\n")
+    assert load_content(str(path), "default") == ["First\nresponse", "Second response"]
+
+
+def test_llm(mock_config, monkeypatch):
+    monkeypatch.setenv("LLM_MOCK_CONTENT", "One two three\n---\nFour")
+    mock_config = Config()
+    llm = LLMManager(mock_config, {}, check_status=False)
+
+    started = time.perf_counter()
+    chunks = list(llm.get_text([], stream=True, cache=False))
+    assert time.perf_counter() - started >= 0.04
+    assert chunks == ["One", " two", " three"]
+    assert list(llm.get_text([], stream=False, cache=False)) == ["Four"]
+
+    async def collect():
+        return [text async for text in llm.aget_text([], stream=True, cache=False)]
+
+    assert "".join(asyncio.run(collect())) == "One two three"
+    assert llm.test_llm()
+
+
+def test_llm_default_content_and_errors(mock_config, monkeypatch):
+    llm = LLMManager(mock_config, {}, check_status=False)
+    assert "".join(llm.get_text([], stream=True, cache=False)) == DEFAULT_LLM_CONTENT
+
+    llm.mock.config.error_rate = 1
+    with pytest.raises(APIError):
+        list(llm.get_text([], stream=True, cache=False))
+
+
+def test_stt(mock_config):
+    stt = STTManager(mock_config, check_status=False)
+    assert stt.transcribe_numpy_array(np.zeros(16000), None) == "I would use a hash map to store the values I have already seen."
+    assert stt.test_stt()
+
+
+def test_tts(mock_config):
+    tts = TTSManager(mock_config, check_status=False)
+    chunks = list(tts.read_text("Hello, world!", stream=True))
+    assert len(chunks) > 1
+    with wave.open(io.BytesIO(b"".join(chunks))) as wf:
+        assert wf.getnframes() == int(len("Hello, world!") * TTS_SECONDS_PER_CHAR * TTS_SAMPLE_RATE)
+    assert list(tts.read_text("Hello, world!", stream=False)) == [b"".join(chunks)]
+
+    tts.mock.config.error_rate = 1
+    with pytest.raises(APIError):
+        list(tts.read_text("Hello, world!", stream=True))
@@ -0,0 +1,80 @@
+import time
+from unittest.mock import Mock
+
+from utils.probes import ProbeCache, ServiceProbes
+
+
+def make_manager(service, **tests):
+    manager = Mock(spec=["config", "status", "streaming", *tests])
+    getattr(manager.config, service).type = "OPENAI_API"
+    getattr(manager.config, service).url = f"https://{service}.example.com"
+    getattr(manager.config, service).name = f"{service}-model"
+    for name, fn in tests.items():
+        setattr(manager, name, fn)
+    return manager
+
+
+def test_probes_run_and_cache(tmp_path):
+    llm = make_manager("llm", test_llm=lambda stream: not stream)
+    tts = make_manager("tts", test_tts=lambda stream: True)
+    stt = make_manager("stt", test_stt=lambda: time.sleep(5))
+    cache = ProbeCache(str(tmp_path / "probes.json"), ttl=60)
+
+    probes = ServiceProbes(llm, tts, stt, cache=cache, timeout=0.5)
+    assert not probes.apply_cached()
+    assert llm.status is None and probes.pending() == ["llm", "stt", "tts"]
+
+    started = time.monotonic()
+    probes.run()
+    assert time.monotonic() - started < 2
+    assert probes.done.is_set() and probes.pending() == []
+    assert (llm.status, llm.streaming) == (True, False)
+    assert (tts.status, tts.streaming) == (True, True)
+    assert (stt.status, stt.streaming) == (False, False)
+
+    cached_llm = make_manager("llm", test_llm=Mock(side_effect=AssertionError))
+    cached_tts = make_manager("tts", test_tts=Mock(side_effect=AssertionError))
+    cached_stt = make_manager("stt", test_stt=Mock(side_effect=AssertionError))
+    assert ServiceProbes(cached_llm, cached_tts, cached_stt, cache=cache).apply_cached()
+    assert (cached_llm.status, cached_llm.streaming) == (True, False)
+    assert (cached_stt.status, cached_stt.streaming) == (False, False)
+
+
+def test_probe_cache_expiry(tmp_path):
+    config = Mock(type="OPENAI_API", url="https://api.example.com", name="model")
+    cache = ProbeCache(str(tmp_path / "probes.json"), ttl=60)
+    key = cache.key(config, "status")
+    cache.set(key, True)
+    assert cache.get(key) is True
+
+    cache.ttl = 0
+    assert cache.get(key) is None
+
+
+def test_probes_follow_another_process(tmp_path):
+    cache = ProbeCache(str(tmp_path / "probes.json"), ttl=60)
+    managers = [make_manager(service, **{f"test_{service}": Mock(side_effect=AssertionError)}) for service in ("llm", "tts", "stt")]
+    follower = ServiceProbes(*managers, cache=cache, timeout=5)
+    thread = follower.follow(interval=0.05)
+
+    # The results of the probes of the first worker are picked up from the cache, the follower doesn't run them itself
+    ServiceProbes(
+        make_manager("llm", test_llm=lambda stream: True),
+        make_manager("tts", test_tts=lambda stream: True),
+        make_manager("stt", test_stt=lambda: True),
+        cache=cache,
+    ).run()
+    thread.join(2)
+    assert follower.done.is_set() and follower.pending() == []
+    assert (managers[0].status, managers[0].streaming) == (True, True)
+
+    # Without results in the cache the follower runs the probes after the timeout
+    follower = ServiceProbes(
+        make_manager("llm", test_llm=lambda stream: True),
+        make_manager("tts", test_tts=lambda stream: True),
+        make_manager("stt", test_stt=lambda: True),
+        cache=ProbeCache(str(tmp_path / "probes.json"), ttl=0),
+        timeout=0.1,
+    )
+    follower.follow(interval=0.05).join(2)
+    assert follower.done.is_set() and follower.pending() == []
@@ -0,0 +1,83 @@
+import asyncio
+import time
+from unittest.mock import Mock
+
+from api.problem_pool import ProblemPool, ProblemStore, pool_keys
+
+
+class FakeLLM:
+    def __init__(self):
+        self.config = Mock()
+        self.config.llm.name = "test-llm-model"
+        self.generated = 0
+
+    def get_problem_prepare_messages(self, requirements, difficulty, topic, interview_type):
+        return [{"role": "user", "content": f"{interview_type}|{difficulty}|{topic}"}]
+
+    def get_text(self, messages, stream=None, cache=True, priority=0):
+        self.generated += 1
+        yield f"Pooled problem about {messages[0]['content']}"
+
+    async def aget_problem(self, requirements, difficulty, topic, interview_type):
+        yield "Live"
+        yield "Live problem"
+
+
+def collect(async_generator):
+    async def run():
+        return [item async for item in async_generator]
+
+    return asyncio.run(run())
+
+
+def test_store_pops_oldest_problem_per_model(tmp_path):
+    store = ProblemStore(str(tmp_path / "problems.sqlite3"))
+    key = ("coding", "Easy", "Arrays")
+    store.add("a", key, "first")
+    store.add("a", key, "second")
+    store.add("b", key, "other model")
+
+    assert store.counts("a") == {key: 2}
+    assert store.pop("a", key) == "first"
+    assert store.pop("a", key) == "second"
+    assert store.pop("a", key) is None
+    assert store.counts("b") == {key: 1}
+
+
+def test_pool_refills_and_serves(tmp_path):
+    llm = FakeLLM()
+    keys = pool_keys(["sql"])[:3]
+    pool = ProblemPool(llm, ProblemStore(str(tmp_path / "problems.sqlite3")), depth=2, keys=keys)
+    hits, misses = pool.hits.value, pool.misses.value
+
+    # Custom requirements and topics outside of the predefined ones are generated live
+    assert collect(pool.aget_problem("Use window functions", keys[0][1], keys[0][2], "sql")) == ["Live", "Live problem"]
+    assert collect(pool.aget_problem("", "Easy", "My own topic", "sql")) == ["Live", "Live problem"]
+
+    pool.start()
+    for _ in range(200):
+        if sum(pool.store.counts(llm.config.llm.name).values()) == 6:
+            break
+        time.sleep(0.01)
+    assert pool.store.counts(llm.config.llm.name) == {key: 2 for key in keys}
+
+    interview_type, difficulty, topic = keys[1]
+    problem = f"Pooled problem about {interview_type}|{difficulty}|{topic}"
+    assert collect(pool.aget_problem("", difficulty.lower(), topic, interview_type)) == [problem]
+
+    # The served problem is replaced in the background
+    for _ in range(200):
+        if llm.generated == 7:
+            break
+        time.sleep(0.01)
+    pool.stop()
+    assert llm.generated == 7
+    assert (pool.hits.value - hits, pool.misses.value - misses) == (1, 2)
+
+
+def test_disabled_pool_counts_nothing():
+    pool = ProblemPool(FakeLLM(), depth=0)
+    hits, misses = pool.hits.value, pool.misses.value
+    assert pool.store is None
+    assert collect(pool.aget_problem("", "Easy", "Arrays", "coding")) == ["Live", "Live problem"]
+    assert (pool.hits.value, pool.misses.value) == (hits, misses)
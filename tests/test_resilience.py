@@ -0,0 +1,269 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from api.llm import APIError, LLMManager
+from api.response_cache import ResponseCache
+from utils.config import Config
+from utils.admission import AdmissionController
+from utils.resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, backoff_delay, is_retryable
+
+
+@pytest.fixture
+def endpoints_config(monkeypatch):
+    monkeypatch.setattr("utils.config.load_dotenv", lambda override: None)
+    monkeypatch.setattr("api.llm.LLM_RETRY_BACKOFF", 0)
+    for prefix, content in [("LLM", "slow reply"), ("LLM_2", "fast reply")]:
+        monkeypatch.setenv(f"{prefix}_MOCK_CONTENT", content)
+        monkeypatch.setenv(f"{prefix}_MOCK_RATE", "1000")
+        monkeypatch.setenv(f"{prefix}_MOCK_JITTER", "0")
+    monkeypatch.setenv("LLM_TYPE", "MOCK")
+    monkeypatch.setenv("LLM_MOCK_TTFT", "1")
+    monkeypatch.setenv("LLM_TYPE_2", "MOCK")
+    monkeypatch.setenv("LLM_NAME_2", "fallback-model")
+    monkeypatch.setenv("LLM_KEY_2", "fallback-key")
+    monkeypatch.setenv("LLM_2_MOCK_TTFT", "0.01")
+    return Config()
+
+
+def test_fallback_config(endpoints_config):
+    assert [endpoint.type for endpoint in endpoints_config.llm_endpoints] == ["MOCK", "MOCK"]
+    assert endpoints_config.llm_endpoints[0] is endpoints_config.llm
+    fallback = endpoints_config.llm_endpoints[1]
+    assert fallback.name == "fallback-model" and fallback.key == "fallback-key"
+    assert fallback.mock.ttft == 0.01 and fallback.mock.content == "fast reply"
+
+
+def test_circuit_breaker():
+    breaker = CircuitBreaker("test_breaker", failures=2, cooldown=0.05)
+    breaker.failure()
+    assert breaker.state == CLOSED and breaker.allow()
+    breaker.failure()
+    assert breaker.state == OPEN and not breaker.allow()
+    assert breaker.open_gauge.value == 1
+
+    time.sleep(0.06)
+    # A single trial call after the cooldown, its failure opens the circuit again
+    assert breaker.allow() and breaker.state == HALF_OPEN
+    assert not breaker.allow()
+    breaker.failure()
+    assert breaker.state == OPEN
+
+    # An abandoned trial call opens the circuit again instead of keeping the trial claimed
+    time.sleep(0.06)
+    assert breaker.allow() and breaker.state == HALF_OPEN
+    breaker.release()
+    assert breaker.state == OPEN and not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.success()
+    assert breaker.state == CLOSED and breaker.open_gauge.value == 0
+    assert 0 <= backoff_delay(3, 0.5, 1) <= 1
+
+
+def test_failover_and_breaker(endpoints_config, monkeypatch):
+    monkeypatch.setattr("api.llm.LLM_BREAKER_FAILURES", 2)
+    llm = LLMManager(endpoints_config, {}, check_status=False)
+    main, fallback = llm.endpoints
+    main.mock.config.error_rate = 1
+    main.mock.config.ttft = 0
+    messages = [{"role": "user", "content": "Hi"}]
+
+    # Non-streamed calls, the injected errors of streams may come after the first token
+    retries = llm.retries.value
+    assert "".join(llm.get_text(messages, stream=False)) == "fast reply"
+    assert llm.retries.value == retries + 1
+    assert "".join(llm.get_text(messages, stream=False)) == "fast reply"
+    assert main.breaker.state == OPEN
+
+    # The open circuit sends the calls straight to the fallback
+    assert "".join(llm.get_text(messages, stream=False)) == "fast reply"
+    assert llm.retries.value == retries + 2
+
+    fallback.mock.config.error_rate = 1
+    with pytest.raises(APIError):
+        list(llm.get_text(messages, stream=False))
+
+
+def test_no_retry_after_first_token(endpoints_config, monkeypatch):
+    llm = LLMManager(endpoints_config, {}, check_status=False)
+    calls = []
+
+    def broken(endpoint, messages, stream):
+        calls.append(endpoint)
+        yield "partial"
+        raise RuntimeError("connection reset")
+
+    monkeypatch.setattr(llm, "_call", broken)
+    with pytest.raises(APIError):
+        list(llm.get_text([{"role": "user", "content": "Hi"}], stream=True))
+    assert len(calls) == 1
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+def test_only_transient_errors_are_retried(endpoints_config, monkeypatch):
+    assert all(is_retryable(e) for e in [StatusError(429), StatusError(503), TimeoutError(), ConnectionResetError()])
+    assert not any(is_retryable(e) for e in [StatusError(400), StatusError(401), StatusError(404), ValueError()])
+
+    llm = LLMManager(endpoints_config, {}, check_status=False)
+    main = llm.endpoints[0]
+
+    def rejected(endpoint, stream):
+        raise StatusError(401)
+        yield
+
+    # An invalid request fails right away and the endpoint that rejected it is not taken for a failing one
+    monkeypatch.setattr(llm, "_get_text_mock", rejected)
+    retries = llm.retries.value
+    with pytest.raises(APIError):
+        list(llm.get_text([{"role": "user", "content": "Hi"}], stream=False))
+    assert llm.retries.value == retries
+    assert main.breaker.failures_in_row == 0 and main.breaker.state == CLOSED
+    assert llm.admission.in_flight == 0
+
+    # Unless set, a single endpoint is not retried
+    assert llm._max_retries() == 2
+    llm.endpoints = llm.endpoints[:1]
+    assert llm._max_retries() == 0
+
+
+def test_hedged_requests(endpoints_config, monkeypatch):
+    monkeypatch.setattr("api.llm.LLM_HEDGE_AFTER", 0.1)
+    llm = LLMManager(endpoints_config, {}, check_status=False)
+    messages = [{"role": "user", "content": "Hi"}]
+
+    hedges, wins = llm.hedges.value, llm.hedge_wins.value
+    started = time.perf_counter()
+    assert "".join(llm.get_text(messages, stream=True)) == "fast reply"
+    assert time.perf_counter() - started < 0.8
+
+    async def collect():
+        return "".join([text async for text in llm.aget_text(messages, stream=True)])
+
+    started = time.perf_counter()
+    assert asyncio.run(collect()) == "fast reply"
+    assert time.perf_counter() - started < 0.8
+    assert llm.hedges.value == hedges + 2 and llm.hedge_wins.value == wins + 2
+
+    # A fast first call is never hedged
+    llm.endpoints[0].mock.config.ttft = 0.01
+    assert "".join(llm.get_text(messages, stream=True)) == "slow reply"
+    assert llm.hedges.value == hedges + 2
+
+
+def test_hedged_request_needs_admission(endpoints_config, monkeypatch):
+    monkeypatch.setattr("api.llm.LLM_HEDGE_AFTER", 0.1)
+    llm = LLMManager(endpoints_config, {}, check_status=False)
+    llm.endpoints[0].mock.config.ttft = 0.3
+    messages = [{"role": "user", "content": "Hi"}]
+    hedges = llm.hedges.value
+
+    # With one call in flight allowed the hedged call is skipped and the first call goes on alone
+    llm.admission = AdmissionController("hedge_test", concurrency=1)
+    assert "".join(llm.get_text(messages, stream=True)) == "slow reply"
+
+    async def collect():
+        return "".join([text async for text in llm.aget_text(messages, stream=True)])
+
+    assert asyncio.run(collect()) == "slow reply"
+    assert llm.hedges.value == hedges and llm.admission.in_flight == 0
+
+    # The hedged calls hold slots of their own until they end
+    llm.admission = AdmissionController("hedge_test", concurrency=2)
+    assert "".join(llm.get_text(messages, stream=True)) == "fast reply"
+    assert asyncio.run(collect()) == "fast reply"
+    deadline = time.monotonic() + 2
+    while llm.admission.in_flight and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert llm.hedges.value == hedges + 2 and llm.admission.in_flight == 0
+
+
+def test_losing_hedged_stream_is_closed(endpoints_config, monkeypatch):
+    monkeypatch.setattr("api.llm.LLM_HEDGE_AFTER", 0.1)
+    llm = LLMManager(endpoints_config, {}, check_status=False)
+    main = llm.endpoints[0]
+    closed = threading.Event()
+
+    class HangingStream:
+        def __iter__(self):
+            # Like a connection that never sends a token, reading fails once the response is closed
+            closed.wait(10)
+            raise ConnectionResetError("response closed")
+            yield
+
+        def close(self):
+            closed.set()
+
+    class Completions:
+        def create(self, **kwargs):
+            return HangingStream()
+
+    main.type = "OPENAI_API"
+    main.client = type("Client", (), {"chat": type("Chat", (), {"completions": Completions()})()})()
+    started = time.perf_counter()
+    assert "".join(llm.get_text([{"role": "user", "content": "Hi"}], stream=True)) == "fast reply"
+    assert closed.wait(1) and time.perf_counter() - started < 1
+    # The failure of the closed stream is not the endpoint's
+    time.sleep(0.05)
+    assert main.breaker.failures_in_row == 0 and main.breaker.state == CLOSED
+
+
+def test_abandoned_trial_call_releases_breaker(endpoints_config, monkeypatch):
+    monkeypatch.setattr("api.llm.LLM_HEDGE_AFTER", 0.1)
+    llm = LLMManager(endpoints_config, {}, check_status=False)
+    main = llm.endpoints[0]
+    main.mock.config.ttft = 0.3
+    messages = [{"role": "user", "content": "Hi"}]
+
+    def trial():
+        main.breaker.state = OPEN
+        main.breaker.opened_at = time.monotonic() - main.breaker.cooldown
+
+    async def collect():
+        return "".join([text async for text in llm.aget_text(messages, stream=True)])
+
+    # The trial call loses to the hedged one: it is cancelled, or closed by its thread at its next token
+    trial()
+    assert asyncio.run(collect()) == "fast reply"
+    assert main.breaker.state == OPEN
+
+    trial()
+    assert "".join(llm.get_text(messages, stream=True)) == "fast reply"
+    deadline = time.monotonic() + 2
+    while main.breaker.state == HALF_OPEN and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert main.breaker.state == OPEN
+
+    # The reader stops before the end of the trial call
+    monkeypatch.setattr("api.llm.LLM_HEDGE_AFTER", 0)
+    main.mock.config.ttft = 0
+    trial()
+    replies = llm.get_text(messages, stream=True)
+    assert next(replies)
+    replies.close()
+    assert main.breaker.state == OPEN and time.monotonic() - main.breaker.opened_at < 1
+
+
+def test_fallback_reply_is_not_cached(endpoints_config, tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite3"), replay_speed=0)
+    llm = LLMManager(endpoints_config, {}, check_status=False, response_cache=cache)
+    main = llm.endpoints[0]
+    main.mock.config.error_rate = 1
+    main.mock.config.ttft = 0
+    messages = [{"role": "user", "content": "Hi"}]
+
+    # The reply of the fallback model is not stored under the key of the main one
+    assert "".join(llm.get_text(messages, stream=False, cache=True)) == "fast reply"
+    assert cache.get(llm._cache_key(messages, False)) is None
+
+    main.mock.config.error_rate = 0
+    assert "".join(llm.get_text(messages, stream=False, cache=True)) == "slow reply"
+    assert "".join(chunk for _, chunk in cache.get(llm._cache_key(messages, False))) == "slow reply"
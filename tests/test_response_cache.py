@@ -0,0 +1,98 @@
+import asyncio
+import time
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+
+from api.llm import LLMManager
+from api.response_cache import ResponseCache, create_chat_completion
+
+
+def slow_stream(chunks, delay):
+    for chunk in chunks:
+        time.sleep(delay)
+        yield chunk
+
+
+def test_stream_is_replayed_with_timing(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite3"))
+    key = cache.key("model", [{"role": "user", "content": "Hi!"}], temperature=0)
+    assert key == cache.key("model", [{"role": "user", "content": "Hi!"}], temperature=0)
+    assert key != cache.key("model", [{"role": "user", "content": "Hi!"}], temperature=1)
+
+    generate = Mock(side_effect=lambda: slow_stream(["Hello", ", ", "world!"], 0.05))
+    assert list(cache.cached(key, generate)) == ["Hello", ", ", "world!"]
+
+    started = time.perf_counter()
+    assert list(cache.cached(key, generate)) == ["Hello", ", ", "world!"]
+    assert time.perf_counter() - started >= 0.14
+    generate.assert_called_once()
+
+    cache.replay_speed = 0
+    started = time.perf_counter()
+    assert "".join(cache.cached(key, generate)) == "Hello, world!"
+    assert time.perf_counter() - started < 0.05
+
+
+def test_eviction_and_incomplete_responses(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite3"), max_entries=2)
+    for key in ["a", "b"]:
+        cache.set(key, [(0.0, key)])
+    cache.get("a")
+    cache.set("c", [(0.0, "c")])
+
+    # The least recently used entry is evicted
+    assert cache.get("b") is None
+    assert cache.get("a") == [(0.0, "a")] and cache.get("c") == [(0.0, "c")]
+
+    def failing():
+        yield "partial"
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        list(cache.cached("d", failing))
+    assert cache.get("d") is None
+
+    cache.ttl = 0
+    assert cache.get("a") is None
+
+
+def test_llm_manager_uses_cache(tmp_path):
+    config = Mock()
+    config.llm.type = "OPENAI_API"
+    config.llm.name = "test-llm-model"
+    config.llm.url = "https://api.example.com"
+    cache = ResponseCache(str(tmp_path / "responses.sqlite3"), replay_speed=0)
+    llm = LLMManager(config, {}, check_status=False, response_cache=cache)
+    llm.async_client = Mock()
+    response = Mock(usage=None)
+    response.choices = [Mock()]
+    response.choices[0].message.content = "Hello!"
+    llm.async_client.chat.completions.create = AsyncMock(return_value=response)
+
+    async def collect(**kwargs):
+        return [text async for text in llm.aget_text([{"role": "user", "content": "Hi!"}], stream=False, **kwargs)]
+
+    assert asyncio.run(collect(cache=True)) == ["Hello!"]
+    assert asyncio.run(collect(cache=True)) == ["Hello!"]
+    assert llm.async_client.chat.completions.create.call_count == 1
+    # Caching is opt-in per call
+    assert asyncio.run(collect()) == ["Hello!"]
+    assert llm.async_client.chat.completions.create.call_count == 2
+
+    # The connection test never uses the cache
+    with patch.object(LLMManager, "_generate", return_value=iter(["pong"])) as generate:
+        assert llm.test_llm()
+        generate.assert_called_once()
+
+
+def test_create_chat_completion(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite3"))
+    client = Mock(base_url="https://api.example.com")
+    client.chat.completions.create.return_value.choices = [Mock()]
+    client.chat.completions.create.return_value.choices[0].message.content = '{"score": 1}'
+    params = {"model": "grader", "messages": [{"role": "user", "content": "Grade"}], "temperature": 0}
+
+    assert create_chat_completion(client, cache, **params, timeout=30) == '{"score": 1}'
+    assert create_chat_completion(client, cache, **params) == '{"score": 1}'
+    assert client.chat.completions.create.call_count == 1
@@ -0,0 +1,161 @@
+import asyncio
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from api.audio import AudioRingBuffer, VoiceActivityDetector
+from utils.errors import SessionLimitError
+from utils.session import SessionBarrier, SessionStore
+
+
+def test_barrier_releases_waiter_when_last_task_ends():
+    barrier = SessionBarrier()
+    barrier.begin("a")
+    barrier.begin("a")
+    barrier.begin("b")
+
+    def finish():
+        time.sleep(0.05)
+        barrier.end("a")
+        time.sleep(0.05)
+        barrier.end("a")
+
+    async def wait():
+        threading.Thread(target=finish).start()
+        started = time.monotonic()
+        result = await barrier.wait("a", timeout=5)
+        return result, time.monotonic() - started
+
+    result, elapsed = asyncio.run(wait())
+    assert result and 0.1 <= elapsed < 1
+    assert asyncio.run(barrier.wait("c", timeout=5))
+
+
+def test_barrier_timeout_and_reset():
+    barrier = SessionBarrier()
+    barrier.begin("a")
+
+    assert not asyncio.run(barrier.wait("a", timeout=0.05))
+    barrier.reset("a")
+    assert asyncio.run(barrier.wait("a", timeout=0.05))
+
+
+def test_barrier_grace_waits_for_late_task():
+    barrier = SessionBarrier()
+
+    def late_task():
+        time.sleep(0.05)
+        barrier.begin("a")
+        time.sleep(0.1)
+        barrier.end("a")
+
+    async def wait():
+        threading.Thread(target=late_task).start()
+        started = time.monotonic()
+        result = await barrier.wait("a", timeout=5, grace=1)
+        return result, time.monotonic() - started
+
+    # The task that begins within the grace period is waited for, an idle session is released after the grace period
+    result, elapsed = asyncio.run(wait())
+    assert result and 0.15 <= elapsed < 1
+    assert not barrier.starters["a"]
+
+    started = time.monotonic()
+    assert asyncio.run(barrier.wait("b", timeout=5, grace=0.05))
+    assert 0.05 <= time.monotonic() - started < 1
+
+
+def test_session_store_lru_and_expiry():
+    store = SessionStore(max_active=2, idle_timeout=60, path=None)
+    store.get("a")["chat_history"] = [{"role": "system", "content": "a"}]
+    with store.session("b") as state:
+        state["hidden_text"] = "b"
+    assert store.get("a")["chat_history"][0]["content"] == "a"
+
+    # Without a spill path a new session is refused instead of dropping the state of a live one
+    with pytest.raises(SessionLimitError):
+        store.get("c")
+    assert list(store.sessions) == ["b", "a"]
+    assert store.get("b") == {"hidden_text": "b"}
+
+    store.expire(time.time() + 120)
+    assert not store.sessions
+    assert store.get("c") == {}
+
+
+def test_session_store_async_access(tmp_path):
+    store = SessionStore(max_active=10, idle_timeout=60, path=str(tmp_path / "sessions.sqlite3"))
+
+    async def run():
+        async with store.asession("a", persist=True) as state:
+            state["chat_history"] = [{"role": "system", "content": "a"}]
+        return await store.aget("a")
+
+    assert asyncio.run(run())["chat_history"][0]["content"] == "a"
+    # The durable values were written through
+    assert store._load("a") == {"chat_history": [{"role": "system", "content": "a"}]}
+
+
+def test_session_store_spills_to_disk(tmp_path):
+    store = SessionStore(max_active=1, idle_timeout=60, path=str(tmp_path / "sessions.sqlite3"))
+    state = store.get("a")
+    state["audio_buffer"] = AudioRingBuffer()
+    state["audio_buffer"].append(np.arange(100, dtype=np.int16))
+    state["vad"] = VoiceActivityDetector()
+    state["lock"] = threading.Lock()
+
+    store.get("b")
+    assert list(store.sessions) == ["b"]
+
+    # Values that can't be pickled are dropped, the detector is created again
+    state = store.get("a")
+    assert set(state) == {"audio_buffer", "vad"}
+    assert np.array_equal(state["audio_buffer"].view(), np.arange(100, dtype=np.int16))
+    assert not state["vad"].has_voice(np.zeros(24000, dtype=np.int16))
+
+    store.get("b")
+    store.expire(time.time() + 120)
+    assert store.get("a") == {}
+
+
+def test_session_store_shares_durable_state(tmp_path):
+    path = str(tmp_path / "sessions.sqlite3")
+    first = SessionStore(max_active=10, idle_timeout=60, path=path)
+    second = SessionStore(max_active=10, idle_timeout=60, path=path)
+    with first.session("a", persist=True) as state:
+        state["chat_history"] = [{"role": "system", "content": "a"}]
+        state["previous_code"] = "pass"
+        state["hidden_text"] = "not durable"
+
+    # Another worker picks the session up after its worker went down
+    state = second.get("a")
+    assert state["chat_history"] == [{"role": "system", "content": "a"}]
+    assert state["previous_code"] == "pass"
+    assert "hidden_text" not in state
+
+    # Back on the first worker, a persisting block reloads the durable values written meanwhile by the other one
+    with second.session("a", persist=True) as state:
+        state["chat_history"].append({"role": "user", "content": "b"})
+    first.get("a")
+    with first.session("a", persist=True) as state:
+        assert state["chat_history"] == [{"role": "system", "content": "a"}, {"role": "user", "content": "b"}]
+        assert state["hidden_text"] == "not durable"
+        state["chat_history"].append({"role": "assistant", "content": "c"})
+    # Its own saves are not taken for changes of another worker
+    with first.session("a", persist=True) as state:
+        assert len(state["chat_history"]) == 3
+
+
+def test_session_store_keeps_sessions_in_use(tmp_path):
+    store = SessionStore(max_active=1, idle_timeout=60, path=str(tmp_path / "sessions.sqlite3"))
+    with store.session("a") as state:
+        state["lock"] = threading.Lock()
+        # A session used by a block is neither spilled nor expired, even above the limit
+        store.get("b")
+        store.expire(time.time() + 120)
+        assert "a" in store.sessions and store.get("a") is state
+    store.get("c")
+    assert list(store.sessions) == ["c"]
+    assert store.get("a") == {}
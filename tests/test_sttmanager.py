@@ -0,0 +1,203 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch, Mock
+
+import numpy as np
+import pytest
+
+from api.audio import STTManager, VoiceActivityDetector, AudioRingBuffer, StreamingTranscriber, APIError
+from api.local_stt import LocalInferenceServer
+from utils.errors import AudioBufferOverflowError
+from utils.metrics import Histogram
+
+
+class TestSTTManager:
+
+    def setup_method(self):
+        self.config = Mock()
+        self.config.stt.key = "test-key"
+        self.config.stt.url = "https://api.example.com"
+        self.config.stt.name = "test-stt-model"
+        self.config.stt.type = "OPENAI_API"
+        self.stt_manager = STTManager(self.config, check_status=False)
+
+    @patch("openai.OpenAI")
+    def test_openai_client_is_reused(self, mock_openai):
+        mock_openai.return_value.audio.transcriptions.create.return_value = "Hello, world!"
+        count = self.stt_manager.latency.count
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(lambda _: self.stt_manager.transcribe_audio(np.ones(10000, dtype=np.int16)), range(8)))
+
+        assert results == ["Hello, world!"] * 8
+        mock_openai.assert_called_once()
+        assert self.stt_manager.latency.count == count + 8
+
+    @patch("requests.Session.post")
+    def test_transcribe_hf_api_error(self, mock_post):
+        self.config.stt.type = "HF_API"
+        mock_post.return_value.status_code = 503
+        mock_post.return_value.json.return_value = {"error": "Model is loading"}
+
+        with pytest.raises(APIError):
+            self.stt_manager.transcribe_audio(np.ones(10000, dtype=np.int16))
+
+
+class TestVoiceActivityDetector:
+
+    def setup_method(self):
+        rng = np.random.default_rng(0)
+        t = np.arange(48000 * 3) / 48000
+        voice = 8000 * np.sin(2 * np.pi * 220 * t) * (1 + np.sin(2 * np.pi * 3 * t)) + rng.normal(0, 500, len(t))
+        self.audio = voice.astype(np.int16)
+
+    @pytest.mark.parametrize("resample", [False, True])
+    def test_chunks_match_whole_stream(self, resample):
+        whole = VoiceActivityDetector(resample=resample).process(self.audio)
+
+        vad = VoiceActivityDetector(resample=resample)
+        chunked = np.concatenate([vad.process(self.audio[i : i + 24000]) for i in range(0, len(self.audio), 24000)])
+
+        assert len(whole) == len(self.audio) // (48000 * 30 // 1000)
+        np.testing.assert_array_equal(whole, chunked)
+        assert len(vad.remainder) == 0
+
+    def test_remainder_is_carried(self):
+        vad = VoiceActivityDetector()
+        assert len(vad.process(self.audio[:1000])) == 0
+        assert len(vad.remainder) == 1000
+        assert len(vad.process(self.audio[1000:2000])) == 1
+        assert len(vad.remainder) == 2000 - 1440
+
+    def test_silence(self):
+        vad = VoiceActivityDetector()
+        assert not vad.has_voice(np.zeros(24000, dtype=np.int16))
+
+
+class TestAudioRingBuffer:
+
+    def test_append_grows_and_views(self):
+        buffer = AudioRingBuffer(initial_capacity=4, max_length=100)
+        expected = np.arange(50, dtype=np.int16)
+        for i in range(0, 50, 7):
+            buffer.append(expected[i : i + 7])
+
+        assert len(buffer) == 50 and len(buffer.data) == 64
+        np.testing.assert_array_equal(buffer.view(), expected)
+        assert np.shares_memory(buffer.view(), buffer.data)
+
+        storage = buffer.data
+        segment = buffer.pop()
+        assert len(buffer) == 0 and buffer.data is storage
+        buffer.append(np.full(10, -1, dtype=np.int16))
+        np.testing.assert_array_equal(segment, expected)
+
+    @pytest.mark.parametrize("overflow", ["drop_oldest", "drop_newest", "raise"])
+    def test_overflow(self, overflow):
+        buffer = AudioRingBuffer(initial_capacity=4, max_length=20, overflow=overflow)
+        audio = np.arange(100, dtype=np.int16)
+        if overflow == "raise":
+            buffer.append(audio[:20])
+            with pytest.raises(AudioBufferOverflowError):
+                buffer.append(audio[20:21])
+            return
+
+        for i in range(0, 100, 3):
+            buffer.append(audio[i : i + 3])
+        assert len(buffer) == 20 and len(buffer.data) <= 30
+        kept = audio[-20:] if overflow == "drop_oldest" else audio[:20]
+        np.testing.assert_array_equal(buffer.view(), kept)
+
+    def test_process_audio_chunk(self):
+        stt_manager = STTManager(Mock(), check_status=False)
+        vad = Mock()
+        vad.has_voice.side_effect = [True, True, True, False]
+        chunk = np.ones(24000, dtype=np.int16)
+
+        audio_buffer = None
+        for _ in range(3):
+            audio_buffer, to_transcribe, vad = stt_manager.process_audio_chunk((48000, chunk), audio_buffer, vad)
+            assert len(to_transcribe) == 0
+        audio_buffer, to_transcribe, vad = stt_manager.process_audio_chunk((48000, chunk), audio_buffer, vad)
+
+        assert len(to_transcribe) == 72000 and len(audio_buffer) == 0
+
+
+class TestStreamingTranscriber:
+
+    def setup_method(self):
+        self.stt_manager = STTManager(Mock(), check_status=False)
+        self.block = self.stt_manager.SAMPLE_RATE // 2
+        # Every half a second of the test audio is one spoken word, encoded in the sample values
+        self.stt_manager.transcribe_numpy_array = Mock(side_effect=self.transcribe)
+
+    def transcribe(self, audio, context=None):
+        return " ".join(f"word{value}" for value in audio[:: self.block])
+
+    @pytest.mark.parametrize("num_words", [3, 10, 17, 40])
+    def test_windows_are_merged(self, num_words):
+        transcriber = StreamingTranscriber(self.stt_manager)
+        for i in range(num_words):
+            transcriber.add_audio(np.full(self.block, i, dtype=np.int16))
+            text = transcriber.step()
+            assert text.split() == [f"word{j}" for j in range(len(text.split()))]
+
+        # Only the last window is left to transcribe when the recording stops
+        assert len(transcriber.buffer) <= self.stt_manager.CHUNK_LENGTH * self.stt_manager.SAMPLE_RATE
+        assert transcriber.finalize() == " ".join(f"word{i}" for i in range(num_words))
+
+    def test_mismatched_overlap(self):
+        transcriber = StreamingTranscriber(self.stt_manager)
+        transcriber.add_audio(np.repeat(np.arange(12, dtype=np.int16), self.block))
+        transcriber.step()
+        self.stt_manager.transcribe_numpy_array.side_effect = lambda audio, context=None: "a b c d e f g h i j k l m n o p q r"
+
+        # The words in the overlap with the committed part are dropped by their estimated time
+        assert transcriber.finalize().split()[8:] == list("ghijklmnopqr")
+
+
+def test_local_inference_server_batches_requests():
+    batch_sizes = []
+
+    def pipe(inputs, batch_size):
+        batch_sizes.append(batch_size)
+        time.sleep(0.05)
+        return [{"text": f"length {len(request['raw'])}"} for request in inputs]
+
+    server = LocalInferenceServer("test-model", max_batch_size=4, max_wait_ms=100, pipeline_factory=lambda name: pipe)
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        results = list(executor.map(lambda n: server.transcribe(np.zeros(n, dtype=np.float32), 16000), range(1, 7)))
+
+    assert results == [f"length {n}" for n in range(1, 7)]
+    assert sum(batch_sizes) == 6 and max(batch_sizes) == 4 and len(batch_sizes) == 2
+
+
+def test_local_inference_server_loads_in_background():
+    loaded = threading.Event()
+
+    def load(name):
+        loaded.wait(5)
+        return lambda inputs, batch_size: [{"text": name} for _ in inputs]
+
+    server = LocalInferenceServer("test-model", pipeline_factory=load)
+    assert not server.ready.is_set()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        result = executor.submit(server.transcribe, np.zeros(10, dtype=np.float32), 16000)
+        loaded.set()
+        assert result.result(timeout=5) == "test-model"
+    assert server.ready.is_set()
+
+    failing = LocalInferenceServer("missing-model", pipeline_factory=Mock(side_effect=OSError("not found")))
+    with pytest.raises(OSError):
+        failing.transcribe(np.zeros(10, dtype=np.float32), 16000)
+
+
+def test_histogram():
+    histogram = Histogram("test_seconds", buckets=(0.1, 1.0))
+    for value in [0.05, 0.5, 0.5, 2.0]:
+        histogram.observe(value)
+
+    assert histogram.snapshot() == {"count": 4, "sum": 3.05, "buckets": {0.1: 1, 1.0: 3, float("inf"): 4}}
+    assert histogram.quantile(0.5) == 1.0
+    assert histogram.quantile(0.99) == float("inf")
@@ -0,0 +1,151 @@
+import asyncio
+import inspect
+import urllib.request
+from unittest.mock import Mock
+
+import pytest
+
+from api.llm import APIError, LLMManager
+from utils.config import Config
+from utils.metrics import MetricsRegistry, metrics, start_metrics_server
+from utils.tracing import NOOP_SPAN, Tracer
+
+
+def test_disabled_tracer_costs_nothing():
+    tracer = Tracer(enabled=False, otlp_endpoint=None)
+    handler = lambda x: x
+    assert tracer.span("anything", value=1) is NOOP_SPAN
+    assert tracer.traced("handler", handler) is handler
+
+
+def test_span_records_metrics_and_exports():
+    tracer = Tracer(enabled=True, otlp_endpoint="http://collector:4318")
+    tracer._otel_tracer = Mock()
+    duration = metrics.histogram("test_span_duration_seconds")
+    first_chunk = metrics.histogram("test_span_first_chunk_seconds")
+    count, first_count = duration.count, first_chunk.count
+
+    with tracer.span("test_span", unit="bytes", stream=True) as span:
+        span.chunk(100)
+        span.chunk(50)
+    assert span.attributes["bytes"] == 150 and span.attributes["stream"] is True
+    assert span.attributes["time_to_first_chunk"] <= span.attributes["duration"]
+    assert (duration.count - count, first_chunk.count - first_count) == (1, 1)
+
+    tracer._otel_tracer.start_span.assert_called_once()
+    otel_span = tracer._otel_tracer.start_span.return_value
+    assert otel_span.set_attributes.call_args.args[0]["bytes"] == 150
+    otel_span.end.assert_called_once()
+
+    errors = metrics.counter("test_span_errors").value
+    with pytest.raises(ValueError):
+        with tracer.span("test_span"):
+            raise ValueError("boom")
+    assert metrics.counter("test_span_errors").value == errors + 1
+
+
+def test_traced_handlers_keep_their_kind():
+    tracer = Tracer(enabled=True, otlp_endpoint=None)
+
+    async def stream(text, request=None):
+        for word in text.split():
+            yield word
+
+    def process(audio, buffer):
+        return audio + buffer
+
+    traced_stream = tracer.traced("test_handler_stream", stream)
+    traced_process = tracer.traced("test_handler_process", process)
+    assert inspect.isasyncgenfunction(traced_stream) and not inspect.isasyncgenfunction(traced_process)
+    assert inspect.signature(traced_stream) == inspect.signature(stream)
+    assert traced_process(1, 2) == 3
+
+    async def collect():
+        return [word async for word in traced_stream("a b c")]
+
+    assert asyncio.run(collect()) == ["a", "b", "c"]
+    assert metrics.histogram("test_handler_stream_first_chunk_seconds").count == 1
+
+
+def test_spans_inside_traced_handlers_are_children():
+    tracer = Tracer(enabled=True, otlp_endpoint="http://collector:4318")
+    tracer._otel_tracer = Mock()
+    spans = []
+
+    def call(name):
+        with tracer.span(name) as span:
+            spans.append(span)
+
+    async def turn(text):
+        call("test_child_llm")
+        for word in text.split():
+            yield word
+        await asyncio.to_thread(call, "test_child_tts")
+
+    traced_turn = tracer.traced("test_parent_turn", turn)
+
+    async def collect():
+        words = []
+        async for word in traced_turn("a b"):
+            # Spans started by the caller between the items are not children of the handler
+            call("test_sibling")
+            words.append(word)
+        return words
+
+    assert asyncio.run(collect()) == ["a", "b"]
+    llm, sibling, _, tts = spans
+    parent = llm.parent
+    assert parent is not None and parent.name == "test_parent_turn" and tts.parent is parent
+    assert sibling.parent is None and parent.parent is None
+    # The exported spans of the children are started in the context of the handler's span
+    parented = [call.kwargs["context"] is not None for call in tracer._otel_tracer.start_span.call_args_list]
+    assert parented == [False, True, False, False, True]
+
+
+def test_llm_span(monkeypatch):
+    monkeypatch.setattr("utils.config.load_dotenv", lambda override: None)
+    monkeypatch.setenv("LLM_TYPE", "MOCK")
+    monkeypatch.setenv("LLM_MOCK_TTFT", "0.01")
+    monkeypatch.setenv("LLM_MOCK_RATE", "1000")
+    monkeypatch.setattr("api.llm.tracer", Tracer(enabled=True, otlp_endpoint=None))
+    llm = LLMManager(Config(), {}, check_status=False)
+    spans = metrics.histogram("llm_get_text_first_chunk_seconds")
+    count = spans.count
+
+    assert "".join(llm.get_text([], stream=True, cache=False))
+    assert spans.count == count + 1
+
+    llm.mock.config.error_rate = 1
+    with pytest.raises(APIError):
+        list(llm.get_text([], stream=True, cache=False))
+    assert metrics.counter("llm_get_text_errors").value >= 1
+
+
+def test_prometheus_endpoint():
+    registry = MetricsRegistry()
+    registry.counter("test_requests", "Requests").inc(3)
+    histogram = registry.histogram("test_latency_seconds", "Latency", buckets=(0.1, 1.0))
+    histogram.observe(0.05)
+    histogram.observe(5)
+    assert registry.prometheus() == (
+        "# HELP test_latency_seconds Latency\n"
+        "# TYPE test_latency_seconds histogram\n"
+        'test_latency_seconds_bucket{le="0.1"} 1\n'
+        'test_latency_seconds_bucket{le="1.0"} 1\n'
+        'test_latency_seconds_bucket{le="+Inf"} 2\n'
+        "test_latency_seconds_sum 5.05\n"
+        "test_latency_seconds_count 2\n"
+        "# HELP test_requests Requests\n"
+        "# TYPE test_requests counter\n"
+        "test_requests 3.0\n"
+    )
+
+    metrics.counter("test_endpoint_requests").inc()
+    server = start_metrics_server(0, "127.0.0.1")
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics") as response:
+            assert response.headers["Content-Type"].startswith("text/plain")
+            assert "test_endpoint_requests 1.0" in response.read().decode()
+    finally:
+        server.shutdown()
+        server.server_close()
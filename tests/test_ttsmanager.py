@@ -1,6 +1,9 @@
+import threading
+import time
 import pytest
 from unittest.mock import patch, Mock
-from api.audio import TTSManager, APIError
+from api.audio import TTSManager, APIError, HTTP_POOL_SIZE, HTTP_MAX_RETRIES
+from api.tts_pipeline import SentenceSegmenter, TTSPipeline
 
 
 class TestTTSManager:
@@ -11,9 +14,9 @@ class TestTTSManager:
         self.config.tts.url = "https://api.example.com"
         self.config.tts.name = "test-tts-model"
         self.config.tts.type = "OPENAI_API"
-        self.tts_manager = TTSManager(self.config)
+        self.tts_manager = TTSManager(self.config, check_status=False)
 
-    @patch("requests.post")
+    @patch("requests.Session.post")
     @pytest.mark.parametrize("stream", [False, True])
     def test_read_text(self, mock_post, stream):
         self.tts_manager.streaming = stream
@@ -35,7 +38,7 @@ class TestTTSManager:
             result = list(self.tts_manager.read_text("Hello, world!"))
             assert result == [b"audio-bytes"]
 
-    @patch("requests.post")
+    @patch("requests.Session.post")
     @pytest.mark.parametrize("stream", [False, True])
     def test_read_text_error(self, mock_post, stream):
         self.tts_manager.streaming = stream
@@ -48,7 +51,7 @@ class TestTTSManager:
         with pytest.raises(APIError):
             list(self.tts_manager.read_text("Hello, world!"))
 
-    @patch("requests.post")
+    @patch("requests.Session.post")
     @pytest.mark.parametrize("stream", [False, True])
     def test_read_last_message(self, mock_post, stream):
         self.tts_manager.streaming = stream
@@ -71,7 +74,7 @@ class TestTTSManager:
             result = list(self.tts_manager.read_last_message(chat_history))
             assert result == [b"audio-bytes"]
 
-    @patch("requests.post")
+    @patch("requests.Session.post")
     @pytest.mark.parametrize("stream", [False, True])
     def test_read_last_message_error(self, mock_post, stream):
         self.tts_manager.streaming = stream
@@ -84,3 +87,81 @@ class TestTTSManager:
 
         with pytest.raises(APIError):
             list(self.tts_manager.read_last_message(chat_history))
+
+    def test_http_session(self):
+        adapter = self.tts_manager.session.get_adapter("https://api.example.com")
+        assert adapter._pool_maxsize == HTTP_POOL_SIZE
+        assert adapter.max_retries.total == HTTP_MAX_RETRIES
+        assert adapter.max_retries.allowed_methods is None
+
+
+class TestSentenceSegmenter:
+
+    def test_feed_and_flush(self):
+        segmenter = SentenceSegmenter(min_length=10)
+        reply = "Hi. Let's start with the problem. Can you walk me through\n\nyour approach? Take your time.#NO"
+        segments = []
+        for i in range(0, len(reply), 7):
+            segments += segmenter.feed(reply[i : i + 7])
+        assert segments == ["Hi. Let's start with the problem.", "Can you walk me through", "your approach?"]
+
+        assert segmenter.feed("TES# Hidden note. Never read it.") == ["Take your time."]
+        assert segmenter.feed("More text.") == []
+        assert segmenter.flush() == []
+
+
+class TestTTSPipeline:
+
+    def test_order_is_preserved(self):
+        tts = Mock()
+        # The first segment is the slowest one, but its audio must still come first
+        delays = {"one": 0.2, "two": 0.0, "three": 0.1}
+
+        def read_text(text):
+            time.sleep(delays[text])
+            yield f"{text}-1|".encode()
+            yield f"{text}-2|".encode()
+
+        tts.read_text = read_text
+        pipeline = TTSPipeline(tts, max_workers=3)
+        for text in delays:
+            pipeline.add(text)
+        assert pipeline.get(block=False) == b""
+        pipeline.close()
+
+        audio = b""
+        while (chunk := pipeline.get()) is not None:
+            audio += chunk
+        assert audio == b"one-1|one-2|two-1|two-2|three-1|three-2|"
+
+    def test_error_is_raised(self):
+        tts = Mock()
+        tts.read_text = Mock(side_effect=APIError("TTS Error"))
+        pipeline = TTSPipeline(tts)
+        pipeline.add("text")
+        pipeline.close()
+
+        with pytest.raises(APIError):
+            pipeline.get()
+
+    def test_cancel_stops_running_synthesis(self):
+        tts = Mock()
+        started = threading.Event()
+        chunks_read = []
+
+        def read_text(text):
+            for i in range(100):
+                chunks_read.append(text)
+                started.set()
+                time.sleep(0.01)
+                yield b"chunk"
+
+        tts.read_text = read_text
+        pipeline = TTSPipeline(tts, max_workers=1)
+        pipeline.add("first")
+        pipeline.add("second")
+        assert started.wait(1)
+        pipeline.cancel()
+        time.sleep(0.1)
+        # The running segment stops at its next chunk, the waiting one never starts
+        assert len(chunks_read) < 100 and "second" not in chunks_read and pipeline.running == 0
@@ -0,0 +1,100 @@
+import asyncio
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+from utils.workers import WORKER_COOKIE, StickyRouter, WorkerPool
+
+
+class EchoHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        chunks = [f"{self.server.server_port} {self.path} ".encode(), self.headers.get("Host", "").encode(), b" ", body]
+        self.send_response(200)
+        self.send_header("Content-Length", str(sum(len(chunk) for chunk in chunks)))
+        self.send_header("Set-Cookie", "app=1")
+        self.end_headers()
+        for chunk in chunks:
+            self.wfile.write(chunk)
+            self.wfile.flush()
+
+
+def start_upstream():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), EchoHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_sticky_router():
+    upstreams = [start_upstream(), start_upstream()]
+    ports = [server.server_port for server in upstreams]
+    dead_port = free_port()
+    router = StickyRouter([f"http://127.0.0.1:{port}" for port in ports + [dead_port]], retry_seconds=60)
+
+    async def run():
+        transport = httpx.ASGITransport(app=router)
+        clients = [httpx.AsyncClient(transport=transport, base_url="http://interviewer.test") for _ in range(3)]
+        first = [await client.post("/run/predict?x=1", content=b"hello") for client in clients]
+        again = [await client.post("/queue/join", content=b"again") for client in clients]
+        for client in clients:
+            await client.aclose()
+        await router.client.aclose()
+        return first, again
+
+    try:
+        first, again = asyncio.run(run())
+    finally:
+        for server in upstreams:
+            server.shutdown()
+            server.server_close()
+
+    # New clients are spread round robin, the unreachable worker is skipped and its client moved to another one
+    served = [int(response.text.split()[0]) for response in first]
+    assert served[:2] == ports and served[2] in ports
+    assert first[0].text == f"{ports[0]} /run/predict?x=1 interviewer.test hello"
+    assert first[0].headers.get_list("set-cookie")[0] == "app=1"
+    assert [response.cookies[WORKER_COOKIE] for response in first] == [str(ports.index(port)) for port in served]
+
+    # Every client stays on its worker
+    assert [int(response.text.split()[0]) for response in again] == served
+    assert all(response.text.endswith(" again") for response in again)
+
+
+def test_sticky_router_rejects_websockets():
+    router = StickyRouter(["http://127.0.0.1:1"])
+    sent = []
+
+    async def receive():
+        return {"type": "websocket.connect"}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(router({"type": "websocket", "path": "/queue/join"}, receive, send))
+    assert sent == [{"type": "websocket.close", "code": 1008, "reason": "Websockets are not supported"}]
+
+
+def test_worker_pool_environment(monkeypatch):
+    monkeypatch.delenv("SESSION_STORE_PATH", raising=False)
+    monkeypatch.setenv("METRICS_PORT", "9100")
+    pool = WorkerPool(2, 7861)
+    assert pool.upstreams == ["http://127.0.0.1:7861", "http://127.0.0.1:7862"]
+    env = pool._env(1)
+    assert env["GRADIO_SERVER_PORT"] == "7862"
+    assert env["WORKER_INDEX"] == "1" and pool._env(0)["WORKER_INDEX"] == "0"
+    assert env["METRICS_PORT"] == "9101"
+    assert env["SESSION_STORE_PATH"]
@@ -1,22 +1,161 @@
+import asyncio
 import gradio as gr
 import numpy as np
 import os
 import time
-from itertools import chain
-from typing import List, Dict, Generator, Optional, Tuple, Any
-from functools import partial
+from typing import List, Dict, AsyncGenerator, AsyncIterator, Optional, Tuple, Any
 
 from resources.data import fixed_messages, topic_lists, interview_types
 from utils.ui import add_candidate_message, add_interviewer_message
 from api.llm import LLMManager
+from api.problem_pool import ProblemPool
 from api.audio import TTSManager, STTManager
+from api.tts_pipeline import NOTES_MARKER, SentenceSegmenter, TTSPipeline
+from utils.session import SessionBarrier, SessionStore
+from utils.tracing import tracer
 
 DEMO_MESSAGE: str = """<span style="color: red;"> 
 This service is running in demo mode with limited performance (e.g. slow voice recognition). For a better experience, run the service locally, refer to the Instruction tab for more details.
 </span>"""
 
+# Maximum number of chat updates per second sent while a reply is streamed, 0 sends every token
+UI_UPDATE_RATE: float = float(os.getenv("UI_UPDATE_RATE", 20))
+PARAGRAPH_BREAK: str = "\n\n"
 
-def send_request(
+
+class ReplyParser:
+    """
+    Incrementally renders a streamed interviewer reply into the chat display.
+    Only the new characters are scanned for paragraph breaks and the notes marker, a few trailing characters that
+    could start one of them are held back until the next chunk. Paragraphs are split like str.split("\n\n") would.
+    """
+
+    def __init__(self, chat_display: List[List[Optional[str]]]):
+        """
+        Initialize the ReplyParser.
+
+        Args:
+            chat_display (List[List[Optional[str]]]): Chat display, the reply is added to its last message.
+        """
+        self.chat_display = chat_display
+        self.pending: str = ""
+        self.is_notes: bool = False
+
+    def feed(self, text: str) -> bool:
+        """
+        Add a chunk of the reply.
+
+        Args:
+            text (str): New chunk of the reply.
+
+        Returns:
+            bool: Whether the chat display changed.
+        """
+        if self.is_notes:
+            return False
+        buffer = self.pending + text
+        notes_start = buffer.find(NOTES_MARKER)
+        if notes_start >= 0:
+            self.is_notes = True
+            buffer, hold = buffer[:notes_start], 0
+        else:
+            hold = self._hold(buffer)
+        self.pending = buffer[len(buffer) - hold :]
+        return self._render(buffer[: len(buffer) - hold])
+
+    def finish(self) -> bool:
+        """
+        Render the characters held back at the end of the reply.
+
+        Returns:
+            bool: Whether the chat display changed.
+        """
+        text, self.pending = self.pending, ""
+        return False if self.is_notes else self._render(text)
+
+    def _hold(self, buffer: str) -> int:
+        # An unpaired trailing newline can be the start of a paragraph break
+        trailing_newlines = len(buffer) - len(buffer.rstrip("\n"))
+        if trailing_newlines % 2:
+            return 1
+        for size in range(min(len(NOTES_MARKER) - 1, len(buffer)), 0, -1):
+            if buffer.endswith(NOTES_MARKER[:size]):
+                return size
+        return 0
+
+    def _render(self, text: str) -> bool:
+        if not text:
+            return False
+        paragraphs = text.split(PARAGRAPH_BREAK)
+        self.chat_display[-1][1] += paragraphs[0]
+        for paragraph in paragraphs[1:]:
+            self.chat_display.append([None, paragraph])
+        return True
+
+
+class BackgroundStream:
+    """
+    Consumes a stream of cumulative texts, like the feedback of LLMManager.aend_interview, in a background task.
+    Only the latest text is kept, so a reader that starts late gets everything generated so far at once and then
+    follows the live updates.
+    """
+
+    def __init__(self, texts: AsyncIterator[str], key: Any = None):
+        """
+        Start consuming the stream, must be called on the event loop the reader runs on.
+
+        Args:
+            texts (AsyncIterator[str]): Stream of cumulative texts.
+            key (Any): What the stream was started for, e.g. the chat history it is the feedback of. Defaults to None.
+        """
+        self.key = key
+        self.text: Optional[str] = None
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.updated = asyncio.Event()
+        self.task = asyncio.create_task(self._consume(texts))
+
+    async def _consume(self, texts: AsyncIterator[str]) -> None:
+        try:
+            async for text in texts:
+                self.text = text
+                self.updated.set()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self.updated.set()
+
+    async def follow(self) -> AsyncGenerator[str, None]:
+        """
+        Read the stream, starting with the text buffered so far.
+
+        Yields:
+            str: The latest text, only when it has changed.
+
+        Raises:
+            Exception: The error of the stream, after the text generated before it.
+        """
+        sent = None
+        while True:
+            await self.updated.wait()
+            self.updated.clear()
+            if self.text is not None and self.text != sent:
+                sent = self.text
+                yield sent
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+
+    def cancel(self) -> None:
+        """
+        Stop consuming the stream.
+        """
+        self.task.cancel()
+
+
+async def send_request(
     code: str,
     previous_code: str,
     chat_history: List[Dict[str, str]],
@@ -24,10 +163,17 @@ def send_request(
     llm: LLMManager,
     tts: Optional[TTSManager],
     silent: Optional[bool] = False,
-) -> Generator[Tuple[List[Dict[str, str]], List[List[Optional[str]]], str, bytes], None, None]:
+    interview_type: Optional[str] = None,
+    update_rate: float = UI_UPDATE_RATE,
+    cache: bool = False,
+) -> AsyncGenerator[Tuple[List[Dict[str, str]], List[List[Optional[str]]], str, bytes], None]:
     """
     Send a request to the LLM and process the response.
 
+    The LLM stream is consumed natively with asyncio, so a turn does not hold a worker thread while waiting for tokens.
+    Speech is synthesized sentence by sentence in a background pool and streamed in order.
+    Text updates are coalesced to at most update_rate per second, audio chunks and the final state are always sent.
+
     Args:
         code (str): Current code.
         previous_code (str): Previous code.
@@ -36,6 +182,9 @@ def send_request(
         llm (LLMManager): LLM manager instance.
         tts (Optional[TTSManager]): TTS manager instance.
         silent (Optional[bool]): Whether to silence audio output. Defaults to False.
+        interview_type (Optional[str]): The type of interview, decides if code changes are sent as diffs. Defaults to None.
+        update_rate (float): Maximum number of text updates per second, 0 sends every token. Defaults to UI_UPDATE_RATE.
+        cache (bool): Whether the reply may come from the LLM response cache, e.g. in reruns of simulated interviews. Defaults to False.
 
     Yields:
         Tuple[List[Dict[str, str]], List[List[Optional[str]]], str, bytes]: Updated chat history, chat display, code, and audio chunk.
@@ -50,60 +199,64 @@ def send_request(
         yield chat_history, chat_display, code, b""
         return
 
-    chat_history = llm.update_chat_history(code, previous_code, chat_history, chat_display)
-    original_len = len(chat_display)
+    chat_history = llm.update_chat_history(code, previous_code, chat_history, chat_display, interview_type)
     chat_display.append([None, ""])
 
     text_chunks = []
-    reply = llm.get_text(chat_history)
+    reply = llm.aget_text(llm.context_window.build(chat_history), cache=cache)
 
     chat_history.append({"role": "assistant", "content": ""})
 
-    audio_generator = iter(())
+    # Sentences are synthesized in the background as soon as they are complete, while earlier audio is playing
+    segmenter = SentenceSegmenter()
+    tts_pipeline = None if silent else TTSPipeline(tts)
     has_text_item = True
     has_audio_item = not silent
-    audio_created = 0
-    is_notes = False
+    parser = ReplyParser(chat_display)
+    frame_interval = 1 / update_rate if update_rate > 0 else 0.0
+    last_update = float("-inf")
+    changed = False
 
-    while has_text_item or has_audio_item:
-        try:
-            text_chunk = next(reply)
-            text_chunks.append(text_chunk)
-            has_text_item = True
-        except StopIteration:
-            has_text_item = False
-            chat_history[-1]["content"] = "".join(text_chunks)
-
-        if silent:
-            audio_chunk = b""
-        else:
+    try:
+        while has_text_item or has_audio_item:
             try:
-                audio_chunk = next(audio_generator)
-                has_audio_item = True
-            except StopIteration:
+                text_chunk = await reply.__anext__()
+                text_chunks.append(text_chunk)
+                has_text_item = True
+            except StopAsyncIteration:
+                if has_text_item:
+                    chat_history[-1]["content"] = "".join(text_chunks)
+                    changed = parser.finish() or changed
+                has_text_item = False
+
+            if has_text_item:
+                changed = parser.feed(text_chunk) or changed
+
+            if silent:
                 audio_chunk = b""
-                has_audio_item = False
-
-        if has_text_item and not is_notes:
-            last_message = chat_display[-1][1]
-            last_message += text_chunk
-
-            split_notes = last_message.split("#NOTES#")
-            if len(split_notes) > 1:
-                is_notes = True
-            last_message = split_notes[0]
-            split_messages = last_message.split("\n\n")
-            chat_display[-1][1] = split_messages[0]
-            for m in split_messages[1:]:
-                chat_display.append([None, m])
-
-        if not silent:
-            if len(chat_display) - original_len > audio_created + has_text_item:
-                audio_generator = chain(audio_generator, tts.read_text(chat_display[original_len + audio_created][1]))
-                audio_created += 1
-                has_audio_item = True
-
-        yield chat_history, chat_display, code, audio_chunk
+            elif has_text_item:
+                for segment in segmenter.feed(text_chunk):
+                    tts_pipeline.add(segment)
+                audio_chunk = tts_pipeline.get(block=False)
+            else:
+                if not tts_pipeline.closed:
+                    for segment in segmenter.flush():
+                        tts_pipeline.add(segment)
+                    tts_pipeline.close()
+                audio_chunk = await asyncio.to_thread(tts_pipeline.get)
+                has_audio_item = audio_chunk is not None
+                if audio_chunk is None:
+                    audio_chunk = b""
+
+            # The first token is sent right away, the following ones at most once per frame
+            now = time.monotonic()
+            if audio_chunk or not has_text_item or (changed and now - last_update >= frame_interval):
+                yield chat_history, chat_display, code, audio_chunk
+                last_update = now
+                changed = False
+    finally:
+        if tts_pipeline is not None:
+            tts_pipeline.cancel()
 
     if chat_display and len(chat_display) > 1 and chat_display[-1][1] == "" and chat_display[-2][1]:
         chat_display.pop()
@@ -138,28 +291,82 @@ def change_code_area(interview_type: str) -> gr.update:
 
 
 def get_problem_solving_ui(
-    llm: LLMManager, tts: TTSManager, stt: STTManager, default_audio_params: Dict[str, Any], audio_output: gr.Audio
+    llm: LLMManager,
+    tts: TTSManager,
+    stt: STTManager,
+    default_audio_params: Dict[str, Any],
+    audio_output: gr.Audio,
+    problem_pool: Optional[ProblemPool] = None,
+    sessions: Optional[SessionStore] = None,
 ) -> gr.Tab:
     """
     Create the problem-solving UI for the interview application.
 
+    The chat history, the code sent last and the audio state of every session are kept in the session store on the
+    server, keyed by the Gradio session hash, so events don't pass them back and forth.
+
     Args:
         llm (LLMManager): LLM manager instance.
         tts (TTSManager): TTS manager instance.
         stt (STTManager): STT manager instance.
         default_audio_params (Dict[str, Any]): Default audio parameters.
         audio_output (gr.Audio): Gradio audio output component.
+        problem_pool (Optional[ProblemPool]): Pool of pre-generated problems. Defaults to None, generating every problem live.
+        sessions (Optional[SessionStore]): Store of the session states. Defaults to None, creating a new one.
 
     Returns:
         gr.Tab: Gradio tab containing the problem-solving UI.
     """
-    send_request_partial = partial(send_request, llm=llm, tts=tts)
+
+    sessions = sessions or SessionStore()
+
+    def init_bot(problem, interview_type, request: gr.Request):
+        with sessions.session(request.session_hash, persist=True) as state:
+            state["chat_history"] = llm.init_bot(problem, interview_type)
+            state["previous_code"] = ""
+
+    async def send_interview_request(code, chat_display, interview_type, request: gr.Request):
+        async with sessions.asession(request.session_hash, persist=True) as state:
+            chat_history, previous_code = state.get("chat_history", []), state.get("previous_code", "")
+            async for chat_history, chat_display, previous_code, audio in send_request(
+                code, previous_code, chat_history, chat_display, llm, tts, interview_type=interview_type
+            ):
+                state["chat_history"], state["previous_code"] = chat_history, previous_code
+                yield chat_display, audio
+
+    def feedback_stream(state, problem, interview_type):
+        # The feedback is kept in the session from the moment the interview is finished until the feedback pane has read
+        # it, so it goes away with the session if the pane never does. The stream can't be pickled and is never persisted.
+        # Nothing is awaited between the check and the start, so the handlers of a session share one stream whichever of
+        # them comes first, and a stream left from an earlier interview is replaced.
+        chat_history = state.get("chat_history")
+        feedback = state.get("feedback")
+        if feedback is None or feedback.key is not chat_history:
+            if feedback is not None:
+                feedback.cancel()
+            feedback = BackgroundStream(llm.aend_interview(problem, chat_history or [], interview_type), key=chat_history)
+            state["feedback"] = feedback
+        return feedback
+
+    async def start_feedback(problem, interview_type, request: gr.Request):
+        feedback_stream(await sessions.aget(request.session_hash), problem, interview_type)
+
+    async def end_interview(problem, interview_type, request: gr.Request):
+        state = await sessions.aget(request.session_hash)
+        feedback = feedback_stream(state, problem, interview_type)
+        try:
+            async for text in feedback.follow():
+                yield text
+        finally:
+            if state.get("feedback") is feedback:
+                del state["feedback"]
+
+    # Spans around the handlers of the event chains, the handlers are left as they are if tracing is disabled
+    read_last_message = tracer.traced("ui_read_last_message", tts.read_last_message)
 
     with gr.Tab("Interview", render=False, elem_id=f"tab") as problem_tab:
         if os.getenv("IS_DEMO"):
             gr.Markdown(DEMO_MESSAGE)
-        chat_history = gr.State([])
-        previous_code = gr.State("")
         start_time = gr.State(None)
         hi_markdown = gr.Markdown(
             "<h2 style='text-align: center;'> Hi! I'm here to guide you through a practice session for your technical interview. Choose the interview settings to begin.</h2>\n"
@@ -239,8 +446,6 @@ def get_problem_solving_ui(
                     chat = gr.Chatbot(label="Chat", show_label=False, show_share_button=False, elem_id=f"chat")
 
                     audio_input = gr.Audio(interactive=False, **default_audio_params, elem_id=f"audio_input")
-                    audio_buffer = gr.State(np.array([], dtype=np.int16))
-                    audio_to_transcribe = gr.State(np.array([], dtype=np.int16))
 
         with gr.Accordion("Feedback", open=True, visible=False) as feedback_acc:
             interview_time = gr.Markdown()
@@ -261,7 +466,7 @@ def get_problem_solving_ui(
 
         start_btn.click(fn=start_timer, outputs=[start_time]).success(
             fn=add_interviewer_message(fixed_messages["start"]), inputs=[chat], outputs=[chat]
-        ).success(fn=tts.read_last_message, inputs=[chat], outputs=[audio_output]).success(
+        ).success(fn=read_last_message, inputs=[chat], outputs=[audio_output]).success(
             fn=lambda: (
                 gr.update(visible=False),
                 gr.update(interactive=False),
@@ -274,71 +479,129 @@ def get_problem_solving_ui(
             fn=lambda: (gr.update(visible=True)),
             outputs=[problem_acc],
         ).success(
-            fn=llm.get_problem,
+            fn=tracer.traced("ui_generate_problem", problem_pool.aget_problem if problem_pool else llm.aget_problem),
             inputs=[requirements, difficulty_select, topic_select, interview_type_select],
             outputs=[description],
             scroll_to_output=True,
         ).success(
-            fn=llm.init_bot, inputs=[description, interview_type_select], outputs=[chat_history]
+            fn=tracer.traced("ui_init_bot", init_bot), inputs=[description, interview_type_select]
         ).success(
             fn=lambda: (gr.update(visible=True), gr.update(interactive=True), gr.update(interactive=True)),
             outputs=[solution_acc, end_btn, audio_input],
         )
 
-        end_btn.click(fn=lambda x: add_candidate_message("Let's stop here.", x), inputs=[chat], outputs=[chat]).success(
-            fn=add_interviewer_message(fixed_messages["end"]),
+        # The feedback is generated in the background right away, the end message with its audio and the UI updates
+        # run side by side meanwhile, and the feedback pane shows the buffered text once it is visible
+        end_btn.click(fn=get_duration_string, inputs=[start_time], outputs=[interview_time])
+        finish = end_btn.click(
+            fn=tracer.traced("ui_start_feedback", start_feedback), inputs=[description, interview_type_select], outputs=[]
+        )
+        finish.success(
+            fn=lambda x: add_interviewer_message(fixed_messages["end"])(add_candidate_message("Let's stop here.", x)),
             inputs=[chat],
             outputs=[chat],
-        ).success(fn=tts.read_last_message, inputs=[chat], outputs=[audio_output]).success(
+        ).success(fn=read_last_message, inputs=[chat], outputs=[audio_output])
+        finish.success(
             fn=lambda: (
                 gr.update(open=False),
                 gr.update(interactive=False),
                 gr.update(open=False),
                 gr.update(interactive=False),
+                gr.update(visible=True),
             ),
-            outputs=[solution_acc, end_btn, problem_acc, audio_input],
-        ).success(
-            fn=lambda: (gr.update(visible=True)),
-            outputs=[feedback_acc],
-        ).success(
-            fn=llm.end_interview, inputs=[description, chat_history, interview_type_select], outputs=[feedback]
-        ).success(
-            fn=get_duration_string, inputs=[start_time], outputs=[interview_time]
-        )
+            outputs=[solution_acc, end_btn, problem_acc, audio_input, feedback_acc],
+        ).success(fn=tracer.traced("ui_feedback", end_interview), inputs=[description, interview_type_select], outputs=[feedback])
 
-        hidden_text = gr.State("")
-        is_transcribing = gr.State(False)
+        # Transcriptions in flight per session, the request is sent the moment the last one is finished
+        WAIT_TIME = 3
+        # The last chunk can still be queued when the recording stops, its handler is waited for if it begins in time
+        GRACE_TIME = 0.3
+        transcriptions = SessionBarrier()
 
-        audio_input.stream(
-            stt.process_audio_chunk,
-            inputs=[audio_input, audio_buffer],
-            outputs=[audio_buffer, audio_to_transcribe],
-        ).success(fn=lambda: True, outputs=[is_transcribing]).success(
-            fn=stt.transcribe_audio, inputs=[audio_to_transcribe, hidden_text], outputs=[hidden_text]
-        ).success(
-            fn=stt.add_to_chat, inputs=[hidden_text, chat], outputs=[chat]
-        ).success(
-            fn=lambda: False, outputs=[is_transcribing]
-        )
+        def process_audio_chunk(audio, request: gr.Request):
+            transcriptions.begin(request.session_hash)
+            try:
+                with sessions.session(request.session_hash) as state:
+                    state["audio_buffer"], state["audio_to_transcribe"], state["vad"] = stt.process_audio_chunk(
+                        audio, state.get("audio_buffer"), state.get("vad")
+                    )
+            except BaseException:
+                # The chain stops here, end_transcription is never reached
+                transcriptions.end(request.session_hash)
+                raise
 
-        # We need to wait until the last chunk of audio is transcribed before sending the request
-        # I didn't find a native way of gradio to handle this, and used a workaround
-        WAIT_TIME = 3
-        TIME_STEP = 0.3
-        STEPS = int(WAIT_TIME / TIME_STEP)
+        def process_audio_chunk_incremental(audio, request: gr.Request):
+            transcriptions.begin(request.session_hash)
+            try:
+                with sessions.session(request.session_hash) as state:
+                    state["transcriber"], state["hidden_text"], state["vad"] = stt.process_audio_chunk_incremental(
+                        audio, state.get("transcriber"), state.get("vad")
+                    )
+            finally:
+                transcriptions.end(request.session_hash)
 
-        stop_audio_recording = audio_input.stop_recording(fn=lambda: gr.update(visible=False), outputs=[audio_input])
-        for _ in range(STEPS):
-            stop_audio_recording = stop_audio_recording.success(fn=lambda x: time.sleep(TIME_STEP) if x else None, inputs=[is_transcribing])
+        def transcribe_audio(request: gr.Request):
+            # The transcription ends after its text is added to the chat, or here if that is never going to happen
+            finished = False
+            try:
+                with sessions.session(request.session_hash) as state:
+                    audio = state.pop("audio_to_transcribe", None)
+                    if audio is not None:
+                        state["hidden_text"] = stt.transcribe_audio(audio, state.get("hidden_text", ""))
+                finished = True
+            finally:
+                if not finished:
+                    transcriptions.end(request.session_hash)
+
+        def finish_transcription(request: gr.Request):
+            with sessions.session(request.session_hash) as state:
+                state["hidden_text"] = stt.finish_transcription(state.get("transcriber"))
+
+        def add_to_chat(chat, request: gr.Request):
+            return stt.add_to_chat(sessions.get(request.session_hash).get("hidden_text", ""), chat)
+
+        def reset_audio(request: gr.Request):
+            state = sessions.get(request.session_hash)
+            for key in ["audio_buffer", "audio_to_transcribe", "hidden_text", "vad", "transcriber"]:
+                state.pop(key, None)
+
+        def end_transcription(request: gr.Request):
+            transcriptions.end(request.session_hash)
+
+        async def wait_for_transcriptions(request: gr.Request):
+            if not await transcriptions.wait(request.session_hash, WAIT_TIME, GRACE_TIME):
+                # A failed transcription never ends, don't let it block the next turns
+                transcriptions.reset(request.session_hash)
+
+        process_audio_chunk = tracer.traced("ui_process_audio_chunk", process_audio_chunk)
+        process_audio_chunk_incremental = tracer.traced("ui_process_audio_chunk", process_audio_chunk_incremental)
+        wait_for_transcriptions = tracer.traced("ui_wait_for_transcriptions", wait_for_transcriptions)
+
+        if stt.incremental:
+            audio_input.stream(process_audio_chunk_incremental, inputs=[audio_input]).success(fn=add_to_chat, inputs=[chat], outputs=[chat])
+
+            # Only the audio after the last transcribed window is left to transcribe
+            stop_audio_recording = (
+                audio_input.stop_recording(fn=lambda: gr.update(visible=False), outputs=[audio_input])
+                .success(fn=wait_for_transcriptions)
+                .success(fn=tracer.traced("ui_finish_transcription", finish_transcription))
+                .success(fn=add_to_chat, inputs=[chat], outputs=[chat])
+            )
+        else:
+            audio_input.stream(process_audio_chunk, inputs=[audio_input]).success(
+                fn=tracer.traced("ui_transcribe_audio", transcribe_audio)
+            ).success(fn=add_to_chat, inputs=[chat], outputs=[chat]).success(fn=end_transcription)
+
+            stop_audio_recording = audio_input.stop_recording(fn=lambda: gr.update(visible=False), outputs=[audio_input]).success(
+                fn=wait_for_transcriptions
+            )
 
         stop_audio_recording.success(
-            fn=send_request_partial,
-            inputs=[code, previous_code, chat_history, chat],
-            outputs=[chat_history, chat, previous_code, audio_output],
+            fn=tracer.traced("ui_send_request", send_interview_request),
+            inputs=[code, chat, interview_type_select],
+            outputs=[chat, audio_output],
             show_progress="full",
-        ).then(fn=lambda: (np.array([], dtype=np.int16), "", False), outputs=[audio_buffer, hidden_text, is_transcribing]).then(
-            fn=lambda: gr.update(visible=True), outputs=[audio_input]
-        )
+        ).then(fn=reset_audio).then(fn=lambda: gr.update(visible=True), outputs=[audio_input])
 
         interview_type_select.change(
             fn=lambda x: gr.update(choices=topic_lists[x], value=np.random.choice(topic_lists[x])),
@@ -44,22 +44,33 @@ Detailed feedback will be provided in this section after the interview is over,
 """
 
 
-def get_instructions_ui(llm, tts, stt, default_audio_params):
+def get_status_markdown(manager, service):
+    space = "&nbsp;" * 10
+    return f"{service.upper()} status: {get_status_color(manager)}{space}{getattr(manager.config, service).name}"
+
+
+def get_instructions_ui(llm, tts, stt, default_audio_params, probes):
     with gr.Tab("Instruction", render=False) as instruction_tab:
         with gr.Row():
             with gr.Column(scale=2):
                 gr.Markdown(INTRO)
             with gr.Column(scale=1):
-                space = "&nbsp;" * 10
-
-                tts_status = get_status_color(tts)
-                gr.Markdown(f"TTS status: {tts_status}{space}{tts.config.tts.name}", elem_id="tts_status")
-
-                stt_status = get_status_color(stt)
-                gr.Markdown(f"STT status: {stt_status}{space}{stt.config.stt.name}", elem_id="stt_status")
-
-                llm_status = get_status_color(llm)
-                gr.Markdown(f"LLM status: {llm_status}{space}{llm.config.llm.name}", elem_id="llm_status")
+                tts_status = gr.Markdown(get_status_markdown(tts, "tts"), elem_id="tts_status")
+                stt_status = gr.Markdown(get_status_markdown(stt, "stt"), elem_id="stt_status")
+                llm_status = gr.Markdown(get_status_markdown(llm, "llm"), elem_id="llm_status")
+
+                # Health checks run in the background, refresh the status lights until they are finished
+                status_timer = gr.Timer(1, active=not probes.done.is_set())
+                status_timer.tick(
+                    fn=lambda: (
+                        get_status_markdown(tts, "tts"),
+                        get_status_markdown(stt, "stt"),
+                        get_status_markdown(llm, "llm"),
+                        gr.Timer(active=not probes.done.is_set()),
+                    ),
+                    outputs=[tts_status, stt_status, llm_status, status_timer],
+                    show_progress="hidden",
+                )
 
         with gr.Row():
             with gr.Column(scale=2):
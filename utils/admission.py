@@ -0,0 +1,351 @@
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncGenerator, AsyncIterable, Callable, Dict, Generator, Iterable, List, Optional, Tuple, TypeVar
+
+from utils.config import AdmissionConfig
+from utils.errors import AdmissionTimeout
+from utils.metrics import metrics
+
+T = TypeVar("T")
+
+# Seconds a call may wait for admission before it fails
+ADMISSION_TIMEOUT: float = float(os.getenv("ADMISSION_TIMEOUT", 60))
+
+# Lower values are admitted first, calls of the same priority in arrival order
+PRIORITY_TURN = 0  # live interview turns, the candidate is waiting for the reply
+PRIORITY_TASK = 1  # problem generation and feedback
+PRIORITY_BACKGROUND = 2  # problem pool refills
+
+
+class _Waiter:
+    """Queued call, woken up in a thread or on an event loop once it is admitted."""
+
+    def __init__(self, tokens: float, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.tokens = tokens
+        self.loop = loop
+        self.event = threading.Event() if loop is None else None
+        self.future = loop.create_future() if loop is not None else None
+        self.granted = False
+        self.cancelled = False
+
+    def grant(self) -> None:
+        self.granted = True
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self) -> None:
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class AdmissionController:
+    """
+    Limits the calls to one backend to a number in flight and a token budget per minute.
+    Calls over the limits wait in a priority queue, so live interview turns go ahead of problem generation and feedback.
+    The budget is a token bucket that holds a minute worth of tokens, calls are charged their estimated input upfront
+    and their output as it streams, so the bucket can go below zero and hold the next calls back until it refills.
+    """
+
+    def __init__(self, name: str, concurrency: int = 0, tokens_per_minute: float = 0, timeout: float = ADMISSION_TIMEOUT):
+        """
+        Initialize the AdmissionController.
+
+        Args:
+            name (str): Backend name, the prefix of the metrics.
+            concurrency (int): Calls in flight at the same time, 0 for no limit. Defaults to 0.
+            tokens_per_minute (float): Token budget per minute, 0 for no limit. Defaults to 0.
+            timeout (float): Seconds a call may wait for admission. Defaults to ADMISSION_TIMEOUT.
+        """
+        self.name = name
+        self.concurrency = concurrency
+        self.tokens_per_minute = tokens_per_minute
+        self.timeout = timeout
+        self.budget = tokens_per_minute
+        self.refilled = time.monotonic()
+        self.in_flight = 0
+        self.queue: List[Tuple[int, int, _Waiter]] = []
+        self.waiting = 0
+        self.order = itertools.count()
+        self.timer: Optional[threading.Timer] = None
+        self.lock = threading.Lock()
+
+        self.queue_depth = metrics.gauge(f"{name}_admission_queue_depth", f"Calls to {name} waiting for admission")
+        self.in_flight_gauge = metrics.gauge(f"{name}_admission_in_flight", f"Calls to {name} in flight")
+        self.wait_time = metrics.histogram(f"{name}_admission_wait_seconds", f"Time calls to {name} waited for admission")
+        self.timeouts = metrics.counter(f"{name}_admission_timeouts", f"Calls to {name} that timed out waiting for admission")
+
+    def _refill(self) -> None:
+        if not self.tokens_per_minute:
+            return
+        now = time.monotonic()
+        self.budget = min(self.tokens_per_minute, self.budget + (now - self.refilled) * self.tokens_per_minute / 60)
+        self.refilled = now
+
+    def _can_admit(self, tokens: float) -> bool:
+        if self.concurrency and self.in_flight >= self.concurrency:
+            return False
+        # A call larger than the whole budget is let through when the bucket is full, otherwise it would never run
+        return not self.tokens_per_minute or self.budget >= min(tokens, self.tokens_per_minute)
+
+    def _admit(self, tokens: float) -> None:
+        self.in_flight += 1
+        self.budget -= tokens
+        self.in_flight_gauge.set(self.in_flight)
+
+    def _dispatch(self) -> None:
+        """
+        Admit the queued calls in priority order while the limits allow, called with the lock held.
+        """
+        self._refill()
+        while self.queue:
+            waiter = self.queue[0][2]
+            if waiter.cancelled:
+                heapq.heappop(self.queue)
+                continue
+            if not self._can_admit(waiter.tokens):
+                break
+            heapq.heappop(self.queue)
+            self.waiting -= 1
+            self._admit(waiter.tokens)
+            waiter.grant()
+        self.queue_depth.set(self.waiting)
+
+        # Nothing finishes to wake up a call that only waits for the budget, a timer does it when the bucket has refilled
+        if self.queue and self.tokens_per_minute and (self.timer is None or not self.timer.is_alive()):
+            waiter = self.queue[0][2]
+            delay = (min(waiter.tokens, self.tokens_per_minute) - self.budget) * 60 / self.tokens_per_minute
+            if delay > 0:
+                self.timer = threading.Timer(delay, self._on_timer)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def _on_timer(self) -> None:
+        with self.lock:
+            self.timer = None
+            self._dispatch()
+
+    def _enqueue(self, priority: int, tokens: float, loop: Optional[asyncio.AbstractEventLoop] = None) -> Optional[_Waiter]:
+        """
+        Admit a call right away if nothing is queued and the limits allow, otherwise queue it.
+
+        Returns:
+            Optional[_Waiter]: The queued call, None if it was admitted.
+        """
+        with self.lock:
+            self._refill()
+            if not self.waiting and self._can_admit(tokens):
+                self._admit(tokens)
+                return None
+            waiter = _Waiter(tokens, loop)
+            heapq.heappush(self.queue, (priority, next(self.order), waiter))
+            self.waiting += 1
+            self._dispatch()
+            return waiter
+
+    def _give_up(self, waiter: _Waiter) -> bool:
+        """
+        Remove a call from the queue after a timeout or cancellation.
+
+        Returns:
+            bool: True if the call was removed, False if it was admitted in the meantime.
+        """
+        with self.lock:
+            if waiter.granted:
+                return False
+            waiter.cancelled = True
+            self.waiting -= 1
+            self._dispatch()
+            return True
+
+    def _timed_out(self, started: float) -> AdmissionTimeout:
+        self.timeouts.inc()
+        return AdmissionTimeout(f"{self.name} admission timeout: waited {time.perf_counter() - started:.1f} s", status_code=429)
+
+    def acquire(self, priority: int = PRIORITY_TURN, tokens: float = 0) -> None:
+        """
+        Wait until a call may start.
+
+        Args:
+            priority (int): Priority of the call, lower values go first. Defaults to PRIORITY_TURN.
+            tokens (float): Estimated tokens charged upfront. Defaults to 0.
+
+        Raises:
+            AdmissionTimeout: If the call waited longer than the timeout.
+        """
+        started = time.perf_counter()
+        waiter = self._enqueue(priority, tokens)
+        if waiter is not None and not waiter.event.wait(self.timeout) and self._give_up(waiter):
+            raise self._timed_out(started)
+        self.wait_time.observe(time.perf_counter() - started)
+
+    async def aacquire(self, priority: int = PRIORITY_TURN, tokens: float = 0) -> None:
+        """
+        Asynchronously wait until a call may start, without holding a thread.
+
+        Args:
+            priority (int): Priority of the call, lower values go first. Defaults to PRIORITY_TURN.
+            tokens (float): Estimated tokens charged upfront. Defaults to 0.
+
+        Raises:
+            AdmissionTimeout: If the call waited longer than the timeout.
+        """
+        started = time.perf_counter()
+        waiter = self._enqueue(priority, tokens, asyncio.get_running_loop())
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter.future), self.timeout)
+            except asyncio.TimeoutError:
+                if self._give_up(waiter):
+                    raise self._timed_out(started)
+            except asyncio.CancelledError:
+                if not self._give_up(waiter):
+                    self.release()
+                raise
+        self.wait_time.observe(time.perf_counter() - started)
+
+    def try_acquire(self, tokens: float = 0) -> bool:
+        """
+        Start a call only if it may start right away and nothing is queued, for optional calls like hedged requests.
+        A started call is released like any other.
+
+        Args:
+            tokens (float): Estimated tokens charged upfront. Defaults to 0.
+
+        Returns:
+            bool: True if the call was admitted.
+        """
+        with self.lock:
+            self._refill()
+            if self.waiting or not self._can_admit(tokens):
+                return False
+            self._admit(tokens)
+            return True
+
+    def release(self) -> None:
+        """
+        Report that an admitted call has finished.
+        """
+        with self.lock:
+            self.in_flight -= 1
+            self.in_flight_gauge.set(self.in_flight)
+            self._dispatch()
+
+    def charge(self, tokens: float) -> None:
+        """
+        Take tokens used by a running call from the budget.
+
+        Args:
+            tokens (float): Used tokens.
+        """
+        if not self.tokens_per_minute:
+            return
+        with self.lock:
+            self._refill()
+            self.budget -= tokens
+
+    @contextmanager
+    def slot(self, priority: int = PRIORITY_TURN, tokens: float = 0) -> Generator[None, None, None]:
+        """
+        Run the wrapped block as an admitted call.
+
+        Args:
+            priority (int): Priority of the call, lower values go first. Defaults to PRIORITY_TURN.
+            tokens (float): Estimated tokens charged upfront. Defaults to 0.
+        """
+        self.acquire(priority, tokens)
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def aslot(self, priority: int = PRIORITY_TURN, tokens: float = 0) -> AsyncGenerator[None, None]:
+        """
+        Asynchronously run the wrapped block as an admitted call.
+
+        Args:
+            priority (int): Priority of the call, lower values go first. Defaults to PRIORITY_TURN.
+            tokens (float): Estimated tokens charged upfront. Defaults to 0.
+        """
+        await self.aacquire(priority, tokens)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stream(
+        self, chunks: Iterable[T], priority: int = PRIORITY_TURN, tokens: float = 0, cost: Optional[Callable[[T], float]] = None
+    ) -> Generator[T, None, None]:
+        """
+        Run a streamed call as an admitted call, it is admitted when the first chunk is requested.
+
+        Args:
+            chunks (Iterable[T]): Chunks of the call, usually a generator that makes the call.
+            priority (int): Priority of the call, lower values go first. Defaults to PRIORITY_TURN.
+            tokens (float): Estimated tokens charged upfront. Defaults to 0.
+            cost (Optional[Callable[[T], float]]): Tokens charged for every chunk. Defaults to None.
+
+        Yields:
+            T: Chunks.
+        """
+        with self.slot(priority, tokens):
+            for chunk in chunks:
+                if cost is not None:
+                    self.charge(cost(chunk))
+                yield chunk
+
+    async def astream(
+        self, chunks: AsyncIterable[T], priority: int = PRIORITY_TURN, tokens: float = 0, cost: Optional[Callable[[T], float]] = None
+    ) -> AsyncGenerator[T, None]:
+        """
+        Asynchronously run a streamed call as an admitted call, it is admitted when the first chunk is requested.
+
+        Args:
+            chunks (AsyncIterable[T]): Chunks of the call, usually an async generator that makes the call.
+            priority (int): Priority of the call, lower values go first. Defaults to PRIORITY_TURN.
+            tokens (float): Estimated tokens charged upfront. Defaults to 0.
+            cost (Optional[Callable[[T], float]]): Tokens charged for every chunk. Defaults to None.
+
+        Yields:
+            T: Chunks.
+        """
+        async with self.aslot(priority, tokens):
+            async for chunk in chunks:
+                if cost is not None:
+                    self.charge(cost(chunk))
+                yield chunk
+
+
+class AdmissionRegistry:
+    """Process-wide admission controllers, one per backend, so every manager of a backend shares its limits."""
+
+    def __init__(self):
+        self.controllers: Dict[str, AdmissionController] = {}
+        self.lock = threading.Lock()
+
+    def controller(self, name: str) -> AdmissionController:
+        """
+        Get the admission controller of a backend, creating it on first use with the limits from the environment
+        (see utils.config.AdmissionConfig).
+
+        Args:
+            name (str): Backend name: llm, stt or tts.
+
+        Returns:
+            AdmissionController: The controller.
+        """
+        with self.lock:
+            if name not in self.controllers:
+                config = AdmissionConfig(name.upper())
+                self.controllers[name] = AdmissionController(name, config.concurrency, config.tokens_per_minute)
+            return self.controllers[name]
+
+
+admission = AdmissionRegistry()
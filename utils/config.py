@@ -1,21 +1,75 @@
 from dotenv import load_dotenv
 import os
-from typing import Optional
+from typing import List, Optional
+
+
+class MockConfig:
+    def __init__(self, prefix: str):
+        """
+        Initialize the settings of a mock service from environment variables, e.g. LLM_MOCK_TTFT for the LLM.
+
+        :param prefix: Prefix of the service environment variables, e.g. LLM.
+        """
+        # Seconds before the first chunk, chunks (LLM tokens, TTS audio chunks) per second after it, 0 for no delay
+        self.ttft: float = float(os.getenv(f"{prefix}_MOCK_TTFT", 0.3))
+        self.rate: float = float(os.getenv(f"{prefix}_MOCK_RATE", 50))
+        # Relative random deviation of every delay, e.g. 0.2 for +-20%
+        self.jitter: float = float(os.getenv(f"{prefix}_MOCK_JITTER", 0.1))
+        # Share of requests that fail at a random point
+        self.error_rate: float = float(os.getenv(f"{prefix}_MOCK_ERROR_RATE", 0))
+        # Canned responses: a text or a path to a file, responses are separated by lines with "---" and used in turn
+        self.content: Optional[str] = os.getenv(f"{prefix}_MOCK_CONTENT")
+        seed = os.getenv(f"{prefix}_MOCK_SEED")
+        self.seed: Optional[int] = int(seed) if seed else None
+
+
+class AdmissionConfig:
+    def __init__(self, prefix: str):
+        """
+        Initialize the admission limits of a backend from environment variables, e.g. LLM_CONCURRENCY for the LLM.
+
+        :param prefix: Prefix of the backend environment variables, e.g. LLM.
+        """
+        # Calls in flight at the same time, 0 for no limit
+        self.concurrency: int = int(os.getenv(f"{prefix}_CONCURRENCY", 0))
+        # Token budget per minute, 0 for no limit: input and output tokens for the LLM, input text tokens for TTS
+        self.tokens_per_minute: float = float(os.getenv(f"{prefix}_TOKENS_PER_MINUTE", 0))
 
 
 class ServiceConfig:
-    def __init__(self, url_var: str, type_var: str, name_var: str):
+    def __init__(self, url_var: str, type_var: str, name_var: str, key_var: Optional[str] = None):
         """
         Initialize the ServiceConfig with environment variables.
 
         :param url_var: Environment variable for the service URL.
         :param type_var: Environment variable for the service type.
         :param name_var: Environment variable for the service name.
+        :param key_var: Environment variable for the API key, the {type}_KEY variable is used if it is not set.
         """
         self.url: Optional[str] = os.getenv(url_var)
         self.type: Optional[str] = os.getenv(type_var)
         self.name: Optional[str] = os.getenv(name_var)
-        self.key: Optional[str] = os.getenv(f"{self.type}_KEY")
+        self.key: Optional[str] = (os.getenv(key_var) if key_var else None) or os.getenv(f"{self.type}_KEY")
+        # Offline stand-in of the service, configured with the same prefix, e.g. LLM_TYPE=MOCK and LLM_MOCK_TTFT,
+        # or LLM_TYPE_2=MOCK and LLM_2_MOCK_TTFT
+        self.mock: Optional[MockConfig] = MockConfig(type_var.replace("_TYPE", "")) if self.type == "MOCK" else None
+
+
+def fallback_configs(prefix: str) -> List[ServiceConfig]:
+    """
+    Read the numbered fallback endpoints of a service, e.g. LLM_URL_2, LLM_TYPE_2, LLM_NAME_2 and optionally LLM_KEY_2,
+    then LLM_URL_3 and so on until a number has no type.
+
+    :param prefix: Prefix of the service environment variables, e.g. LLM.
+    :return: Service configurations of the fallback endpoints.
+    """
+    configs = []
+    number = 2
+    while os.getenv(f"{prefix}_TYPE_{number}"):
+        variables = [f"{prefix}_{name}_{number}" for name in ("URL", "TYPE", "NAME", "KEY")]
+        configs.append(ServiceConfig(*variables))
+        number += 1
+    return configs
 
 
 class Config:
@@ -25,5 +79,7 @@ class Config:
         """
         load_dotenv(override=True)
         self.llm: ServiceConfig = ServiceConfig("LLM_URL", "LLM_TYPE", "LLM_NAME")
+        # Every LLM endpoint in the order they are tried, the main one first
+        self.llm_endpoints: List[ServiceConfig] = [self.llm] + fallback_configs("LLM")
         self.stt: ServiceConfig = ServiceConfig("STT_URL", "STT_TYPE", "STT_NAME")
         self.tts: ServiceConfig = ServiceConfig("TTS_URL", "TTS_TYPE", "TTS_NAME")
@@ -4,6 +4,12 @@ class AudioConversionError(Exception):
     pass
 
 
+class AudioBufferOverflowError(Exception):
+    """Exception raised when an audio buffer is full and its overflow policy is to raise."""
+
+    pass
+
+
 class APIError(Exception):
     """Custom exception for API error handling."""
 
@@ -13,3 +19,15 @@ class APIError(Exception):
         else:
             super().__init__(message)
         self.status_code = status_code
+
+
+class AdmissionTimeout(APIError):
+    """Exception raised when a call waits for admission to a backend longer than allowed."""
+
+    pass
+
+
+class SessionLimitError(Exception):
+    """Exception raised when a new session would exceed the limit of sessions kept in memory and there is no store to spill to."""
+
+    pass
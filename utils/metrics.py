@@ -0,0 +1,336 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Generator, List, Tuple, Union
+
+# Port of the Prometheus /metrics endpoint, 0 disables it
+METRICS_PORT: int = int(os.getenv("METRICS_PORT", 0))
+# The endpoint is only reachable locally unless another host is set, e.g. 0.0.0.0 for a scraper in another container
+METRICS_HOST: str = os.getenv("METRICS_HOST", "127.0.0.1")
+
+DEFAULT_LATENCY_BUCKETS: Tuple[float, ...] = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Thread-safe histogram with fixed bucket upper bounds."""
+
+    def __init__(self, name: str, description: str = "", buckets: Tuple[float, ...] = DEFAULT_LATENCY_BUCKETS):
+        """
+        Initialize the Histogram.
+
+        Args:
+            name (str): Metric name.
+            description (str): Human readable description of the metric.
+            buckets (Tuple[float, ...]): Sorted upper bounds of the buckets, values above the last one go to +Inf.
+        """
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        """
+        Record a value.
+
+        Args:
+            value (float): Observed value.
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self) -> Generator[None, None, None]:
+        """
+        Record the wall time of the wrapped block in seconds.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimate a quantile as the upper bound of the bucket that contains it.
+
+        Args:
+            q (float): Quantile between 0 and 1.
+
+        Returns:
+            float: Estimated quantile, 0 if nothing was observed and +Inf if it falls above the last bucket.
+        """
+        with self.lock:
+            counts, total = list(self.counts), self.count
+        if total == 0:
+            return 0.0
+        rank = q * total
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return float("inf")
+
+    def snapshot(self) -> Dict:
+        """
+        Get the current state of the histogram.
+
+        Returns:
+            Dict: Count, sum and cumulative counts per bucket upper bound.
+        """
+        with self.lock:
+            counts, total, value_sum = list(self.counts), self.count, self.sum
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            buckets[bound] = cumulative
+        return {"count": total, "sum": value_sum, "buckets": buckets}
+
+    def prometheus(self) -> List[str]:
+        """
+        Render the histogram in the Prometheus text format.
+
+        Returns:
+            List[str]: Sample lines.
+        """
+        snapshot = self.snapshot()
+        lines = [f'{self.name}_bucket{{le="{_format_bound(bound)}"}} {count}' for bound, count in snapshot["buckets"].items()]
+        return lines + [f"{self.name}_sum {snapshot['sum']}", f"{self.name}_count {snapshot['count']}"]
+
+
+class Counter:
+    """Thread-safe monotonically increasing counter."""
+
+    def __init__(self, name: str, description: str = ""):
+        """
+        Initialize the Counter.
+
+        Args:
+            name (str): Metric name.
+            description (str): Human readable description of the metric.
+        """
+        self.name = name
+        self.description = description
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        """
+        Increase the counter.
+
+        Args:
+            amount (float): Non-negative amount to add. Defaults to 1.
+        """
+        with self.lock:
+            self.value += amount
+
+    def snapshot(self) -> Dict:
+        """
+        Get the current state of the counter.
+
+        Returns:
+            Dict: The current value.
+        """
+        with self.lock:
+            return {"value": self.value}
+
+    def prometheus(self) -> List[str]:
+        """
+        Render the counter in the Prometheus text format.
+
+        Returns:
+            List[str]: Sample lines.
+        """
+        return [f"{self.name} {self.snapshot()['value']}"]
+
+
+class Gauge:
+    """Thread-safe value that can go up and down, e.g. a queue depth."""
+
+    def __init__(self, name: str, description: str = ""):
+        """
+        Initialize the Gauge.
+
+        Args:
+            name (str): Metric name.
+            description (str): Human readable description of the metric.
+        """
+        self.name = name
+        self.description = description
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def set(self, value: float) -> None:
+        """
+        Set the gauge.
+
+        Args:
+            value (float): New value.
+        """
+        with self.lock:
+            self.value = value
+
+    def inc(self, amount: float = 1.0) -> None:
+        """
+        Increase the gauge, a negative amount decreases it.
+
+        Args:
+            amount (float): Amount to add. Defaults to 1.
+        """
+        with self.lock:
+            self.value += amount
+
+    def snapshot(self) -> Dict:
+        """
+        Get the current state of the gauge.
+
+        Returns:
+            Dict: The current value.
+        """
+        with self.lock:
+            return {"value": self.value}
+
+    def prometheus(self) -> List[str]:
+        """
+        Render the gauge in the Prometheus text format.
+
+        Returns:
+            List[str]: Sample lines.
+        """
+        return [f"{self.name} {self.snapshot()['value']}"]
+
+
+class MetricsRegistry:
+    """Process-wide collection of named metrics."""
+
+    def __init__(self):
+        self.metrics: Dict[str, Union[Histogram, Counter, Gauge]] = {}
+        self.lock = threading.Lock()
+
+    def histogram(self, name: str, description: str = "", buckets: Tuple[float, ...] = DEFAULT_LATENCY_BUCKETS) -> Histogram:
+        """
+        Get a histogram by name, creating it on first use.
+
+        Args:
+            name (str): Metric name.
+            description (str): Human readable description of the metric.
+            buckets (Tuple[float, ...]): Bucket upper bounds, only used when the histogram is created.
+
+        Returns:
+            Histogram: The histogram.
+        """
+        with self.lock:
+            if name not in self.metrics:
+                self.metrics[name] = Histogram(name, description, buckets)
+            return self.metrics[name]
+
+    def counter(self, name: str, description: str = "") -> Counter:
+        """
+        Get a counter by name, creating it on first use.
+
+        Args:
+            name (str): Metric name.
+            description (str): Human readable description of the metric.
+
+        Returns:
+            Counter: The counter.
+        """
+        with self.lock:
+            if name not in self.metrics:
+                self.metrics[name] = Counter(name, description)
+            return self.metrics[name]
+
+    def gauge(self, name: str, description: str = "") -> Gauge:
+        """
+        Get a gauge by name, creating it on first use.
+
+        Args:
+            name (str): Metric name.
+            description (str): Human readable description of the metric.
+
+        Returns:
+            Gauge: The gauge.
+        """
+        with self.lock:
+            if name not in self.metrics:
+                self.metrics[name] = Gauge(name, description)
+            return self.metrics[name]
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """
+        Get the current state of all metrics.
+
+        Returns:
+            Dict[str, Dict]: Snapshots keyed by metric name.
+        """
+        with self.lock:
+            metrics = dict(self.metrics)
+        return {name: metric.snapshot() for name, metric in metrics.items()}
+
+    def prometheus(self) -> str:
+        """
+        Render all metrics in the Prometheus text exposition format.
+
+        Returns:
+            str: Metrics page.
+        """
+        with self.lock:
+            metrics = sorted(self.metrics.items())
+        lines = []
+        for name, metric in metrics:
+            kind = "histogram" if isinstance(metric, Histogram) else "gauge" if isinstance(metric, Gauge) else "counter"
+            if metric.description:
+                lines.append(f"# HELP {name} {metric.description}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines += metric.prometheus()
+        return "\n".join(lines) + "\n"
+
+
+def _format_bound(bound: float) -> str:
+    return "+Inf" if bound == float("inf") else repr(float(bound))
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+def start_metrics_server(port: int = METRICS_PORT, host: str = METRICS_HOST) -> ThreadingHTTPServer:
+    """
+    Serve the Prometheus /metrics endpoint in a background thread.
+
+    Args:
+        port (int): Port to listen on, 0 picks a free one. Defaults to METRICS_PORT.
+        host (str): Host to listen on. Defaults to METRICS_HOST.
+
+    Returns:
+        ThreadingHTTPServer: The running server.
+    """
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+metrics = MetricsRegistry()
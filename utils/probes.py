@@ -0,0 +1,221 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+PROBE_CACHE_PATH: str = os.getenv("PROBE_CACHE_PATH", os.path.join(".cache", "probes.json"))
+PROBE_CACHE_TTL: float = float(os.getenv("PROBE_CACHE_TTL", 3600))
+PROBE_TIMEOUT: float = float(os.getenv("PROBE_TIMEOUT", 15))
+
+
+class ProbeCache:
+    """On-disk cache of service probe results with a time to live."""
+
+    def __init__(self, path: str = PROBE_CACHE_PATH, ttl: float = PROBE_CACHE_TTL):
+        """
+        Initialize the ProbeCache.
+
+        Args:
+            path (str): Path to the JSON file with cached results.
+            ttl (float): Number of seconds a cached result stays valid. Non-positive values disable the cache.
+        """
+        self.path = path
+        self.ttl = ttl
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(service_config: Any, probe: str) -> str:
+        """
+        Build a cache key for a probe of a service.
+
+        Args:
+            service_config (Any): Service configuration with type, url and name.
+            probe (str): Name of the probe.
+
+        Returns:
+            str: Cache key.
+        """
+        return f"{service_config.type}|{service_config.url}|{service_config.name}|{probe}"
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path) as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def get(self, key: str) -> Optional[bool]:
+        """
+        Get a fresh cached probe result.
+
+        Args:
+            key (str): Cache key.
+
+        Returns:
+            Optional[bool]: Cached result or None if it is missing or expired.
+        """
+        if self.ttl <= 0:
+            return None
+        with self.lock:
+            entry = self._load().get(key)
+        if entry is None or time.time() - entry["checked_at"] > self.ttl:
+            return None
+        return entry["ok"]
+
+    def set(self, key: str, ok: bool) -> None:
+        """
+        Store a probe result.
+
+        Args:
+            key (str): Cache key.
+            ok (bool): Probe result.
+        """
+        if self.ttl <= 0:
+            return
+        with self.lock:
+            entries = self._load()
+            entries[key] = {"ok": ok, "checked_at": time.time()}
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, "w") as file:
+                    json.dump(entries, file, indent=4)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logging.warning(f"Failed to save probe cache: {e}")
+
+
+class ServiceProbes:
+    """Runs LLM, TTS and STT health checks concurrently and applies the results to the managers."""
+
+    def __init__(self, llm: Any, tts: Any, stt: Any, cache: Optional[ProbeCache] = None, timeout: float = PROBE_TIMEOUT):
+        """
+        Initialize the ServiceProbes.
+
+        Args:
+            llm (Any): LLM manager instance.
+            tts (Any): TTS manager instance.
+            stt (Any): STT manager instance.
+            cache (Optional[ProbeCache]): Cache of probe results. Defaults to a ProbeCache with default settings.
+            timeout (float): Maximum number of seconds each probe may take before it is considered failed.
+        """
+        self.managers = {"llm": llm, "tts": tts, "stt": stt}
+        self.cache = cache or ProbeCache()
+        self.timeout = timeout
+        self.done = threading.Event()
+        self.probes: Dict[Tuple[str, str], Callable[[], bool]] = {
+            ("llm", "status"): lambda: llm.test_llm(stream=False),
+            ("llm", "streaming"): lambda: llm.test_llm(stream=True),
+            ("tts", "status"): lambda: tts.test_tts(stream=False),
+            ("tts", "streaming"): lambda: tts.test_tts(stream=True),
+            ("stt", "status"): stt.test_stt,
+        }
+        self.results: Dict[Tuple[str, str], Optional[bool]] = {probe: None for probe in self.probes}
+
+    def _cache_key(self, service: str, probe: str) -> str:
+        return self.cache.key(getattr(self.managers[service].config, service), probe)
+
+    def _apply(self) -> None:
+        """
+        Set status and streaming flags of the managers from the probe results.
+        Unknown results are left as None, streaming is only enabled for healthy services.
+        """
+        for service, manager in self.managers.items():
+            status = self.results[(service, "status")]
+            streaming = self.results.get((service, "streaming"), status)
+            manager.status = status
+            manager.streaming = streaming if status else status
+
+    def apply_cached(self) -> bool:
+        """
+        Apply fresh cached results to the managers.
+
+        Returns:
+            bool: True if every probe had a fresh cached result.
+        """
+        for service, probe in self.probes:
+            self.results[(service, probe)] = self.cache.get(self._cache_key(service, probe))
+        self._apply()
+        if self.pending():
+            return False
+        self.done.set()
+        return True
+
+    def run(self) -> None:
+        """
+        Run all probes without a result concurrently, each bounded by the probe timeout, and cache the results.
+        """
+        outcomes: Dict[Tuple[str, str], bool] = {}
+
+        def run_probe(probe: Tuple[str, str], fn: Callable[[], bool]) -> None:
+            try:
+                outcomes[probe] = bool(fn())
+            except Exception as e:
+                logging.error(f"{probe[0].upper()} {probe[1]} probe failed: {e!r}")
+                outcomes[probe] = False
+
+        # Daemon threads, so a probe stuck on the network can neither delay the results nor the interpreter exit
+        threads = {
+            probe: threading.Thread(target=run_probe, args=(probe, fn), name=f"probe-{probe[0]}-{probe[1]}", daemon=True)
+            for probe, fn in self.probes.items()
+            if self.results[probe] is None
+        }
+        started = time.monotonic()
+        for thread in threads.values():
+            thread.start()
+        for (service, probe), thread in threads.items():
+            thread.join(timeout=max(0.0, started + self.timeout - time.monotonic()))
+            ok = outcomes.get((service, probe))
+            if ok is None:
+                logging.error(f"{service.upper()} {probe} probe timed out after {self.timeout} seconds")
+                ok = False
+            self.results[(service, probe)] = ok
+            self.cache.set(self._cache_key(service, probe), ok)
+        self._apply()
+        self.done.set()
+
+    def start(self) -> threading.Thread:
+        """
+        Run the probes in a background thread.
+
+        Returns:
+            threading.Thread: The started thread.
+        """
+        thread = threading.Thread(target=self.run, name="service-probes", daemon=True)
+        thread.start()
+        return thread
+
+    def follow(self, interval: float = 1) -> threading.Thread:
+        """
+        Wait in a background thread for the results of the probes another process runs, e.g. the first app worker,
+        reading them from the cache. The probes run here if the results don't come within the probe timeout.
+
+        Args:
+            interval (float): Seconds between the reads of the cache. Defaults to 1.
+
+        Returns:
+            threading.Thread: The started thread.
+        """
+
+        def wait_for_cache() -> None:
+            deadline = time.monotonic() + self.timeout + interval
+            while time.monotonic() < deadline:
+                if self.apply_cached():
+                    return
+                time.sleep(interval)
+            self.run()
+
+        thread = threading.Thread(target=wait_for_cache, name="service-probes", daemon=True)
+        thread.start()
+        return thread
+
+    def pending(self) -> List[str]:
+        """
+        Get the services that still have probes without results.
+
+        Returns:
+            List[str]: Names of the services.
+        """
+        return sorted({service for (service, _), result in self.results.items() if result is None})
@@ -0,0 +1,80 @@
+import builtins
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class ImportProfiler:
+    """
+    Measures how much of the startup time is spent importing each top-level package.
+    Time is counted as self time: a package importing another one is not charged for the nested import.
+    Only imports of the thread that started the profiler are measured.
+    """
+
+    def __init__(self):
+        self.self_times: Dict[str, float] = defaultdict(float)
+        self.stages: List[Tuple[str, float]] = []
+        self.stack: List[float] = []
+        self.original_import: Optional[Any] = None
+        self.thread_id: Optional[int] = None
+        self.started = 0.0
+
+    def start(self) -> None:
+        """
+        Start measuring by wrapping the builtin import function.
+        """
+        self.original_import = builtins.__import__
+        self.thread_id = threading.get_ident()
+        self.started = time.perf_counter()
+        builtins.__import__ = self._import
+
+    def stop(self) -> None:
+        """
+        Stop measuring and restore the builtin import function.
+        """
+        if self.original_import is not None:
+            builtins.__import__ = self.original_import
+            self.original_import = None
+
+    def stage(self, name: str) -> None:
+        """
+        Record the time elapsed since the start when a startup stage is finished.
+
+        Args:
+            name (str): Stage name.
+        """
+        self.stages.append((name, time.perf_counter() - self.started))
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level > 0 or name in sys.modules or threading.get_ident() != self.thread_id:
+            return self.original_import(name, globals, locals, fromlist, level)
+        started = time.perf_counter()
+        self.stack.append(0.0)
+        try:
+            return self.original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - started
+            children = self.stack.pop()
+            self.self_times[name.partition(".")[0]] += elapsed - children
+            if self.stack:
+                self.stack[-1] += elapsed
+
+    def report(self, top: int = 25) -> str:
+        """
+        Format the measurements.
+
+        Args:
+            top (int): Number of packages to list. Defaults to 25.
+
+        Returns:
+            str: Startup stages and the slowest packages to import.
+        """
+        lines = ["Startup stages (seconds since start):"]
+        lines += [f"  {seconds:8.3f}  {name}" for name, seconds in self.stages]
+        total = sum(self.self_times.values())
+        lines.append(f"Import time by top-level package (self time, {total:.3f} seconds total):")
+        ranked = sorted(self.self_times.items(), key=lambda item: item[1], reverse=True)
+        lines += [f"  {seconds:8.3f}  {package}" for package, seconds in ranked[:top]]
+        return "\n".join(lines)
@@ -0,0 +1,122 @@
+import asyncio
+import random
+import threading
+import time
+from typing import Optional
+
+from utils.metrics import metrics
+
+# Errors of the SDKs and their HTTP client that mean the request may succeed later, matched by class name so the SDKs
+# are only imported when their API is configured
+TRANSIENT_ERROR_NAMES = {"APIConnectionError", "APITimeoutError", "TimeoutException", "NetworkError", "RemoteProtocolError"}
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Tracks the failures of one endpoint. After a number of failures in a row the circuit opens and the endpoint is
+    skipped for a cooldown, then a single trial call is let through: its success closes the circuit, a failure opens it again.
+    """
+
+    def __init__(self, name: str, failures: int = 3, cooldown: float = 30):
+        """
+        Initialize the CircuitBreaker.
+
+        Args:
+            name (str): Endpoint name, the prefix of the metrics.
+            failures (int): Failures in a row that open the circuit. Defaults to 3.
+            cooldown (float): Seconds the circuit stays open. Defaults to 30.
+        """
+        self.name = name
+        self.failures = failures
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.failures_in_row = 0
+        self.opened_at: Optional[float] = None
+        self.lock = threading.Lock()
+        self.open_gauge = metrics.gauge(f"{name}_circuit_open", f"Whether the circuit of {name} is open")
+        self.trips = metrics.counter(f"{name}_circuit_trips", f"Times the circuit of {name} opened")
+
+    def allow(self) -> bool:
+        """
+        Check whether a call may go to the endpoint, claiming the trial call if the cooldown has passed.
+
+        Returns:
+            bool: True if the call may go ahead.
+        """
+        with self.lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = HALF_OPEN
+                return True
+            return False
+
+    def success(self) -> None:
+        """
+        Report a successful call.
+        """
+        with self.lock:
+            self.state = CLOSED
+            self.failures_in_row = 0
+            self.open_gauge.set(0)
+
+    def release(self) -> None:
+        """
+        Report a call that was abandoned without an outcome, e.g. a cancelled one.
+        An abandoned trial call opens the circuit again with a new cooldown, so a later call can be the trial.
+        """
+        with self.lock:
+            if self.state == HALF_OPEN:
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def failure(self) -> None:
+        """
+        Report a failed call.
+        """
+        with self.lock:
+            self.failures_in_row += 1
+            if self.state == HALF_OPEN or self.failures_in_row >= self.failures:
+                if self.state != OPEN:
+                    self.trips.inc()
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self.open_gauge.set(1)
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """
+    Exponential backoff with full jitter.
+
+    Args:
+        attempt (int): Number of the retry, starting from 1.
+        base (float): Upper bound of the first delay in seconds, it doubles with every retry.
+        cap (float): Largest delay in seconds.
+
+    Returns:
+        float: Delay in seconds.
+    """
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Check whether a failed call may succeed if it is made again: timeouts, connection errors, rate limits (429) and
+    server errors (5xx). Other errors, e.g. a bad key or an invalid request, fail the same way every time.
+
+    Args:
+        error (BaseException): Error of the call.
+
+    Returns:
+        bool: True if the call may be retried.
+    """
+    status_code = getattr(error, "status_code", None)
+    if isinstance(status_code, int):
+        return status_code in (408, 429) or status_code >= 500
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    return any(cls.__name__ in TRANSIENT_ERROR_NAMES for cls in type(error).__mro__)
@@ -0,0 +1,403 @@
+import asyncio
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncGenerator, Callable, Dict, Generator, List, Optional, Tuple
+
+from utils.errors import SessionLimitError
+
+SESSION_MAX_ACTIVE: int = int(os.getenv("SESSION_MAX_ACTIVE", 1000))
+SESSION_IDLE_TIMEOUT: float = float(os.getenv("SESSION_IDLE_TIMEOUT", 3 * 3600))
+# SQLite database for the sessions evicted from memory and the durable values, if set, otherwise they are dropped
+SESSION_STORE_PATH: Optional[str] = os.getenv("SESSION_STORE_PATH")
+SESSION_DURABLE_KEYS: Tuple[str, ...] = ("chat_history", "previous_code")
+SESSION_EXPIRY_INTERVAL: float = 60
+
+
+class SessionBarrier:
+    """
+    Counts pending tasks per session and lets a coroutine wait until all of them are finished.
+    Tasks may begin and end in any thread, waiting is done on the event loop without holding a thread.
+    """
+
+    def __init__(self):
+        self.pending: Dict[str, int] = defaultdict(int)
+        self.waiters: Dict[str, List[asyncio.Future]] = defaultdict(list)
+        # Coroutines waiting for a task to begin during their grace period
+        self.starters: Dict[str, List[asyncio.Future]] = defaultdict(list)
+        self.lock = threading.Lock()
+
+    def begin(self, session_id: str) -> None:
+        """
+        Register a pending task.
+
+        Args:
+            session_id (str): Session identifier.
+        """
+        with self.lock:
+            self.pending[session_id] += 1
+            self._wake(self.starters.pop(session_id, []))
+
+    def end(self, session_id: str) -> None:
+        """
+        Mark a pending task as finished, waking up the waiters if it was the last one.
+
+        Args:
+            session_id (str): Session identifier.
+        """
+        with self.lock:
+            self.pending[session_id] -= 1
+            if self.pending[session_id] > 0:
+                return
+            self._release(session_id)
+
+    def reset(self, session_id: str) -> None:
+        """
+        Forget all pending tasks of a session, e.g. the ones that failed without calling end.
+
+        Args:
+            session_id (str): Session identifier.
+        """
+        with self.lock:
+            self._release(session_id)
+
+    def _release(self, session_id: str) -> None:
+        self.pending.pop(session_id, None)
+        self._wake(self.waiters.pop(session_id, []))
+
+    @staticmethod
+    def _wake(futures: List[asyncio.Future]) -> None:
+        for future in futures:
+            future.get_loop().call_soon_threadsafe(lambda future: future.done() or future.set_result(None), future)
+
+    async def _wait_for(self, futures: Dict[str, List[asyncio.Future]], session_id: str, timeout: float, ready: Callable[[], bool]) -> bool:
+        """
+        Wait until the session is woken up in futures, unless it is ready already. The check and the registration are
+        done under one lock, so a wake-up can't be missed between them.
+
+        Returns:
+            bool: True if ready or woken up, False if the timeout expired.
+        """
+        with self.lock:
+            if ready():
+                return True
+            future = asyncio.get_running_loop().create_future()
+            futures[session_id].append(future)
+        try:
+            await asyncio.wait_for(future, timeout)
+            return True
+        except asyncio.TimeoutError:
+            with self.lock:
+                if future in futures.get(session_id, []):
+                    futures[session_id].remove(future)
+            return False
+
+    async def wait(self, session_id: str, timeout: float, grace: float = 0) -> bool:
+        """
+        Wait until the session has no pending tasks.
+        With a grace period, a session without pending tasks is also watched for a task that is about to begin,
+        e.g. the handler of the last audio chunk that is still queued when the recording stops.
+
+        Args:
+            session_id (str): Session identifier.
+            timeout (float): Maximum number of seconds to wait.
+            grace (float): Seconds to wait for a task to begin if none is pending. Defaults to 0.
+
+        Returns:
+            bool: True if all tasks finished, False if the timeout expired.
+        """
+        deadline = time.monotonic() + timeout
+        began = lambda: bool(self.pending.get(session_id))
+        if grace > 0 and not await self._wait_for(self.starters, session_id, min(grace, timeout), began):
+            return True
+        return await self._wait_for(self.waiters, session_id, max(0, deadline - time.monotonic()), lambda: not began())
+
+
+class SessionStore:
+    """
+    Server-side state of the interview sessions, keyed by session id, so events only pass the id instead of the state.
+    Active sessions are kept in memory as mutable dicts in least recently used order, sessions idle for too long expire.
+
+    With a path set, the sessions are also kept in SQLite: the least recently used ones are spilled there above the
+    size limit, and the durable values (the chat and the code) are written through after the blocks that persist them.
+    Workers sharing the database (see utils.workers) can then resume each other's sessions, e.g. after a restart.
+    A block that persists the session first reloads the durable values another worker saved since, e.g. when its client
+    was moved back. Sessions used by a block are never spilled or expired.
+    Without a path, new sessions are refused above the size limit rather than dropping the state of a live one.
+
+    The database is used through one connection and never under the lock of the sessions in memory, so events of other
+    sessions don't wait for the disk. The async handlers use aget and asession, which run the database work in a thread.
+    """
+
+    def __init__(
+        self,
+        max_active: int = SESSION_MAX_ACTIVE,
+        idle_timeout: float = SESSION_IDLE_TIMEOUT,
+        path: Optional[str] = SESSION_STORE_PATH,
+        durable_keys: Tuple[str, ...] = SESSION_DURABLE_KEYS,
+    ):
+        """
+        Initialize the SessionStore.
+
+        Args:
+            max_active (int): Maximum number of sessions kept in memory. Defaults to SESSION_MAX_ACTIVE.
+            idle_timeout (float): Number of seconds after the last use when a session expires. Defaults to SESSION_IDLE_TIMEOUT.
+            path (Optional[str]): Path to the SQLite database. Defaults to SESSION_STORE_PATH, None keeps sessions only in memory.
+            durable_keys (Tuple[str, ...]): Values written through when a block persists the session. Defaults to SESSION_DURABLE_KEYS.
+        """
+        self.max_active = max_active
+        self.idle_timeout = idle_timeout
+        self.path = path
+        self.durable_keys = durable_keys
+        self.sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.used_at: Dict[str, float] = {}
+        # Time of the last save of every session by this store, or of its load, later saves are made by other workers
+        self.synced_at: Dict[str, float] = {}
+        # Number of blocks using every session, such sessions stay in memory
+        self.in_use: Dict[str, int] = defaultdict(int)
+        # Sessions spilled from memory whose state is being written, they are taken back if used meanwhile
+        self.spilling: Dict[str, Dict[str, Any]] = {}
+        self.expired_at = time.time()
+        self.lock = threading.RLock()
+        self.connection: Optional[sqlite3.Connection] = None
+        self.db_lock = threading.Lock()
+        if path:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            with self._connect() as connection:
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.execute("CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, state BLOB, used_at REAL)")
+
+    @contextmanager
+    def _connect(self) -> Generator[sqlite3.Connection, None, None]:
+        # One connection per store, the threads take turns on it
+        with self.db_lock:
+            if self.connection is None:
+                self.connection = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            yield self.connection
+
+    def get(self, session_id: str) -> Dict[str, Any]:
+        """
+        Get the state of a session and mark it as recently used. A new session starts with an empty state.
+
+        Args:
+            session_id (str): Session identifier.
+
+        Returns:
+            Dict[str, Any]: Mutable state of the session.
+
+        Raises:
+            SessionLimitError: If it is a new session, the limit is reached and there is no database to spill to.
+        """
+        return self._get(session_id)[0]
+
+    def _get(self, session_id: str, use: bool = False) -> Tuple[Dict[str, Any], bool]:
+        """
+        Get the state of a session, optionally marking it as used by a block.
+
+        Returns:
+            Tuple[Dict[str, Any], bool]: State of the session and whether it was loaded from the database just now.
+        """
+        now = time.time()
+        if now - self.expired_at > SESSION_EXPIRY_INTERVAL:
+            self.expire(now)
+        with self.lock:
+            state = self.sessions.get(session_id)
+            if state is None and session_id in self.spilling:
+                state = self.sessions[session_id] = self.spilling.pop(session_id)
+            if state is not None:
+                self.sessions.move_to_end(session_id)
+                self.used_at[session_id] = now
+                self.in_use[session_id] += use
+                return state, False
+            if not self.path and len(self.sessions) >= self.max_active:
+                self._drop_idle(now)
+                if len(self.sessions) >= self.max_active:
+                    raise SessionLimitError(f"Too many active sessions ({self.max_active}), try again later")
+
+        loaded = self._load(session_id) or {}
+        with self.lock:
+            # Another thread may have added the session while it was loaded
+            state = self.sessions.setdefault(session_id, loaded)
+            self.synced_at.setdefault(session_id, now)
+            self.sessions.move_to_end(session_id)
+            self.used_at[session_id] = now
+            self.in_use[session_id] += use
+            spilled = self._spill(session_id) if self.path else []
+        for spilled_id, spilled_state, used_at in spilled:
+            self._save(spilled_id, spilled_state, used_at)
+            with self.lock:
+                if self.spilling.get(spilled_id) is spilled_state:
+                    del self.spilling[spilled_id]
+        return state, True
+
+    def _spill(self, session_id: str) -> List[Tuple[str, Dict[str, Any], float]]:
+        # The least recently used sessions above the limit that no block uses, to be written outside the lock
+        spilled = []
+        for candidate in list(self.sessions):
+            if len(self.sessions) <= self.max_active:
+                break
+            if candidate == session_id or self.in_use.get(candidate):
+                continue
+            state = self.spilling[candidate] = self.sessions.pop(candidate)
+            self.synced_at.pop(candidate, None)
+            spilled.append((candidate, state, self.used_at.pop(candidate)))
+        return spilled
+
+    def _enter(self, session_id: str, persist: bool) -> Dict[str, Any]:
+        state, loaded = self._get(session_id, use=True)
+        try:
+            if persist and not loaded:
+                self._refresh(session_id, state)
+        except BaseException:
+            self._leave(session_id)
+            raise
+        return state
+
+    def _leave(self, session_id: str) -> float:
+        now = time.time()
+        with self.lock:
+            self.in_use[session_id] -= 1
+            if self.in_use[session_id] <= 0:
+                del self.in_use[session_id]
+            if session_id in self.sessions:
+                self.used_at[session_id] = now
+        return now
+
+    @contextmanager
+    def session(self, session_id: str, persist: bool = False) -> Generator[Dict[str, Any], None, None]:
+        """
+        Use the state of a session in a block, it stays in memory and marked as used until the block ends.
+
+        Args:
+            session_id (str): Session identifier.
+            persist (bool): Whether to reload the durable values saved by other workers before the block and to write
+                them through to the database after it. Defaults to False.
+
+        Yields:
+            Dict[str, Any]: Mutable state of the session.
+        """
+        state = self._enter(session_id, persist)
+        try:
+            yield state
+        finally:
+            now = self._leave(session_id)
+            if persist and self.path:
+                self._save(session_id, self._durable(state), now)
+
+    async def aget(self, session_id: str) -> Dict[str, Any]:
+        """
+        Asynchronously get the state of a session, like get, without blocking the event loop on the database.
+
+        Args:
+            session_id (str): Session identifier.
+
+        Returns:
+            Dict[str, Any]: Mutable state of the session.
+        """
+        return await asyncio.to_thread(self.get, session_id)
+
+    @asynccontextmanager
+    async def asession(self, session_id: str, persist: bool = False) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Asynchronously use the state of a session in a block, like session, without blocking the event loop on the database.
+
+        Args:
+            session_id (str): Session identifier.
+            persist (bool): Whether to reload the durable values saved by other workers before the block and to write
+                them through to the database after it. Defaults to False.
+
+        Yields:
+            Dict[str, Any]: Mutable state of the session.
+        """
+        state = await asyncio.to_thread(self._enter, session_id, persist)
+        try:
+            yield state
+        finally:
+            now = self._leave(session_id)
+            if persist and self.path:
+                await asyncio.to_thread(self._save, session_id, self._durable(state), now)
+
+    def _durable(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: state[key] for key in self.durable_keys if key in state}
+
+    def delete(self, session_id: str) -> None:
+        """
+        Forget a session.
+
+        Args:
+            session_id (str): Session identifier.
+        """
+        with self.lock:
+            self.sessions.pop(session_id, None)
+            self.used_at.pop(session_id, None)
+            self.synced_at.pop(session_id, None)
+            self.spilling.pop(session_id, None)
+        if self.path:
+            with self._connect() as connection:
+                connection.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def expire(self, now: Optional[float] = None) -> None:
+        """
+        Forget the sessions that are idle for longer than the timeout.
+
+        Args:
+            now (Optional[float]): Current time. Defaults to time.time().
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            self._drop_idle(now)
+        if self.path:
+            with self._connect() as connection:
+                connection.execute("DELETE FROM sessions WHERE used_at < ?", (now - self.idle_timeout,))
+
+    def _drop_idle(self, now: float) -> None:
+        self.expired_at = now
+        for session_id, used_at in list(self.used_at.items()):
+            if now - used_at > self.idle_timeout and not self.in_use.get(session_id):
+                self.sessions.pop(session_id, None)
+                self.used_at.pop(session_id, None)
+                self.synced_at.pop(session_id, None)
+
+    def _save(self, session_id: str, state: Dict[str, Any], used_at: float) -> None:
+        # Values that can't be pickled, e.g. objects holding locks or clients, are dropped and created again when needed
+        picklable = {}
+        for key, value in list(state.items()):
+            try:
+                picklable[key] = pickle.dumps(value)
+            except Exception as e:
+                logging.info(f"Session value {key} of {session_id} can't be saved and is dropped: {e}")
+        with self._connect() as connection:
+            connection.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)", (session_id, pickle.dumps(picklable), used_at))
+        with self.lock:
+            if session_id in self.sessions:
+                self.synced_at[session_id] = max(self.synced_at.get(session_id, 0), used_at)
+
+    def _refresh(self, session_id: str, state: Dict[str, Any]) -> None:
+        if not self.path:
+            return
+        with self._connect() as connection:
+            row = connection.execute("SELECT state, used_at FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        with self.lock:
+            # Saves of this store are not later than its last sync, only another worker writes a later one
+            synced_at = self.synced_at.get(session_id)
+            if row is None or synced_at is None or row[1] <= synced_at:
+                return
+            self.synced_at[session_id] = row[1]
+        logging.info(f"Session {session_id} was changed by another worker, reloading it")
+        saved = {key: pickle.loads(value) for key, value in pickle.loads(row[0]).items()}
+        state.update(self._durable(saved))
+
+    def _load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        if not self.path:
+            return None
+        with self._connect() as connection:
+            row = connection.execute("SELECT state FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        if row is None:
+            return None
+        return {key: pickle.loads(value) for key, value in pickle.loads(row[0]).items()}
@@ -0,0 +1,289 @@
+import functools
+import inspect
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Any, Callable, ContextManager, Dict, Iterator, Optional
+
+from utils.metrics import metrics
+
+# Tracing is off by default, every span is then a shared no-op object and traced handlers are left as they are
+TRACING: bool = bool(os.getenv("TRACING", False))
+# Spans are also exported over OTLP when an endpoint is set, this needs the opentelemetry-sdk and
+# opentelemetry-exporter-otlp-proto-http packages
+OTLP_ENDPOINT: Optional[str] = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")
+OTEL_SERVICE_NAME: str = os.getenv("OTEL_SERVICE_NAME", "ai-interviewer")
+
+# Span of the operation in progress, spans started while it is set become its children
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class Span:
+    """
+    Timed operation with attributes. Streamed operations report their chunks, so the time to the first chunk and the
+    chunk rate are known too. The duration and the time to the first chunk are recorded in the metrics registry.
+    A span started while another one is active is its child.
+    """
+
+    def __init__(self, tracer: "Tracer", name: str, unit: str = "chunks", **attributes: Any):
+        """
+        Initialize and start the Span.
+
+        Args:
+            tracer (Tracer): Tracer that exports the span.
+            name (str): Span name, also the prefix of its metrics.
+            unit (str): What the chunk amounts count, e.g. tokens or bytes. Defaults to chunks.
+            **attributes: Initial attributes.
+        """
+        self.tracer = tracer
+        self.name = name
+        self.unit = unit
+        self.attributes: Dict[str, Any] = dict(attributes)
+        self.start_ns = time.time_ns()
+        self.start = time.perf_counter()
+        self.first_chunk: Optional[float] = None
+        self.amount = 0
+        self.parent: Optional[Span] = _current_span.get()
+        self.otel_span: Any = tracer.start_otel_span(self)
+
+    def set(self, **attributes: Any) -> None:
+        """
+        Add attributes to the span.
+        """
+        self.attributes.update(attributes)
+
+    def chunk(self, amount: float = 1) -> None:
+        """
+        Report a streamed chunk.
+
+        Args:
+            amount (float): Size of the chunk in the span unit. Defaults to 1.
+        """
+        if self.first_chunk is None:
+            self.first_chunk = time.perf_counter() - self.start
+        self.amount += amount
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        """
+        Finish the span, record its metrics and export it.
+
+        Args:
+            error (Optional[BaseException]): Exception that ended the operation, if any.
+        """
+        duration = time.perf_counter() - self.start
+        self.attributes["duration"] = duration
+        metrics.histogram(f"{self.name}_duration_seconds", f"Duration of {self.name} spans").observe(duration)
+        if self.first_chunk is not None:
+            self.attributes["time_to_first_chunk"] = self.first_chunk
+            self.attributes[self.unit] = self.amount
+            if duration > self.first_chunk:
+                self.attributes[f"{self.unit}_per_second"] = self.amount / (duration - self.first_chunk)
+            metrics.histogram(f"{self.name}_first_chunk_seconds", f"Time to the first chunk of {self.name} spans").observe(self.first_chunk)
+        if isinstance(error, GeneratorExit):
+            self.attributes["cancelled"] = True
+        elif error is not None:
+            self.attributes["error"] = repr(error)
+            metrics.counter(f"{self.name}_errors", f"Failed {self.name} spans").inc()
+        self.tracer.export(self, time.time_ns())
+
+    @contextmanager
+    def activate(self) -> Iterator["Span"]:
+        """
+        Make the span the parent of the spans started inside the block.
+        Threads and tasks started inside the block inherit it only with the copied context, e.g. asyncio.to_thread.
+        """
+        previous = _current_span.get()
+        _current_span.set(self)
+        try:
+            yield self
+        finally:
+            # Set back explicitly rather than with a reset token, a generator may be resumed in another context
+            _current_span.set(previous)
+
+    def __enter__(self) -> "Span":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.end(exc_value)
+
+
+class NoopSpan:
+    """Span that does nothing, used when tracing is disabled."""
+
+    def set(self, **attributes: Any) -> None:
+        pass
+
+    def chunk(self, amount: float = 1) -> None:
+        pass
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        pass
+
+    def activate(self) -> ContextManager["NoopSpan"]:
+        return nullcontext(self)
+
+    def __enter__(self) -> "NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        pass
+
+
+NOOP_SPAN = NoopSpan()
+
+
+class Tracer:
+    """Creates spans and exports the finished ones to OpenTelemetry, if it is configured."""
+
+    def __init__(self, enabled: bool = TRACING, otlp_endpoint: Optional[str] = OTLP_ENDPOINT):
+        """
+        Initialize the Tracer.
+
+        Args:
+            enabled (bool): Whether to record spans. Defaults to TRACING.
+            otlp_endpoint (Optional[str]): OTLP endpoint, setting it also enables tracing. Defaults to OTLP_ENDPOINT.
+        """
+        self.enabled = enabled or bool(otlp_endpoint)
+        self.otlp_endpoint = otlp_endpoint
+        self._otel_tracer: Any = None
+        self.lock = threading.Lock()
+
+    def span(self, name: str, unit: str = "chunks", **attributes: Any) -> Any:
+        """
+        Start a span, use it as a context manager.
+
+        Args:
+            name (str): Span name, also the prefix of its metrics.
+            unit (str): What the chunk amounts count, e.g. tokens or bytes. Defaults to chunks.
+            **attributes: Initial attributes.
+
+        Returns:
+            Span or NoopSpan: The span, a shared no-op one if tracing is disabled.
+        """
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, unit, **attributes)
+
+    def traced(self, name: str, fn: Callable) -> Callable:
+        """
+        Wrap a function, generator function or their async version in a span.
+        The span is active while the function runs, so the spans of the calls it makes are its children. A generator
+        activates it only while producing an item, not while the caller holds the item.
+        The wrapper keeps the signature and the kind of the function, so Gradio handles it the same way.
+
+        Args:
+            name (str): Span name.
+            fn (Callable): Function to wrap.
+
+        Returns:
+            Callable: The wrapped function, or the function itself if tracing is disabled.
+        """
+        if not self.enabled:
+            return fn
+
+        if inspect.isasyncgenfunction(fn):
+
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                with self.span(name) as span:
+                    items = fn(*args, **kwargs).__aiter__()
+                    while True:
+                        with span.activate():
+                            try:
+                                item = await items.__anext__()
+                            except StopAsyncIteration:
+                                break
+                        span.chunk()
+                        yield item
+
+        elif inspect.isgeneratorfunction(fn):
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(name) as span:
+                    items = iter(fn(*args, **kwargs))
+                    while True:
+                        with span.activate():
+                            try:
+                                item = next(items)
+                            except StopIteration:
+                                break
+                        span.chunk()
+                        yield item
+
+        elif inspect.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                with self.span(name) as span, span.activate():
+                    return await fn(*args, **kwargs)
+
+        else:
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(name) as span, span.activate():
+                    return fn(*args, **kwargs)
+
+        return wrapper
+
+    def _get_otel_tracer(self) -> Any:
+        with self.lock:
+            if self._otel_tracer is None and self.otlp_endpoint:
+                try:
+                    from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+                    from opentelemetry.sdk.resources import Resource
+                    from opentelemetry.sdk.trace import TracerProvider
+                    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+                except ImportError:
+                    logging.warning("OTLP export needs the opentelemetry-sdk and opentelemetry-exporter-otlp-proto-http packages")
+                    self.otlp_endpoint = None
+                    return None
+                provider = TracerProvider(resource=Resource.create({"service.name": OTEL_SERVICE_NAME}))
+                # The exporter reads the endpoint and headers from the standard OTEL_EXPORTER_OTLP_* variables
+                provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+                self._otel_tracer = provider.get_tracer("interviewer")
+            return self._otel_tracer
+
+    def start_otel_span(self, span: Span) -> Any:
+        """
+        Start the OpenTelemetry span of a span, if OpenTelemetry is configured. It is a child of the parent's span.
+
+        Args:
+            span (Span): Started span.
+
+        Returns:
+            Any: OpenTelemetry span, or None if OpenTelemetry is not configured.
+        """
+        otel_tracer = self._get_otel_tracer() if self.otlp_endpoint else None
+        if otel_tracer is None:
+            return None
+        from opentelemetry import trace
+
+        parent = span.parent.otel_span if span.parent is not None else None
+        context = trace.set_span_in_context(parent) if parent is not None else None
+        return otel_tracer.start_span(span.name, context=context, start_time=span.start_ns)
+
+    def export(self, span: Span, end_ns: int) -> None:
+        """
+        Send a finished span to OpenTelemetry, if it is configured.
+
+        Args:
+            span (Span): Finished span.
+            end_ns (int): End time in nanoseconds since the epoch.
+        """
+        if span.otel_span is None:
+            return
+        attributes = {key: value if isinstance(value, (bool, int, float, str)) else str(value) for key, value in span.attributes.items()}
+        span.otel_span.set_attributes(attributes)
+        if "error" in span.attributes:
+            from opentelemetry.trace import Status, StatusCode
+
+            span.otel_span.set_status(Status(StatusCode.ERROR, span.attributes["error"]))
+        span.otel_span.end(end_time=end_ns)
+
+
+tracer = Tracer()
@@ -14,6 +14,8 @@ def add_candidate_message(message, chat):
 
 
 def get_status_color(obj):
+    if obj.status is None:
+        return "⚪"
     if obj.status:
         if obj.streaming:
             return "🟢"
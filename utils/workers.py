@@ -0,0 +1,249 @@
+import itertools
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+WORKER_COOKIE: str = "interviewer_worker"
+# Seconds before a worker that refused a connection gets new sessions again
+WORKER_RETRY_SECONDS: float = float(os.getenv("WORKER_RETRY_SECONDS", 5))
+WORKER_SESSION_STORE_PATH: str = os.path.join(".cache", "sessions.sqlite3")
+# Index of an app worker process, set by WorkerPool
+WORKER_INDEX_VARIABLE: str = "WORKER_INDEX"
+
+# Connection headers are only meaningful for a single hop
+HOP_BY_HOP_HEADERS = {"connection", "keep-alive", "proxy-connection", "te", "trailer", "transfer-encoding", "upgrade"}
+
+
+def is_primary_worker() -> bool:
+    """
+    Check whether this process runs the background tasks shared by all workers, like the service probes and the problem
+    pool refill. It is the first worker, or the app itself if it runs without workers.
+
+    Returns:
+        bool: True if this process runs the shared background tasks.
+    """
+    return os.getenv(WORKER_INDEX_VARIABLE, "0") == "0"
+
+
+class StickyRouter:
+    """
+    ASGI reverse proxy that spreads sessions over worker processes and keeps every browser on the same worker.
+    A new client is assigned a worker round robin and gets a cookie with it. If its worker is unreachable, the client
+    is moved to the next one, which picks the session up from the shared session store. A worker the client is moved
+    back to later loads the session from the store again, as the one in its memory is stale (see utils.session).
+    Only HTTP is proxied, websocket connections are closed.
+    """
+
+    def __init__(self, upstreams: List[str], retry_seconds: float = WORKER_RETRY_SECONDS):
+        """
+        Initialize the StickyRouter.
+
+        Args:
+            upstreams (List[str]): Base URLs of the workers.
+            retry_seconds (float): Seconds before an unreachable worker gets sessions again. Defaults to WORKER_RETRY_SECONDS.
+        """
+        self.upstreams = upstreams
+        self.retry_seconds = retry_seconds
+        self.down_until: Dict[int, float] = {}
+        self.turns = itertools.count()
+        self.client = None
+
+    def _get_client(self):
+        if self.client is None:
+            import httpx
+
+            # Streamed responses (the event queue uses server-sent events) may stay open as long as an interview turn
+            self.client = httpx.AsyncClient(timeout=httpx.Timeout(None, connect=5), limits=httpx.Limits(max_connections=None))
+        return self.client
+
+    def pick(self, cookie: Optional[str]) -> int:
+        """
+        Choose the worker of a request.
+
+        Args:
+            cookie (Optional[str]): Value of the worker cookie, if the client has one.
+
+        Returns:
+            int: Index of the worker.
+        """
+        now = time.monotonic()
+        available = [i for i in range(len(self.upstreams)) if self.down_until.get(i, 0) <= now] or list(range(len(self.upstreams)))
+        if cookie is not None and cookie.isdigit() and int(cookie) in available:
+            return int(cookie)
+        return available[next(self.turns) % len(available)]
+
+    async def __call__(self, scope, receive, send) -> None:
+        from starlette.requests import Request
+        from starlette.responses import PlainTextResponse
+
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    if self.client is not None:
+                        await self.client.aclose()
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        if scope["type"] == "websocket":
+            from starlette.websockets import WebSocketClose
+
+            # The app only uses HTTP (the event queue streams over server-sent events), so websockets are refused
+            logging.warning(f"Rejected a websocket connection to {scope.get('path')}, the router only proxies HTTP")
+            await WebSocketClose(code=1008, reason="Websockets are not supported")(scope, receive, send)
+            return
+        if scope["type"] != "http":
+            logging.warning(f"Ignored a connection of the unsupported type {scope['type']}")
+            return
+
+        request = Request(scope, receive)
+        response = await self.forward(request)
+        if response is None:
+            response = PlainTextResponse("No worker is available", status_code=502)
+        await response(scope, receive, send)
+
+    async def forward(self, request):
+        """
+        Send a request to the worker of its client and stream the response back.
+        Only connection failures are retried on another worker, the request has not reached any worker then.
+
+        Args:
+            request (starlette.requests.Request): Incoming request.
+
+        Returns:
+            Optional[starlette.responses.StreamingResponse]: Response of the worker, None if no worker is reachable.
+        """
+        import httpx
+        from starlette.background import BackgroundTask
+        from starlette.responses import StreamingResponse
+
+        client = self._get_client()
+        body = await request.body()
+        cookie = request.cookies.get(WORKER_COOKIE)
+        headers = [(name, value) for name, value in request.headers.raw if name.decode().lower() not in HOP_BY_HOP_HEADERS]
+        if request.client is not None:
+            headers.append((b"x-forwarded-for", request.client.host.encode()))
+        headers.append((b"x-forwarded-proto", request.url.scheme.encode()))
+
+        for _ in range(len(self.upstreams)):
+            index = self.pick(cookie)
+            url = self.upstreams[index] + request.url.path + (f"?{request.url.query}" if request.url.query else "")
+            upstream_request = client.build_request(request.method, url, headers=headers, content=body)
+            try:
+                upstream_response = await client.send(upstream_request, stream=True)
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                logging.warning(f"Worker {index} at {self.upstreams[index]} is unreachable")
+                self.down_until[index] = time.monotonic() + self.retry_seconds
+                cookie = None
+                continue
+
+            response_headers = {
+                name: value for name, value in upstream_response.headers.multi_items() if name.lower() not in HOP_BY_HOP_HEADERS
+            }
+            response = StreamingResponse(
+                upstream_response.aiter_raw(),
+                status_code=upstream_response.status_code,
+                headers=response_headers,
+                background=BackgroundTask(upstream_response.aclose),
+            )
+            # Multiple cookies can't be passed in a dict, they are added to the raw headers
+            for value in upstream_response.headers.get_list("set-cookie"):
+                response.raw_headers.append((b"set-cookie", value.encode()))
+            if request.cookies.get(WORKER_COOKIE) != str(index):
+                response.set_cookie(WORKER_COOKIE, str(index), httponly=True, samesite="lax")
+            return response
+        return None
+
+
+class WorkerPool:
+    """Runs the app in worker processes on consecutive local ports and restarts the ones that exit."""
+
+    def __init__(self, num_workers: int, first_port: int, host: str = "127.0.0.1", args: Optional[List[str]] = None):
+        """
+        Initialize the WorkerPool.
+
+        Args:
+            num_workers (int): Number of worker processes.
+            first_port (int): Port of the first worker, the others use the next ones.
+            host (str): Host the workers listen on. Defaults to 127.0.0.1.
+            args (Optional[List[str]]): Command of a worker without the port. Defaults to this app.
+        """
+        self.ports = [first_port + i for i in range(num_workers)]
+        self.host = host
+        self.args = args or [sys.executable, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")]
+        self.processes: List[Optional[subprocess.Popen]] = [None] * num_workers
+        self.stopped = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def upstreams(self) -> List[str]:
+        """Base URLs of the workers."""
+        return [f"http://{self.host}:{port}" for port in self.ports]
+
+    def _env(self, index: int) -> Dict[str, str]:
+        env = dict(os.environ, GRADIO_SERVER_NAME=self.host, GRADIO_SERVER_PORT=str(self.ports[index]))
+        env[WORKER_INDEX_VARIABLE] = str(index)
+        # Sessions are shared through SQLite, so any worker can resume them
+        env.setdefault("SESSION_STORE_PATH", WORKER_SESSION_STORE_PATH)
+        # Every worker serves its own metrics on the next ports after METRICS_PORT
+        if int(env.get("METRICS_PORT", 0)):
+            env["METRICS_PORT"] = str(int(env["METRICS_PORT"]) + index)
+        return env
+
+    def _spawn(self, index: int) -> None:
+        self.processes[index] = subprocess.Popen(self.args + ["--port", str(self.ports[index])], env=self._env(index))
+
+    def start(self) -> None:
+        """
+        Start the workers and a thread that restarts them.
+        """
+        for index in range(len(self.ports)):
+            self._spawn(index)
+        self.thread = threading.Thread(target=self._supervise, daemon=True)
+        self.thread.start()
+
+    def _supervise(self) -> None:
+        while not self.stopped.wait(1):
+            for index, process in enumerate(self.processes):
+                if process is not None and process.poll() is not None:
+                    logging.warning(f"Worker {index} exited with code {process.returncode}, restarting it")
+                    self._spawn(index)
+
+    def stop(self) -> None:
+        """
+        Stop the workers.
+        """
+        self.stopped.set()
+        for process in self.processes:
+            if process is not None and process.poll() is None:
+                process.terminate()
+        for process in self.processes:
+            if process is not None:
+                try:
+                    process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+
+
+def serve(num_workers: int, host: str, port: int) -> None:
+    """
+    Run the app in several worker processes behind a sticky router.
+
+    Args:
+        num_workers (int): Number of worker processes.
+        host (str): Host the router listens on.
+        port (int): Port of the router, the workers listen on the next ports of localhost.
+    """
+    import uvicorn
+
+    workers = WorkerPool(num_workers, port + 1)
+    workers.start()
+    try:
+        uvicorn.run(StickyRouter(workers.upstreams), host=host, port=port, log_level="warning")
+    finally:
+        workers.stop()